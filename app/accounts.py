@@ -0,0 +1,165 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from app.profiling import record_sheets_io
+from app.settings import ACCOUNT_COOLDOWN, ACCOUNT_COOLDOWN_AFTER, ACCOUNT_WINDOW, GZIP_MIN_BYTES, GZIP_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+@lru_cache(maxsize=None)
+def tracked_http_client():
+    """Класс HTTP-клиента gspread, сообщающий пулу о каждом запросе и ответах 429.
+
+    Ответы API запрашиваются сжатыми, крупные тела запросов при GZIP_REQUESTS
+    сжимаются перед отправкой. Создается при первой авторизации, чтобы
+    gspread не грузился при старте бота.
+    """
+    import gspread
+
+    class TrackedHTTPClient(gspread.http_client.HTTPClient):
+        account = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # Google отдает gzip, только если и User-Agent содержит "gzip"
+            user_agent = self.session.headers.get('User-Agent', 'sheetswork')
+            self.session.headers['User-Agent'] = f"{user_agent} (gzip)"
+            self.session.headers['Accept-Encoding'] = 'gzip'
+
+        def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+            if GZIP_REQUESTS and json is not None:
+                data, headers = compress_body(json, headers)
+                if data is not None:
+                    json = None
+
+            account = self.account
+            account.pool.started(account)
+            started = time.perf_counter()
+            try:
+                response = super().request(method, endpoint, params, data, json, files, headers)
+            except gspread.exceptions.APIError as e:
+                account.pool.finished(account, rate_limited=e.response.status_code == 429)
+                raise
+            except Exception:
+                account.pool.finished(account)
+                raise
+            finally:
+                record_sheets_io(time.perf_counter() - started)
+            account.pool.finished(account)
+            return response
+
+    return TrackedHTTPClient
+
+
+def compress_body(payload, headers=None):
+    """Тело запроса в gzip; (None, headers), если оно меньше GZIP_MIN_BYTES"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    if len(body) < GZIP_MIN_BYTES:
+        return None, headers
+    headers = dict(headers or {}, **{'Content-Encoding': 'gzip', 'Content-Type': 'application/json'})
+    return gzip.compress(body), headers
+
+
+class Account:
+    __slots__ = ('pool', 'creds_file', 'email', 'client', 'in_flight', 'recent', 'strikes', 'cooldown_until')
+
+    def __init__(self, pool, creds_file):
+        self.pool = pool
+        self.creds_file = creds_file
+        self.email = None
+        self.client = None
+        self.in_flight = 0
+        self.recent = deque()  # время запросов за последние ACCOUNT_WINDOW секунд
+        self.strikes = 0  # 429 подряд
+        self.cooldown_until = 0.0
+
+    def authorize(self):
+        if not os.path.exists(self.creds_file):
+            raise FileNotFoundError(f"Файл {self.creds_file} не найден!")
+
+        import gspread
+        from google.oauth2.service_account import Credentials
+
+        creds = Credentials.from_service_account_file(self.creds_file, scopes=SCOPES)
+        self.client = gspread.authorize(creds, http_client=tracked_http_client())
+        self.client.http_client.account = self
+        self.email = creds.service_account_email
+
+    def load(self, now):
+        while self.recent and self.recent[0] < now - ACCOUNT_WINDOW:
+            self.recent.popleft()
+        return self.in_flight + len(self.recent)
+
+
+class AccountPool:
+    """Пул сервисных аккаунтов; каждую операцию получает наименее загруженный.
+
+    Пул подменяет клиент gspread: open_by_key выбирает аккаунт, и все запросы
+    к полученной таблице идут от его имени. Аккаунт, получивший
+    ACCOUNT_COOLDOWN_AFTER ответов 429 подряд, на ACCOUNT_COOLDOWN секунд
+    выводится из выдачи.
+    """
+
+    def __init__(self, creds_files):
+        self.accounts = [Account(self, creds_file) for creds_file in creds_files]
+        self._lock = threading.Lock()
+
+    def authorize(self):
+        for account in self.accounts:
+            account.authorize()
+            logger.info(f"Используем сервисный аккаунт: {account.email}")
+
+    def pick(self):
+        now = time.monotonic()
+        with self._lock:
+            ready = [account for account in self.accounts if account.cooldown_until <= now]
+            if not ready:
+                # Все аккаунты остывают: берем тот, что освободится раньше
+                return min(self.accounts, key=lambda account: account.cooldown_until)
+            return min(ready, key=lambda account: account.load(now))
+
+    def open_by_key(self, key):
+        return self.pick().client.open_by_key(key)
+
+    def modified_time(self, key):
+        """Время последнего изменения таблицы (Drive API, без чтения листов)"""
+        return self.pick().client.http_client.get_file_drive_metadata(key)['modifiedTime']
+
+    def started(self, account):
+        with self._lock:
+            account.in_flight += 1
+            account.recent.append(time.monotonic())
+
+    def finished(self, account, rate_limited=False):
+        with self._lock:
+            account.in_flight -= 1
+            if not rate_limited:
+                account.strikes = 0
+                return
+
+            account.strikes += 1
+            if account.strikes >= ACCOUNT_COOLDOWN_AFTER:
+                account.cooldown_until = time.monotonic() + ACCOUNT_COOLDOWN
+                account.strikes = 0
+                logger.warning(f"Аккаунт {account.email} получил 429, пауза {ACCOUNT_COOLDOWN} сек")
+
+    def stats(self):
+        """Загрузка аккаунтов: [(email, в работе, запросов за окно, остывает ли)]"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (account.email, account.in_flight, account.load(now) - account.in_flight, account.cooldown_until > now)
+                for account in self.accounts
+            ]
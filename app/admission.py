@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+
+from app.settings import (
+    ADMISSION_MAX_CONCURRENT, ADMISSION_QUEUE_SIZE, ADMISSION_USER_BURST, ADMISSION_USER_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+# Обработчики, работающие с таблицей, помечаются флагом: flags={'sheets': WRITE}
+SHEETS_FLAG = 'sheets'
+WRITE = 'write'
+READ = 'read'
+
+# Чем меньше, тем раньше выходит из очереди
+PRIORITY = {WRITE: 0, READ: 1}
+
+# С какого числа корзин пользователей начинать убирать простаивающие
+BUCKETS_SWEEP_SIZE = 1024
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Списывает токен; возвращает 0 или сколько секунд ждать следующего"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """Middleware допуска к таблице.
+
+    У каждого пользователя свой token bucket; одновременно с таблицей
+    работают не больше max_concurrent обработчиков, остальные ждут в очереди
+    (не длиннее queue_size) и получают ответ с номером. Записи выходят из
+    очереди раньше просмотров. Корзины пользователей, простоявшие до полного
+    наполнения, убираются, когда их набирается больше sweep_size.
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, queue_size=ADMISSION_QUEUE_SIZE,
+                 user_rate=ADMISSION_USER_RATE, user_burst=ADMISSION_USER_BURST):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.buckets = {}
+        self.sweep_size = BUCKETS_SWEEP_SIZE
+        self.active = 0
+        self.waiters = []  # куча (приоритет, номер, future)
+        self.order = itertools.count()
+        self.rejected = 0
+        self.throttled = 0
+
+    async def __call__(self, handler, event, data):
+        kind = get_flag(data, SHEETS_FLAG)
+        if kind is None:
+            return await handler(event, data)
+
+        if not await self.admit(event, kind):
+            return
+        try:
+            return await handler(event, data)
+        finally:
+            self.release()
+
+    async def admit(self, event, kind):
+        """Допуск пользователя события: True - слот получен и должен быть возвращен release().
+
+        Обработчик без флага вызывает его сам, когда ему нужна таблица: например,
+        после паузы, во время которой слот не нужен.
+        """
+        wait = self.bucket(event.from_user.id).take()
+        if wait:
+            self.throttled += 1
+            await notify(event, f"⏳ Слишком много запросов, повторите через {math.ceil(wait)} сек")
+            return False
+        return await self.acquire(event, kind)
+
+    def bucket(self, user_id):
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) >= self.sweep_size:
+                self.evict_idle()
+            bucket = self.buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def evict_idle(self):
+        """Убирает корзины, которые успели наполниться: новая корзина вела бы себя так же"""
+        now = time.monotonic()
+        refill = self.user_burst / self.user_rate
+        self.buckets = {
+            user_id: bucket for user_id, bucket in self.buckets.items() if now - bucket.updated < refill
+        }
+        self.sweep_size = max(BUCKETS_SWEEP_SIZE, 2 * len(self.buckets))
+
+    async def acquire(self, event, kind):
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            return True
+
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            await notify(event, "⏳ Бот перегружен, попробуйте через минуту")
+            return False
+
+        priority = PRIORITY.get(kind, PRIORITY[READ])
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self.order), future)
+        heapq.heappush(self.waiters, entry)
+        position = sum(1 for waiter in self.waiters if waiter < entry) + 1
+        await notify(event, f"⏳ Бот занят, вы в очереди #{position}")
+
+        try:
+            # Слот передается из release() вместе с результатом future
+            await future
+        except asyncio.CancelledError:
+            # Полученный слот отдаем дальше, иначе убираем ожидание из очереди
+            if future.done() and not future.cancelled():
+                self.release()
+            elif entry in self.waiters:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            raise
+        return True
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'queued': len(self.waiters),
+            'rejected': self.rejected,
+            'throttled': self.throttled
+        }
+
+
+async def notify(event, text):
+    # Ответ в чат. На нажатие кнопки тоже сообщением: всплывающим уведомлением
+    # на него ответит сам обработчик, а второй ответ Telegram не принимает
+    try:
+        if isinstance(event, CallbackQuery) and event.message is not None:
+            await event.message.answer(text)
+        else:
+            await event.answer(text)
+    except Exception as e:
+        logger.warning(f"Не удалось отправить ответ очереди: {e}")
@@ -0,0 +1,160 @@
+import csv
+import gzip
+import logging
+import os
+from calendar import monthrange
+from collections import Counter
+
+from app.grid import cell_status, fetch_month_grid
+from app.layout import SHIFTS, CANCEL_COLOR
+from app.settings import ARCHIVE_DIR, ARCHIVE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# pyarrow необязателен и тяжел: грузится при первой архивации
+pa = pc = pq = None
+_pyarrow_loaded = False
+
+
+def _load_pyarrow():
+    global pa, pc, pq, _pyarrow_loaded
+    if _pyarrow_loaded:
+        return
+    _pyarrow_loaded = True
+
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+    except ImportError:
+        return
+    pa, pc = pyarrow, pyarrow.compute
+
+    try:
+        import pyarrow.parquet
+        pq = pyarrow.parquet
+    except ImportError:
+        pass
+
+ARCHIVE_COLUMNS = ('channel', 'day', 'shift', 'text', 'color')
+
+
+def fetch_sheet_rows(spreadsheet, sheet_name, target_date, layout=None):
+    """Читает смены всех каналов листа одним spreadsheets.get и возвращает колонки архива"""
+    grid = fetch_month_grid(spreadsheet, sheet_name, layout=layout)
+    days_in_month = monthrange(target_date.year, target_date.month)[1]
+    columns = {name: [] for name in ARCHIVE_COLUMNS}
+
+    for channel_idx, channel_name in enumerate(grid.layout.channels):
+        for day in range(1, days_in_month + 1):
+            for shift, shift_name in enumerate(SHIFTS):
+                columns['channel'].append(channel_name)
+                columns['day'].append(day)
+                columns['shift'].append(shift_name)
+                columns['text'].append(grid.text(channel_idx, day, shift))
+                columns['color'].append(grid.color(channel_idx, day, shift) or '')
+
+    return columns
+
+
+def _write_arrow(path, columns):
+    table = _to_table(columns)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _write_parquet(path, columns):
+    pq.write_table(_to_table(columns), path, compression='zstd')
+
+
+def _write_csv(path, columns):
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_COLUMNS)
+        writer.writerows(zip(*(columns[name] for name in ARCHIVE_COLUMNS)))
+
+
+def _to_table(columns):
+    # Повторяющиеся строки храним словарем, день умещается в int8
+    return pa.table({
+        'channel': pa.array(columns['channel']).dictionary_encode(),
+        'day': pa.array(columns['day'], type=pa.int8()),
+        'shift': pa.array(columns['shift']).dictionary_encode(),
+        'text': pa.array(columns['text'], type=pa.string()),
+        'color': pa.array(columns['color']).dictionary_encode()
+    })
+
+
+ARCHIVE_WRITERS = {
+    'arrow': ('.arrow', _write_arrow),
+    'parquet': ('.parquet', _write_parquet),
+    'csv': ('.csv.gz', _write_csv)
+}
+
+
+def _resolve_format(fmt):
+    """Понижает формат до доступного: без pyarrow остается только csv.gz"""
+    _load_pyarrow()
+    if fmt == 'parquet' and pq is None:
+        fmt = 'arrow'
+    if fmt == 'arrow' and pa is None:
+        fmt = 'csv'
+    return fmt
+
+
+def export_month_sheet(spreadsheet, sheet_name, target_date, out_dir=None, fmt=None, layout=None):
+    """Сохраняет лист месяца в локальный колоночный файл и возвращает путь к нему"""
+    out_dir = out_dir or ARCHIVE_DIR
+    suffix, writer = ARCHIVE_WRITERS[_resolve_format(fmt or ARCHIVE_FORMAT)]
+    os.makedirs(out_dir, exist_ok=True)
+
+    columns = fetch_sheet_rows(spreadsheet, sheet_name, target_date, layout=layout)
+
+    path = os.path.join(out_dir, f"{sheet_name}{suffix}")
+    tmp_path = f"{path}.tmp"
+    writer(tmp_path, columns)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Лист {sheet_name} сохранен в архив: {path} ({len(columns['day'])} ячеек)")
+    return path
+
+
+def load_archive(path):
+    """Открывает архив: таблица pyarrow (через memory map) или список строк для csv.gz"""
+    _load_pyarrow()
+    if path.endswith('.arrow'):
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    if path.endswith('.parquet'):
+        return pq.read_table(path, memory_map=True)
+
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return [
+            {**row, 'day': int(row['day'])}
+            for row in csv.DictReader(f)
+        ]
+
+
+def occupancy_stats(path):
+    """Занятость по каналам из архива: {канал: {'booked': n, 'cancelled': n, 'free': n}}"""
+    data = load_archive(path)
+    stats = {}
+
+    if isinstance(data, list):
+        for row in data:
+            counter = stats.setdefault(row['channel'], Counter())
+            counter[cell_status(row['text'], row['color']).name.lower()] += 1
+        return {channel: dict(counter) for channel, counter in stats.items()}
+
+    booked = pc.not_equal(data['text'], '')
+    cancelled = pc.and_(pc.invert(booked), pc.equal(pc.cast(data['color'], pa.string()), CANCEL_COLOR))
+    status = pc.if_else(booked, 'booked', pc.if_else(cancelled, 'cancelled', 'free'))
+    grouped = pa.table({
+        'channel': pc.cast(data['channel'], pa.string()),
+        'status': status
+    }).group_by(['channel', 'status']).aggregate([([], 'count_all')])
+
+    for channel, status, count in zip(*(grouped[name].to_pylist() for name in ('channel', 'status', 'count_all'))):
+        stats.setdefault(channel, {})[status] = count
+    return stats
+
@@ -0,0 +1,212 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from app.context import current_tenant
+from app.layout import get_layout
+from app.settings import GRID_CACHE_TTL
+from app.shards import fetch_fingerprints, fetch_grid
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class CellChange:
+    """Запись бота в смену: прежние и новые текст и цвет (индекс канала общий)"""
+    channel_idx: int
+    day: int
+    shift: int
+    old_text: str
+    old_color: str
+    text: str
+    color: str
+
+
+class GridListener:
+    """Индекс поверх кэша сеток; методы вызываются при загрузке, записи и сбросе листа"""
+
+    def grid_loaded(self, grid):
+        pass
+
+    def cells_changed(self, grid, changes):
+        pass
+
+    def grid_dropped(self, sheet_name):
+        pass
+
+
+class GridCache:
+    """Сетки месяцев по названиям листов.
+
+    Лист читается целиком одним запросом на шард, дальше сетку обновляют
+    записи бота (apply). Через GRID_CACHE_TTL секунд лист перечитывается,
+    чтобы подхватить правки, сделанные в таблице вручную.
+
+    Сетки из снимка (restore) до первого обращения не считаются свежими:
+    get сверяет время изменения таблиц с отпечатками снимка и перечитывает
+    лист, только если таблицы менялись.
+    """
+
+    def __init__(self, ttl=GRID_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # название листа -> (сетка, время загрузки)
+        self._pending = {}  # название листа -> отпечатки таблиц из снимка, еще не сверенные
+        self._writing = Counter()  # название листа -> записей бота в работе
+        self._locks = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        for grid, _ in self._entries.values():
+            listener.grid_loaded(grid)
+
+    def _notify(self, method, *args):
+        for listener in self._listeners:
+            try:
+                getattr(listener, method)(*args)
+            except Exception as e:
+                # Сломанный индекс не должен мешать записи в таблицу
+                logger.error(f"Ошибка индекса {type(listener).__name__}.{method}: {e}")
+
+    def peek(self, sheet_name, layout=None):
+        """Сетка из кэша без обращения к таблице (или None)"""
+        layout = layout or get_layout()
+        entry = self._entries.get(sheet_name)
+        if entry and entry[0].layout is layout:
+            return entry[0]
+        return None
+
+    def is_fresh(self, sheet_name, layout=None):
+        entry = self._entries.get(sheet_name)
+        return (
+            entry is not None
+            and sheet_name not in self._pending
+            and entry[0].layout is (layout or get_layout())
+            and time.monotonic() - entry[1] < self.ttl
+        )
+
+    async def get(self, client, sheet_name, layout=None):
+        """Сетка листа: из кэша или одним чтением на шард"""
+        layout = layout or get_layout()
+        if self.is_fresh(sheet_name, layout):
+            return self._entries[sheet_name][0]
+
+        lock = self._locks.setdefault(sheet_name, asyncio.Lock())
+        async with lock:
+            # Пока ждали, лист мог загрузить другой запрос
+            if self.is_fresh(sheet_name, layout):
+                return self._entries[sheet_name][0]
+            if sheet_name in self._pending and await self.revalidate(client, sheet_name, layout):
+                return self._entries[sheet_name][0]
+            grid = await fetch_grid(client, sheet_name, layout=layout)
+            self.store(grid)
+            return grid
+
+    def store(self, grid, loaded_at=None):
+        self._entries[grid.sheet_name] = (grid, loaded_at if loaded_at is not None else time.monotonic())
+        self._pending.pop(grid.sheet_name, None)
+        self._notify('grid_loaded', grid)
+
+    def restore(self, grid, loaded_at, fingerprints):
+        """Сетка из снимка: используется после сверки отпечатков {spreadsheet_id: modifiedTime}"""
+        self.store(grid, loaded_at)
+        self._pending[grid.sheet_name] = fingerprints
+
+    async def revalidate(self, client, sheet_name, layout):
+        """Сверяет сетку из снимка с таблицами; True, если таблицы не менялись и сетку можно использовать"""
+        fingerprints = self._pending.pop(sheet_name)
+        try:
+            current = await fetch_fingerprints(client, layout)
+        except Exception as e:
+            logger.warning(f"Не удалось сверить лист {sheet_name} со снимком: {e}")
+            return False
+        return current == fingerprints and self.is_fresh(sheet_name, layout)
+
+    def entries(self):
+        """Закэшированные сетки: [(сетка, возраст в секундах, отпечатки снимка или None, если сверена)]"""
+        now = time.monotonic()
+        return [
+            (grid, now - loaded_at, self._pending.get(sheet_name))
+            for sheet_name, (grid, loaded_at) in self._entries.items()
+        ]
+
+    def apply(self, sheet_name, cells):
+        """Переносит записи бота [(канал, день, смена, текст, цвет), ...] в закэшированную сетку"""
+        entry = self._entries.get(sheet_name)
+        if entry is None:
+            return
+        grid = entry[0]
+
+        changes = []
+        for channel_idx, day, shift, text, color in cells:
+            if channel_idx >= len(grid.layout.channels):
+                continue
+            changes.append(CellChange(
+                channel_idx, day, shift,
+                grid.text(channel_idx, day, shift), grid.color(channel_idx, day, shift),
+                text, color
+            ))
+            grid.set_cell(channel_idx, day, shift, text, color)
+
+        self._notify('cells_changed', grid, changes)
+
+    def relayout(self, layout, keep):
+        """Переводит сетки на новую раскладку; сетки, для которых keep(grid) ложно, сбрасываются.
+
+        Индексы перестраиваются по сохраненным сеткам без чтения таблицы.
+        Возвращает (сохранено, сброшено).
+        """
+        kept = dropped = 0
+        for sheet_name, (grid, _) in list(self._entries.items()):
+            if grid.layout is layout:
+                continue
+            if keep(grid):
+                grid.layout = layout
+                self._notify('grid_loaded', grid)
+                kept += 1
+            else:
+                self.invalidate(sheet_name)
+                dropped += 1
+        return kept, dropped
+
+    @contextlib.contextmanager
+    def writing(self, sheet_name):
+        """Запись бота в лист: пока идет, сетка не попадает в снимок; сорвавшаяся запись сбрасывает сетку"""
+        self._writing[sheet_name] += 1
+        try:
+            yield
+        except BaseException:
+            # Часть пакетов могла дойти до таблицы: сетке больше нельзя верить
+            self.invalidate(sheet_name)
+            raise
+        finally:
+            self._writing[sheet_name] -= 1
+            if not self._writing[sheet_name]:
+                del self._writing[sheet_name]
+
+    def is_writing(self, sheet_name):
+        return sheet_name in self._writing
+
+    def invalidate(self, sheet_name=None):
+        """Сбрасывает один лист или весь кэш"""
+        names = [sheet_name] if sheet_name is not None else list(self._entries)
+        for name in names:
+            self._pending.pop(name, None)
+            if self._entries.pop(name, None) is not None:
+                self._notify('grid_dropped', name)
+
+    def sheet_names(self):
+        return list(self._entries)
+
+
+# Общий кэш бота
+grid_cache = GridCache()
+
+
+def get_grid_cache():
+    """Кэш сеток арендатора текущего обработчика"""
+    tenant = current_tenant.get()
+    return tenant.grid_cache if tenant is not None else grid_cache
@@ -0,0 +1,73 @@
+# Запросов в одном spreadsheets.batchUpdate (с запасом до ограничений API на размер тела)
+MAX_BATCH_REQUESTS = 500
+
+CELL_FIELDS = 'userEnteredValue,userEnteredFormat.backgroundColor'
+
+
+def strip_zero(color):
+    """backgroundColor без нулевых компонент: API считает отсутствующую компоненту нулем"""
+    return {k: v for k, v in color.items() if v}
+
+
+def merge_rectangles(cells):
+    """Сливает ячейки {(строка, колонка): значение} в прямоугольники.
+
+    Сначала соседние колонки одной строки склеиваются в отрезки, затем
+    отрезки с теми же колонками в идущих подряд строках - в прямоугольники.
+    Возвращает [(первая строка, первая колонка, [[значение, ...], ...]), ...].
+    """
+    segments = []
+    for row, col in sorted(cells):
+        last = segments[-1] if segments else None
+        if last and last[0] == row and last[1] + len(last[2]) == col:
+            last[2].append(cells[(row, col)])
+        else:
+            segments.append((row, col, [cells[(row, col)]]))
+
+    rectangles = []
+    open_rectangles = {}  # (первая колонка, ширина) -> [первая строка, последняя строка, строки]
+    for row, col, values in segments:
+        key = (col, len(values))
+        rect = open_rectangles.get(key)
+        if rect and rect[1] == row - 1:
+            rect[1] = row
+            rect[2].append(values)
+        else:
+            rect = open_rectangles[key] = [row, row, [values]]
+            rectangles.append((rect, col))
+
+    return [(rect[0], col, rect[2]) for rect, col in rectangles]
+
+
+def compile_cell_updates(sheet_id, cells):
+    """Запросы updateCells для {(строка, колонка) с единицы: (текст, цвет)}.
+
+    Соседние ячейки объединяются в прямоугольные блоки.
+    """
+    requests = []
+    for first_row, first_col, rows in merge_rectangles(cells):
+        requests.append({
+            'updateCells': {
+                'range': {
+                    'sheetId': sheet_id,
+                    'startRowIndex': first_row - 1,
+                    'endRowIndex': first_row - 1 + len(rows),
+                    'startColumnIndex': first_col - 1,
+                    'endColumnIndex': first_col - 1 + len(rows[0])
+                },
+                'rows': [{
+                    'values': [{
+                        'userEnteredValue': {'stringValue': text},
+                        'userEnteredFormat': {'backgroundColor': strip_zero(color)}
+                    } for text, color in values]
+                } for values in rows],
+                'fields': CELL_FIELDS
+            }
+        })
+    return requests
+
+
+def iter_batches(requests, size=MAX_BATCH_REQUESTS):
+    for i in range(0, len(requests), size):
+        yield requests[i:i + size]
+
@@ -0,0 +1,22 @@
+import asyncio
+import contextvars
+import functools
+
+# Арендатор (команда со своей таблицей), которого обслуживает текущий обработчик.
+# Задается TenantRouter на время обработки обновления, виден и в потоках to_thread.
+# None - единственная таблица из config.py
+current_tenant = contextvars.ContextVar('tenant', default=None)
+
+
+async def to_thread(func, /, *args, **kwargs):
+    """Как asyncio.to_thread, но в пуле потоков текущего арендатора.
+
+    У арендатора свой ограниченный пул для обращений к Sheets API: команда,
+    занявшая все свои потоки, не задерживает чтения и записи других.
+    """
+    tenant = current_tenant.get()
+    if tenant is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(tenant.executor, call)
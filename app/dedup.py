@@ -0,0 +1,136 @@
+"""Повторная обработка команд записи.
+
+Пользователь, не дождавшись ответа, отправляет бронирование еще раз, а после
+перезапуска опроса Telegram может доставить то же сообщение повторно. Для
+голубого цвета повтор дописал бы текст в ячейки второй раз, поэтому команды
+записи выполняются через CommandLog: повтор получает отчет первого выполнения
+и к таблице не обращается.
+
+Повтор узнается по (чат, id сообщения) или по отпечатку разобранной команды
+от того же чата в пределах DEDUP_WINDOW секунд (двойная отправка). Любая
+другая запись в тот же лист забывает отпечатки листа: бронь после отмены -
+уже новая команда. Отчеты, где из-за сбоя ничего не записано, не
+запоминаются, чтобы повтор выполнил команду заново. Журнал ограничен
+DEDUP_SIZE записями и сохраняется в снимке (app.snapshot).
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from app.settings import DEDUP_SIZE, DEDUP_WINDOW
+
+MESSAGE = 'message'
+CONTENT = 'content'
+
+
+def message_key(tenant_name, chat_id, message_id):
+    return (MESSAGE, tenant_name, chat_id, message_id)
+
+
+def content_key(tenant_name, chat_id, sheet_name, command):
+    """Ключ по смыслу команды: те же ячейки, цвет и текст дают тот же ключ при любом порядке строк"""
+    cells = sorted({(entry.channel_idx, entry.shift) for entry in command.entries})
+    unknown = sorted({(entry.channel, entry.time) for entry in command.unknown})
+    payload = repr((command.kind, sheet_name, command.day, command.color, command.text, cells, unknown))
+    digest = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    return (CONTENT, tenant_name, chat_id, sheet_name, digest)
+
+
+class CommandLog:
+    """Отчеты выполненных команд: LRU по ключам повтора"""
+
+    def __init__(self, maxsize=DEDUP_SIZE, window=DEDUP_WINDOW):
+        self.maxsize = maxsize
+        self.window = window
+        self._items = OrderedDict()  # ключ -> (время выполнения, отчет)
+        self._pending = {}  # ключ -> Future отчета команды, которая еще выполняется
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, keys, now=None):
+        """Отчет первого найденного ключа или None.
+
+        Ключ сообщения действует, пока запись не вытеснена, ключ отпечатка -
+        только window секунд: та же бронь позже - уже новая команда.
+        """
+        now = time.time() if now is None else now
+        for key in keys:
+            item = self._items.get(key)
+            if item is None:
+                continue
+            stored_at, report = item
+            if key[0] == CONTENT and now - stored_at > self.window:
+                continue
+            self._items.move_to_end(key)
+            return report
+        return None
+
+    def put(self, keys, report, stored_at=None):
+        stored_at = time.time() if stored_at is None else stored_at
+        for key in keys:
+            self._items[key] = (stored_at, report)
+            self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def forget_sheet(self, tenant_name, sheet_name, keep=()):
+        """Забывает отпечатки команд листа (кроме keep): запись в лист делает их устаревшими"""
+        stale = [
+            key for key in self._items
+            if key[0] == CONTENT and key[1] == tenant_name and key[3] == sheet_name and key not in keep
+        ]
+        for key in stale:
+            del self._items[key]
+
+    async def run(self, keys, action, keep=None):
+        """Выполняет action() один раз на ключи: (отчет, был ли это повтор).
+
+        Повтор, пришедший во время выполнения, ждет его отчет. Если
+        выполнение завершилось исключением или keep(отчет) ложно, отчет не
+        запоминается, и ждавший повтор выполняет команду сам.
+        """
+        while True:
+            report = self.get(keys)
+            if report is not None:
+                return report, True
+            pending = next((self._pending[key] for key in keys if key in self._pending), None)
+            if pending is None:
+                break
+            report = await asyncio.shield(pending)
+            if report is not None:
+                return report, True
+
+        future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._pending[key] = future
+        stored = None
+        try:
+            # Новая команда меняет лист: прежние отпечатки его команд больше не повторы
+            for key in keys:
+                if key[0] == CONTENT:
+                    self.forget_sheet(key[1], key[3], keys)
+            report = await action()
+            if keep is None or keep(report):
+                self.put(keys, report)
+                stored = report
+            return report, False
+        finally:
+            for key in keys:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+            future.set_result(stored)
+
+    def dump(self):
+        """Записи для снимка: [[ключ, время, отчет], ...] от старых к новым"""
+        return [[list(key), stored_at, report] for key, (stored_at, report) in self._items.items()]
+
+    def load(self, items):
+        now = time.time()
+        for key, stored_at, report in items:
+            key = tuple(key)
+            if key[0] == CONTENT and now - stored_at > self.window:
+                continue
+            if key not in self._items:
+                self.put([key], report, stored_at)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from app.admission import TokenBucket
+from app.settings import BROADCAST_RATE, BROADCAST_RETRIES, DIGEST_FILE
+
+logger = logging.getLogger(__name__)
+
+# Сколько чатов обслуживается параллельно (скорость ограничивает общий bucket)
+BROADCAST_WORKERS = 4
+
+
+class Subscriptions:
+    """Чаты, подписанные на ежедневную сводку; список хранится в JSON-файле"""
+
+    def __init__(self, path=DIGEST_FILE):
+        self.path = path
+        self.chat_ids = set()
+        self._save_lock = asyncio.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.chat_ids = set(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Не удалось прочитать подписки {path}: {e}")
+
+    def __len__(self):
+        return len(self.chat_ids)
+
+    def __iter__(self):
+        return iter(sorted(self.chat_ids))
+
+    def __contains__(self, chat_id):
+        return chat_id in self.chat_ids
+
+    async def add(self, chat_id):
+        if chat_id in self.chat_ids:
+            return False
+        self.chat_ids.add(chat_id)
+        await self.save()
+        return True
+
+    async def remove(self, *chat_ids):
+        """Убирает чаты одной записью файла; False, если ни один не был подписан"""
+        removed = self.chat_ids & set(chat_ids)
+        if not removed:
+            return False
+        self.chat_ids -= removed
+        await self.save()
+        return True
+
+    async def save(self):
+        # Файл пишется в потоке и по одной записи за раз: поздняя запись не перекрывается ранней
+        async with self._save_lock:
+            await asyncio.to_thread(self._write, sorted(self.chat_ids))
+
+    def _write(self, chat_ids):
+        # Через временный файл, чтобы обрыв записи не испортил список
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chat_ids, f)
+        os.replace(tmp_path, self.path)
+
+
+class Broadcast:
+    """Рассылка готовых сообщений по многим чатам.
+
+    Общая скорость ограничена token bucket (лимит Telegram - около 30
+    сообщений в секунду). Flood wait (429 с retry_after) останавливает всю
+    рассылку на указанное время, сообщение отправляется повторно. Чаты,
+    заблокировавшие бота, возвращаются в результате.
+    """
+
+    def __init__(self, bot, rate=BROADCAST_RATE, retries=BROADCAST_RETRIES, workers=BROADCAST_WORKERS):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, 1)  # без запаса: ровный поток, а не пачка в первую секунду
+        self.retries = retries
+        self.workers = workers
+        self.resume_at = 0.0
+
+    async def send(self, chat_ids, chunks, **kwargs):
+        """Отправляет куски chunks в каждый чат по порядку: {'sent', 'failed', 'blocked'}"""
+        result = {'sent': 0, 'failed': 0, 'blocked': []}
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        async def worker():
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+                try:
+                    for chunk in chunks:
+                        await self.send_one(chat_id, chunk, **kwargs)
+                    result['sent'] += 1
+                except TelegramForbiddenError:
+                    result['blocked'].append(chat_id)
+                except Exception as e:
+                    logger.warning(f"Сводка не доставлена в чат {chat_id}: {e}")
+                    result['failed'] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, queue.qsize()))))
+        return result
+
+    async def send_one(self, chat_id, text, **kwargs):
+        for attempt in range(self.retries + 1):
+            await self.wait_turn()
+            try:
+                return await self.bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Flood wait рассылки: пауза {e.retry_after} сек")
+                self.resume_at = max(self.resume_at, time.monotonic() + e.retry_after)
+            except TelegramForbiddenError:
+                raise
+            except TelegramAPIError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def wait_turn(self):
+        while True:
+            pause = self.resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = self.bucket.take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+def seconds_until(at, now=None):
+    """Секунд до ближайшего времени дня at ('08:00')"""
+    now = now or datetime.now()
+    hours, minutes = map(int, at.split(':'))
+    target = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+async def run_daily(at, job):
+    """Запускает job каждый день в время at; ошибка одного запуска не останавливает расписание"""
+    while True:
+        await asyncio.sleep(seconds_until(at))
+        try:
+            await job()
+        except Exception as e:
+            logger.error(f"Ошибка ежедневной задачи: {e}")
+        # Не запускаться дважды в ту же минуту
+        await asyncio.sleep(60)
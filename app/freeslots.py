@@ -0,0 +1,120 @@
+import calendar
+import heapq
+from datetime import date
+
+from app.cache import GridListener
+from app.grid import CellStatus
+from app.layout import DAYS_IN_TABLE, SHIFTS
+from app.sheets import sheet_month
+
+SLOTS_PER_CHANNEL = DAYS_IN_TABLE * len(SHIFTS)
+
+
+def shift_mask(shifts):
+    """Маска выбранных смен на все дни таблицы"""
+    day_bits = sum(1 << shift for shift in shifts)
+    mask = 0
+    for day in range(DAYS_IN_TABLE):
+        mask |= day_bits << (day * len(SHIFTS))
+    return mask
+
+
+ALL_SHIFTS_MASK = shift_mask(range(len(SHIFTS)))
+
+
+def iter_bits(bits):
+    """Номера установленных битов по возрастанию"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class MonthSlots:
+    """Свободные смены месяца: у каждого канала целое число, бит (день - 1) * 4 + смена"""
+
+    __slots__ = ('month', 'channels')
+
+    def __init__(self, month, channels_count):
+        self.month = month  # date первого числа
+        self.channels = [0] * channels_count
+
+    @classmethod
+    def from_grid(cls, month, grid):
+        slots = cls(month, len(grid.layout.channels))
+        days = calendar.monthrange(month.year, month.month)[1]
+        # Дни за концом месяца в таблице есть, но занять их нельзя
+        month_mask = (1 << days * len(SHIFTS)) - 1
+        for channel_idx in range(len(slots.channels)):
+            start = grid.index(channel_idx, 1, 0)
+            statuses = grid.statuses[start:start + SLOTS_PER_CHANNEL]
+            bits = 0
+            for pos, status in enumerate(statuses):
+                if status != CellStatus.BOOKED:
+                    bits |= 1 << pos
+            slots.channels[channel_idx] = bits & month_mask
+        return slots
+
+    def set_free(self, channel_idx, day, shift, free):
+        bit = 1 << ((day - 1) * len(SHIFTS) + shift)
+        if free:
+            self.channels[channel_idx] |= bit
+        else:
+            self.channels[channel_idx] &= ~bit
+
+    def find(self, channels, mask=ALL_SHIFTS_MASK, from_day=1, limit=10):
+        """Ближайшие свободные смены [(день, смена, канал), ...] начиная с from_day"""
+        mask &= ~((1 << (from_day - 1) * len(SHIFTS)) - 1)
+        streams = [
+            ((pos, channel_idx) for pos in iter_bits(self.channels[channel_idx] & mask))
+            for channel_idx in channels
+        ]
+        found = []
+        for pos, channel_idx in heapq.merge(*streams):
+            day, shift = divmod(pos, len(SHIFTS))
+            found.append((day + 1, shift, channel_idx))
+            if len(found) >= limit:
+                break
+        return found
+
+
+class FreeSlotIndex(GridListener):
+    """Индекс свободных смен по закэшированным сеткам месяцев"""
+
+    def __init__(self):
+        self.months = {}  # название листа -> MonthSlots
+
+    def grid_loaded(self, grid):
+        month = sheet_month(grid.sheet_name)
+        if month is not None:
+            self.months[grid.sheet_name] = MonthSlots.from_grid(month, grid)
+
+    def cells_changed(self, grid, changes):
+        slots = self.months.get(grid.sheet_name)
+        if slots is None:
+            return
+        for change in changes:
+            free = grid.status(change.channel_idx, change.day, change.shift) != CellStatus.BOOKED
+            slots.set_free(change.channel_idx, change.day, change.shift, free)
+
+    def grid_dropped(self, sheet_name):
+        self.months.pop(sheet_name, None)
+
+    def find(self, sheet_names, channels, shifts=None, from_date=None, limit=10):
+        """Ближайшие свободные смены по листам в порядке sheet_names: [(дата, смена, канал), ...]"""
+        mask = shift_mask(shifts) if shifts is not None else ALL_SHIFTS_MASK
+        found = []
+        for sheet_name in sheet_names:
+            slots = self.months.get(sheet_name)
+            if slots is None:
+                continue
+            from_day = 1
+            if from_date and (from_date.year, from_date.month) == (slots.month.year, slots.month.month):
+                from_day = from_date.day
+            elif from_date and slots.month < date(from_date.year, from_date.month, 1):
+                continue
+            for day, shift, channel_idx in slots.find(channels, mask, from_day, limit - len(found)):
+                found.append((slots.month.replace(day=day), shift, channel_idx))
+            if len(found) >= limit:
+                break
+        return found
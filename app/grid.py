@@ -0,0 +1,115 @@
+import logging
+from enum import IntEnum
+
+from app.layout import SHIFTS, DAYS_IN_TABLE, BOOKING_COLORS, CANCEL_COLOR, color_name, get_layout, rowcol_to_a1
+
+logger = logging.getLogger(__name__)
+
+# Только значение и фон ячейки, без остальных свойств листа
+GRID_FIELDS = 'sheets(data(startRow,startColumn,rowData(values(formattedValue,effectiveFormat.backgroundColor))))'
+
+# Код цвета в массиве colors: 0 - нет цвета бронирования, далее по порядку BOOKING_COLORS
+COLOR_NAMES = (None,) + tuple(BOOKING_COLORS)
+COLOR_CODES = {name: code for code, name in enumerate(COLOR_NAMES)}
+
+
+class CellStatus(IntEnum):
+    FREE = 0
+    BOOKED = 1
+    CANCELLED = 2
+
+
+def cell_status(text, color):
+    """Статус ячейки по тексту и названию цвета"""
+    if text and text.strip():
+        return CellStatus.BOOKED
+    if color == CANCEL_COLOR:
+        return CellStatus.CANCELLED
+    return CellStatus.FREE
+
+
+class MonthGrid:
+    """Смены всех каналов листа месяца: статусы и цвета в байтовых массивах, тексты списком"""
+
+    __slots__ = ('sheet_name', 'layout', 'statuses', 'colors', 'texts')
+
+    def __init__(self, sheet_name, layout):
+        size = len(layout.channels) * DAYS_IN_TABLE * len(SHIFTS)
+        self.sheet_name = sheet_name
+        self.layout = layout
+        self.statuses = bytearray(size)
+        self.colors = bytearray(size)
+        self.texts = [''] * size
+
+    @staticmethod
+    def index(channel_idx, day, shift):
+        return (channel_idx * DAYS_IN_TABLE + day - 1) * len(SHIFTS) + shift
+
+    def status(self, channel_idx, day, shift):
+        return CellStatus(self.statuses[self.index(channel_idx, day, shift)])
+
+    def text(self, channel_idx, day, shift):
+        return self.texts[self.index(channel_idx, day, shift)]
+
+    def color(self, channel_idx, day, shift):
+        return COLOR_NAMES[self.colors[self.index(channel_idx, day, shift)]]
+
+    def day_statuses(self, channel_idx, day):
+        """Статусы четырех смен дня (срез без копирования)"""
+        start = self.index(channel_idx, day, 0)
+        return memoryview(self.statuses)[start:start + len(SHIFTS)]
+
+    def copy_channel(self, other, src_idx, dst_idx):
+        """Переносит все смены канала src_idx из другой сетки в канал dst_idx этой"""
+        size = DAYS_IN_TABLE * len(SHIFTS)
+        src = other.index(src_idx, 1, 0)
+        dst = self.index(dst_idx, 1, 0)
+        self.statuses[dst:dst + size] = other.statuses[src:src + size]
+        self.colors[dst:dst + size] = other.colors[src:src + size]
+        self.texts[dst:dst + size] = other.texts[src:src + size]
+
+    def set_cell(self, channel_idx, day, shift, text, color):
+        idx = self.index(channel_idx, day, shift)
+        self.texts[idx] = text
+        self.colors[idx] = COLOR_CODES.get(color, 0)
+        self.statuses[idx] = cell_status(text, color)
+
+
+def grid_ranges(sheet_name, layout, channels=None, day=None):
+    """A1-диапазоны смен: по прямоугольнику на канал или по строке дня, если день задан"""
+    ranges = []
+    for channel_idx in channels if channels is not None else range(len(layout.channels)):
+        first_row, first_col, last_row, last_col = layout.shift_block(channel_idx)
+        if day is not None:
+            first_row = last_row = first_row + day - 1
+        ranges.append(
+            f"'{sheet_name}'!{rowcol_to_a1(first_row, first_col)}"
+            f":{rowcol_to_a1(last_row, last_col)}"
+        )
+    return ranges
+
+
+def fetch_month_grid(spreadsheet, sheet_name, channels=None, day=None, layout=None):
+    """Читает значения и цвета нужных смен одним spreadsheets.get"""
+    layout = layout or get_layout()
+    channels = list(channels) if channels is not None else list(range(len(layout.channels)))
+
+    metadata = spreadsheet.fetch_sheet_metadata(params={
+        'ranges': grid_ranges(sheet_name, layout, channels, day),
+        'includeGridData': 'true',
+        'fields': GRID_FIELDS
+    })
+    sheets = metadata.get('sheets', [])
+    blocks = sheets[0].get('data', []) if sheets else []
+
+    grid = MonthGrid(sheet_name, layout)
+    first_day = day or 1
+    for channel_idx, block in zip(channels, blocks):
+        for row_offset, row in enumerate(block.get('rowData', [])):
+            for shift, cell in enumerate(row.get('values', [])[:len(SHIFTS)]):
+                text = cell.get('formattedValue', '')
+                color = color_name(cell.get('effectiveFormat', {}).get('backgroundColor'))
+                if text or color:
+                    grid.set_cell(channel_idx, first_day + row_offset, shift, text, color)
+
+    return grid
@@ -0,0 +1,132 @@
+import calendar
+
+from app.cache import GridListener
+from app.freeslots import ALL_SHIFTS_MASK, SLOTS_PER_CHANNEL, iter_bits, shift_mask
+from app.grid import CellStatus, cell_status
+from app.layout import SHIFTS
+from app.sheets import sheet_month
+
+
+def day_range_mask(first_day, last_day):
+    """Биты всех смен дней first_day..last_day включительно"""
+    return ((1 << (last_day - first_day + 1) * len(SHIFTS)) - 1) << (first_day - 1) * len(SHIFTS)
+
+
+def slot_of(pos):
+    """Номер бита -> (день, смена)"""
+    day, shift = divmod(pos, len(SHIFTS))
+    return day + 1, shift
+
+
+class GroupSlots:
+    """Свободность смен группы за месяц.
+
+    counts - сколько каналов группы свободно в каждой смене, all_free и
+    any_free - битовые маски смен, свободных у всех и хотя бы у одного
+    канала (бит (день - 1) * 4 + смена). Поддерживаются при каждой записи.
+    """
+
+    __slots__ = ('size', 'days', 'counts', 'all_free', 'any_free')
+
+    def __init__(self, size, days):
+        self.size = size
+        self.days = days
+        self.counts = [0] * SLOTS_PER_CHANNEL
+        self.all_free = 0
+        self.any_free = 0
+
+    def add(self, pos, delta):
+        count = self.counts[pos] = self.counts[pos] + delta
+        bit = 1 << pos
+        self.all_free = self.all_free | bit if count == self.size else self.all_free & ~bit
+        self.any_free = self.any_free | bit if count else self.any_free & ~bit
+
+
+class GroupIndex(GridListener):
+    """Агрегаты свободных смен по группам каналов для закэшированных месяцев.
+
+    Группы берутся из раскладки сетки (CHANNEL_GROUPS), если не заданы явно.
+    """
+
+    def __init__(self, groups=None):
+        self.groups = groups
+        self.months = {}  # название листа -> [GroupSlots по группам]
+        self.groups_of = {}  # название листа -> {канал: номера его групп}
+
+    def grid_loaded(self, grid):
+        month = sheet_month(grid.sheet_name)
+        if month is None:
+            return
+        groups = grid.layout.groups if self.groups is None else self.groups
+        groups_of = {}
+        for group_idx, group in enumerate(groups):
+            for channel_idx in group:
+                groups_of.setdefault(channel_idx, []).append(group_idx)
+
+        days = calendar.monthrange(month.year, month.month)[1]
+        month_slots = []
+        for group in groups:
+            slots = GroupSlots(len(group), days)
+            for channel_idx in group:
+                if channel_idx >= len(grid.layout.channels):
+                    continue
+                start = grid.index(channel_idx, 1, 0)
+                for pos, status in enumerate(grid.statuses[start:start + days * len(SHIFTS)]):
+                    if status != CellStatus.BOOKED:
+                        slots.counts[pos] += 1
+            for pos in range(days * len(SHIFTS)):
+                if slots.counts[pos]:
+                    slots.any_free |= 1 << pos
+                if slots.counts[pos] == slots.size:
+                    slots.all_free |= 1 << pos
+            month_slots.append(slots)
+        self.months[grid.sheet_name] = month_slots
+        self.groups_of[grid.sheet_name] = groups_of
+
+    def cells_changed(self, grid, changes):
+        month_slots = self.months.get(grid.sheet_name)
+        if month_slots is None:
+            return
+        for change in changes:
+            was_free = cell_status(change.old_text, change.old_color) != CellStatus.BOOKED
+            is_free = grid.status(change.channel_idx, change.day, change.shift) != CellStatus.BOOKED
+            if was_free == is_free or not month_slots or change.day > month_slots[0].days:
+                continue
+            pos = (change.day - 1) * len(SHIFTS) + change.shift
+            for group_idx in self.groups_of[grid.sheet_name].get(change.channel_idx, ()):
+                month_slots[group_idx].add(pos, 1 if is_free else -1)
+
+    def grid_dropped(self, sheet_name):
+        self.months.pop(sheet_name, None)
+        self.groups_of.pop(sheet_name, None)
+
+    def group_slots(self, sheet_name, group_idx):
+        month_slots = self.months.get(sheet_name)
+        if month_slots is None:
+            raise KeyError(sheet_name)
+        return month_slots[group_idx]
+
+    def all_free(self, sheet_name, group_idx, shifts=None, first_day=1, last_day=None):
+        """Смены [(день, смена)], свободные у всех каналов группы"""
+        slots = self.group_slots(sheet_name, group_idx)
+        mask = query_mask(slots, shifts, first_day, last_day)
+        return [slot_of(pos) for pos in iter_bits(slots.all_free & mask)]
+
+    def any_free(self, sheet_name, group_idx, shifts=None, first_day=1, last_day=None):
+        """Смены [(день, смена)], свободные хотя бы у одного канала группы"""
+        slots = self.group_slots(sheet_name, group_idx)
+        mask = query_mask(slots, shifts, first_day, last_day)
+        return [slot_of(pos) for pos in iter_bits(slots.any_free & mask)]
+
+    def free_count(self, sheet_name, group_idx, shifts=None, first_day=1, last_day=None):
+        """(свободных смен каналов группы, всего смен каналов группы) за период"""
+        slots = self.group_slots(sheet_name, group_idx)
+        mask = query_mask(slots, shifts, first_day, last_day)
+        positions = list(iter_bits(mask))
+        return sum(slots.counts[pos] for pos in positions), len(positions) * slots.size
+
+
+def query_mask(slots, shifts, first_day, last_day):
+    last_day = min(last_day or slots.days, slots.days)
+    mask = shift_mask(shifts) if shifts is not None else ALL_SHIFTS_MASK
+    return mask & day_range_mask(first_day, last_day) if first_day <= last_day else 0
@@ -0,0 +1,160 @@
+import contextvars
+import re
+
+from app.context import current_tenant
+from config import *
+
+
+# Смены в порядке колонок таблицы канала
+SHIFTS = ('morning', 'afternoon', 'day', 'evening')
+SHIFT_LABELS = ('9', '12', '15', '18')
+# Колонка первой смены относительно первой колонки таблицы ("День", "Дата", смены...)
+SHIFT_OFFSET = 2
+DAYS_IN_TABLE = 31
+
+# Цвета бронирований и отмены (зеленый)
+BOOKING_COLORS = {
+    "красный": {"red": 1, "green": 0, "blue": 0},
+    "желтый": {"red": 1, "green": 1, "blue": 0},
+    "розовый": {"red": 1, "green": 0, "blue": 1},
+    "голубой": {"red": 0, "green": 1, "blue": 1},
+    "зеленый": {"red": 0, "green": 1, "blue": 0}
+}
+CANCEL_COLOR = "зеленый"
+DEFAULT_COLOR = {"red": 1, "green": 1, "blue": 1}
+
+_COLOR_BY_RGB = {
+    (float(c['red']), float(c['green']), float(c['blue'])): name
+    for name, c in BOOKING_COLORS.items()
+}
+
+_TIME_RE = re.compile(r'^(\d{1,2}):\d{2}$')
+
+
+def get_shift(time_str):
+    """Определяет индекс смены (0..3) по времени вида 9:05"""
+    match = _TIME_RE.match(time_str.strip()) if time_str else None
+    if not match:
+        return 3
+    return shift_for_hour(int(match.group(1)))
+
+
+def shift_for_hour(hours):
+    """Индекс смены по часу"""
+    if 6 <= hours < 12: return 0
+    elif 12 <= hours < 15: return 1
+    elif 15 <= hours < 18: return 2
+    else: return 3
+
+
+def rowcol_to_a1(row, col):
+    """Ячейка (строка, колонка) с единицы в нотации A1"""
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return f"{letters}{row}"
+
+
+def color_name(color):
+    """Название цвета из BOOKING_COLORS по backgroundColor ячейки (или None)"""
+    if not color:
+        return None
+    # API не присылает нулевые компоненты
+    key = (
+        round(color.get('red', 0), 2),
+        round(color.get('green', 0), 2),
+        round(color.get('blue', 0), 2)
+    )
+    return _COLOR_BY_RGB.get(key)
+
+
+class Layout:
+    """Расположение таблиц каналов на листе месяца (все координаты с единицы).
+
+    Вместе с раскладкой хранятся группы каналов и ссылки на каналы, чтобы
+    смена конфигурации подменяла все сразу.
+    """
+
+    __slots__ = ('channels', 'table_config', 'channel_index', 'groups', 'links')
+
+    def __init__(self, channels, table_config, groups=(), links=None):
+        self.channels = list(channels)
+        self.table_config = dict(table_config)
+        self.channel_index = {name: idx for idx, name in enumerate(self.channels)}
+        self.groups = [list(group) for group in groups]
+        self.links = dict(links or {})
+
+    def same_geometry(self, other):
+        """Каналы лежат в тех же ячейках (названия и группы могут отличаться)"""
+        return len(self.channels) == len(other.channels) and self.table_config == other.table_config
+
+    def table_origin(self, channel_idx):
+        """Строка названия канала и первая колонка его таблицы"""
+        cfg = self.table_config
+        row_idx, col_idx = divmod(channel_idx, cfg['tables_per_row'])
+        start_row = 1 + row_idx * (cfg['table_height'] + cfg['v_spacing'])
+        start_col = 1 + col_idx * (cfg['table_width'] + cfg['h_spacing'])
+        return start_row, start_col
+
+    def cell(self, channel_idx, day, shift):
+        """Ячейка смены shift в день day"""
+        start_row, start_col = self.table_origin(channel_idx)
+        return start_row + 1 + day, start_col + SHIFT_OFFSET + shift
+
+    def shift_block(self, channel_idx):
+        """Прямоугольник смен канала: (строка, колонка) первой и последней ячейки"""
+        first_row, first_col = self.cell(channel_idx, 1, 0)
+        return first_row, first_col, first_row + DAYS_IN_TABLE - 1, first_col + len(SHIFTS) - 1
+
+    def locate(self, row, col):
+        """Обратное преобразование ячейки в (канал, день, смена) или None"""
+        cfg = self.table_config
+        row_idx, row_off = divmod(row - 1, cfg['table_height'] + cfg['v_spacing'])
+        col_idx, col_off = divmod(col - 1, cfg['table_width'] + cfg['h_spacing'])
+        if col_idx >= cfg['tables_per_row']:
+            return None
+
+        day = row_off - 1
+        shift = col_off - SHIFT_OFFSET
+        if not (1 <= day <= DAYS_IN_TABLE and 0 <= shift < len(SHIFTS)):
+            return None
+
+        channel_idx = row_idx * cfg['tables_per_row'] + col_idx
+        if channel_idx >= len(self.channels):
+            return None
+        return channel_idx, day, shift
+
+
+# Раскладка из config.py; файл LAYOUT_FILE может ее переопределить (app/layout_reload.py)
+CONFIG_LAYOUT = Layout(CHANNELS, TABLE_CONFIG, CHANNEL_GROUPS, CHANNELS_DICT)
+_current_layout = CONFIG_LAYOUT
+
+# Раскладка, закрепленная за обработкой текущего обновления: перезагрузка
+# конфигурации посреди обработки ее не меняет
+pinned_layout = contextvars.ContextVar('pinned_layout', default=None)
+
+
+def get_layout():
+    """Текущая раскладка листа (арендатора текущего обработчика)"""
+    pinned = pinned_layout.get()
+    if pinned is not None:
+        return pinned
+    tenant = current_tenant.get()
+    return tenant.layout if tenant is not None else _current_layout
+
+
+def set_layout(layout):
+    """Подменяет раскладку таблицы из config.py (одним присваиванием)"""
+    global _current_layout
+    _current_layout = layout
+
+
+def get_groups():
+    """Группы каналов текущей раскладки"""
+    return get_layout().groups
+
+
+def get_channel_links():
+    """Ссылки на каналы по названиям"""
+    return get_layout().links
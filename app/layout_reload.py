@@ -0,0 +1,127 @@
+"""Перезагрузка раскладки каналов без перезапуска бота.
+
+LAYOUT_FILE - JSON с любыми из ключей CHANNELS, CHANNELS_DICT, CHANNEL_GROUPS,
+TABLE_CONFIG; недостающие берутся из config.py. Файл проверяется по времени
+изменения. Новая раскладка подменяется одним присваиванием, обработчики,
+начатые до этого, доделывают работу со старой (pinned_layout). Закэшированные
+сетки сохраняются, если каналы остались в тех же ячейках и тех же таблицах;
+сбрасываются только сетки с изменившейся геометрией.
+"""
+import asyncio
+import json
+import logging
+import os
+
+from app.cache import grid_cache
+from app.layout import CONFIG_LAYOUT, Layout, get_layout, set_layout
+from app.settings import LAYOUT_FILE, LAYOUT_POLL_INTERVAL
+from app.shards import build_shards
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_KEYS = ('CHANNELS', 'CHANNELS_DICT', 'CHANNEL_GROUPS', 'TABLE_CONFIG')
+TABLE_CONFIG_KEYS = ('table_width', 'table_height', 'h_spacing', 'v_spacing', 'tables_per_row')
+
+
+def load_layout(path, base=CONFIG_LAYOUT):
+    """Раскладка из файла поверх base; ValueError, если файл задает некорректную раскладку"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("Файл раскладки должен содержать объект JSON")
+    unknown = set(data) - set(LAYOUT_KEYS)
+    if unknown:
+        raise ValueError(f"Неизвестные ключи: {', '.join(sorted(unknown))}")
+
+    layout = Layout(
+        data.get('CHANNELS', base.channels),
+        data.get('TABLE_CONFIG', base.table_config),
+        data.get('CHANNEL_GROUPS', base.groups),
+        data.get('CHANNELS_DICT', base.links)
+    )
+    validate_layout(layout)
+    return layout
+
+
+def validate_layout(layout):
+    if not layout.channels or not all(isinstance(name, str) and name.strip() for name in layout.channels):
+        raise ValueError("CHANNELS должен быть непустым списком названий")
+    if len(layout.channel_index) != len(layout.channels):
+        raise ValueError("Названия в CHANNELS повторяются")
+    for key in TABLE_CONFIG_KEYS:
+        value = layout.table_config.get(key)
+        if not isinstance(value, int) or value < (1 if key in ('tables_per_row', 'table_width', 'table_height') else 0):
+            raise ValueError(f"TABLE_CONFIG['{key}'] должен быть неотрицательным целым")
+    for group in layout.groups:
+        if not all(isinstance(idx, int) and 0 <= idx < len(layout.channels) for idx in group):
+            raise ValueError(f"Группа {group} ссылается на несуществующий канал")
+    # Каналы из SHARDS должны остаться в раскладке
+    build_shards(layout)
+
+
+def shard_map(layout):
+    return [(shard.spreadsheet_id, shard.channels) for shard in build_shards(layout)]
+
+
+def apply_layout(layout, cache=grid_cache):
+    """Подменяет раскладку; сетки с той же геометрией переводятся на нее, остальные сбрасываются"""
+    old = get_layout()
+    new_shards = shard_map(layout)
+    same_shards = {}  # id раскладки сетки -> совпадает ли раскладка по шардам
+
+    def keep(grid):
+        key = id(grid.layout)
+        if key not in same_shards:
+            same_shards[key] = shard_map(grid.layout) == new_shards
+        return grid.layout.same_geometry(layout) and same_shards[key]
+
+    set_layout(layout)
+    kept, dropped = cache.relayout(layout, keep)
+    logger.info(
+        f"Раскладка обновлена: каналов {len(old.channels)} -> {len(layout.channels)}, "
+        f"сеток сохранено {kept}, сброшено {dropped}"
+    )
+
+
+class LayoutWatcher:
+    """Следит за файлом раскладки; удаление файла возвращает раскладку из config.py"""
+
+    def __init__(self, path=LAYOUT_FILE, interval=LAYOUT_POLL_INTERVAL, cache=grid_cache):
+        self.path = path
+        self.interval = interval
+        self.cache = cache
+        self.stamp = None
+
+    def check(self):
+        """Применяет файл, если он изменился; True, если раскладка подменена"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self.stamp is None:
+                return False
+            self.stamp = None
+            logger.info(f"Файл раскладки {self.path} удален, возвращаем раскладку из config.py")
+            apply_layout(CONFIG_LAYOUT, self.cache)
+            return True
+
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+
+        try:
+            layout = load_layout(self.path)
+        except Exception as e:
+            # Файл мог быть сохранен наполовину: остаемся на текущей раскладке до следующего изменения
+            logger.error(f"Раскладка из {self.path} не применена: {e}")
+            return False
+        apply_layout(layout, self.cache)
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Ошибка проверки файла раскладки: {e}")
@@ -0,0 +1,314 @@
+import re
+from dataclasses import dataclass, field
+
+from app.layout import BOOKING_COLORS, CANCEL_COLOR, get_groups, get_layout, shift_for_hour
+
+
+# "Название канала 9:05": название - все до последнего пробела
+SLOT_RE = re.compile(r'^(?P<channel>.*\S)\s+(?P<time>\S+)$')
+TIME_RE = re.compile(r'^(?P<hours>\d{1,2}):(?P<minutes>\d{2})$')
+DAY_RE = re.compile(r'^\d{1,2}$')
+GROUP_RE = re.compile(r'^группа\s+(?P<number>\d+)(?!\S)', re.IGNORECASE)
+
+# Для бронирования доступны все цвета, кроме цвета отмены
+BOOKING_COLOR_NAMES = tuple(name for name in BOOKING_COLORS if name != CANCEL_COLOR)
+
+
+@dataclass(slots=True, frozen=True)
+class SlotEntry:
+    channel: str
+    channel_idx: int
+    time: str
+    shift: int
+    line_no: int
+
+
+@dataclass(slots=True, frozen=True)
+class LineError:
+    line_no: int  # None - ошибка всего сообщения
+    line: str
+    message: str
+
+    def __str__(self):
+        if self.line_no is None:
+            return self.message
+        return f"Строка {self.line_no}: {self.message}"
+
+
+class UnknownChannelError(ValueError):
+    """Канала нет в таблице: в командах это ошибка одной смены, остальные выполняются"""
+
+    def __init__(self, entry):
+        super().__init__(f"Канал '{entry.channel}' не найден")
+        self.entry = entry
+
+
+FREE_LIMIT_DEFAULT = 10
+FREE_LIMIT_MAX = 50
+
+
+@dataclass(slots=True, frozen=True)
+class FreeQuery:
+    title: str
+    channels: tuple
+    shifts: tuple = None  # None - все смены
+    limit: int = FREE_LIMIT_DEFAULT
+
+
+@dataclass(slots=True, frozen=True)
+class GroupQuery:
+    group_idx: int
+    shifts: tuple = None  # None - все смены
+    week: bool = False  # только текущая неделя, иначе до конца месяца
+
+
+@dataclass(slots=True, frozen=True)
+class AvailabilityQuery:
+    title: str
+    channels: tuple
+    day: int = None  # None - сегодня
+
+
+@dataclass(slots=True, frozen=True)
+class StatsQuery:
+    month_offset: int = 0  # 0 - текущий месяц, 1 - следующий
+    csv: bool = False
+
+
+@dataclass(slots=True)
+class Command:
+    kind: str
+    day: int = 0
+    text: str = ""
+    color: str = ""
+    entries: list = field(default_factory=list)
+    unknown: list = field(default_factory=list)  # SlotEntry каналов, которых нет в таблице
+
+
+def _parse_text(value):
+    return value
+
+
+def _parse_day(value):
+    if not DAY_RE.match(value) or not 1 <= int(value) <= 31:
+        raise ValueError("День должен быть числом от 1 до 31")
+    return int(value)
+
+
+def _parse_color(value):
+    color = value.lower()
+    if color not in BOOKING_COLOR_NAMES:
+        raise ValueError(f"Недопустимый цвет. Используйте: {', '.join(BOOKING_COLOR_NAMES)}")
+    return color
+
+
+def _parse_cancel_keyword(value):
+    if value.lower() != "отмена":
+        raise ValueError("Первая строка должна быть 'Отмена'")
+    return None
+
+
+# Строки-заголовки команд: (поле Command или None, разбор строки)
+COMMAND_HEADERS = {
+    'booking': (('text', _parse_text), ('day', _parse_day), ('color', _parse_color)),
+    'cancel': ((None, _parse_cancel_keyword), ('day', _parse_day))
+}
+MIN_LINES = {
+    'booking': (4, "Сообщение должно содержать минимум 4 строки"),
+    'cancel': (2, "Сообщение отмены должно содержать минимум 2 строки")
+}
+
+
+def parse_slot(line, line_no, channel_index):
+    """Строка 'Канал 9:05' -> SlotEntry; ValueError с понятным текстом при ошибке.
+
+    Для неизвестного канала - UnknownChannelError с разобранной строкой.
+    """
+    match = SLOT_RE.match(line)
+    if not match:
+        raise ValueError(f"Неверный формат: {line}")
+
+    channel_name = match.group('channel')
+    time_str = match.group('time')
+    time_match = TIME_RE.match(time_str)
+    hours = int(time_match.group('hours')) if time_match else -1
+    if not 0 <= hours <= 23 or int(time_match.group('minutes')) > 59:
+        raise ValueError(f"Неверный формат времени: {time_str}")
+
+    entry = SlotEntry(channel_name, channel_index.get(channel_name), time_str, shift_for_hour(hours), line_no)
+    if entry.channel_idx is None:
+        raise UnknownChannelError(entry)
+    return entry
+
+
+def parse_command(text, kind, layout=None):
+    """Разбирает сообщение за один проход: (Command, список всех LineError).
+
+    Неизвестные каналы не ошибка разбора: они попадают в command.unknown и
+    в отчет команды, остальные смены выполняются.
+    """
+    channel_index = (layout or get_layout()).channel_index
+    headers = COMMAND_HEADERS[kind]
+    command = Command(kind)
+    errors = []
+
+    # Номера строк считаются с пустыми, как их видит пользователь; заголовки - непустые строки по порядку
+    filled = 0
+    for line_no, line in enumerate(map(str.strip, (text or "").split('\n')), 1):
+        if not line:
+            continue
+        filled += 1
+        if filled <= len(headers):
+            name, parse = headers[filled - 1]
+            try:
+                value = parse(line)
+            except ValueError as e:
+                errors.append(LineError(line_no, line, str(e)))
+                continue
+            if name:
+                setattr(command, name, value)
+            continue
+
+        try:
+            command.entries.append(parse_slot(line, line_no, channel_index))
+        except UnknownChannelError as e:
+            command.unknown.append(e.entry)
+        except ValueError as e:
+            errors.append(LineError(line_no, line, str(e)))
+
+    min_lines, message = MIN_LINES[kind]
+    if filled < min_lines:
+        errors.append(LineError(None, "", message))
+
+    return command, errors
+
+
+def parse_booking(text, layout=None):
+    return parse_command(text, 'booking', layout)
+
+
+def parse_cancel(text, layout=None):
+    return parse_command(text, 'cancel', layout)
+
+
+def parse_free_query(args, layout=None, groups=None):
+    """Аргументы поиска свободных смен: [канал | группа N] [время смены ...] [количество].
+
+    Возвращает FreeQuery; ValueError с понятным текстом при ошибке.
+    """
+    layout = layout or get_layout()
+    groups = get_groups() if groups is None else groups
+    rest = (args or "").strip()
+    title, channels = "все каналы", tuple(range(len(layout.channels)))
+
+    group_match = GROUP_RE.match(rest)
+    if group_match:
+        number = int(group_match.group('number'))
+        if not 1 <= number <= len(groups):
+            raise ValueError(f"Группы {number} нет, доступны 1-{len(groups)}")
+        title, channels = f"группа {number}", tuple(groups[number - 1])
+        rest = rest[group_match.end():]
+    else:
+        # Название канала может содержать пробелы и цифры: ищем самое длинное совпадение
+        folded = rest.casefold()
+        for name in sorted(layout.channel_index, key=len, reverse=True):
+            if folded.startswith(name.casefold()) and (len(rest) == len(name) or rest[len(name)].isspace()):
+                title, channels = name, (layout.channel_index[name],)
+                rest = rest[len(name):]
+                break
+
+    shifts = set()
+    limit = FREE_LIMIT_DEFAULT
+    for token in rest.split():
+        time_match = TIME_RE.match(token)
+        if time_match and int(time_match.group('hours')) <= 23:
+            shifts.add(shift_for_hour(int(time_match.group('hours'))))
+        elif token.isdigit() and int(token) > 0:
+            limit = min(int(token), FREE_LIMIT_MAX)
+        else:
+            raise ValueError(f"Не понял '{token}': укажите канал или 'группа N', время смены (9:00) и количество")
+
+    return FreeQuery(title, channels, tuple(sorted(shifts)) or None, limit)
+
+
+def parse_group_query(args, groups=None):
+    """Аргументы запроса по группе: N [время смены ...] [неделя] -> GroupQuery; ValueError при ошибке"""
+    groups = get_groups() if groups is None else groups
+    tokens = (args or "").split()
+    if not tokens or not tokens[0].isdigit():
+        raise ValueError("Укажите номер группы")
+    number = int(tokens[0])
+    if not 1 <= number <= len(groups):
+        raise ValueError(f"Группы {number} нет, доступны 1-{len(groups)}")
+
+    shifts = set()
+    week = False
+    for token in tokens[1:]:
+        time_match = TIME_RE.match(token)
+        if time_match and int(time_match.group('hours')) <= 23:
+            shifts.add(shift_for_hour(int(time_match.group('hours'))))
+        elif token.lower() == "неделя":
+            week = True
+        else:
+            raise ValueError(f"Не понял '{token}': укажите время смены (18:00) и/или 'неделя'")
+
+    return GroupQuery(number - 1, tuple(sorted(shifts)) or None, week)
+
+
+def parse_stats_query(args):
+    """Аргументы статистики: [следующий] [csv] -> StatsQuery; ValueError при ошибке"""
+    month_offset = 0
+    as_csv = False
+    for token in (args or "").lower().split():
+        if token in ("следующий", "след"):
+            month_offset = 1
+        elif token == "csv":
+            as_csv = True
+        else:
+            raise ValueError(f"Не понял '{token}': укажите 'следующий' и/или 'csv'")
+    return StatsQuery(month_offset, as_csv)
+
+
+def parse_availability_query(text, layout=None, groups=None):
+    """Инлайн-запрос '[начало названия канала | группа N] [день]' -> AvailabilityQuery; ValueError при ошибке.
+
+    Число в конце считается днем, если без него запрос не перестает
+    совпадать с названием канала ('Канал 2' - канал, а не второе число).
+    """
+    layout = layout or get_layout()
+    groups = get_groups() if groups is None else groups
+    rest = (text or "").strip()
+
+    selection = _select_channels(rest, layout, groups)
+    if selection is not None:
+        return AvailabilityQuery(*selection)
+
+    head, _, last = rest.rpartition(' ')
+    if DAY_RE.match(last):
+        day = _parse_day(last)
+        selection = _select_channels(head.strip(), layout, groups)
+        if selection is not None:
+            return AvailabilityQuery(*selection, day)
+    raise ValueError(f"Нет каналов, начинающихся с '{rest}'")
+
+
+def _select_channels(text, layout, groups):
+    """(название, каналы) по 'группа N', началу названия канала или пустой строке; None, если не совпало"""
+    if not text:
+        return "все каналы", tuple(range(len(layout.channels)))
+
+    group_match = GROUP_RE.match(text)
+    if group_match and group_match.end() == len(text):
+        number = int(group_match.group('number'))
+        if not 1 <= number <= len(groups):
+            raise ValueError(f"Группы {number} нет, доступны 1-{len(groups)}")
+        return f"группа {number}", tuple(groups[number - 1])
+
+    prefix = text.casefold()
+    channels = tuple(idx for idx, name in enumerate(layout.channels) if name.casefold().startswith(prefix))
+    return (text, channels) if channels else None
+
+
+def format_errors(errors):
+    """Все ошибки сообщения одним текстом"""
+    return "\n".join(str(error) for error in errors)
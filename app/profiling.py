@@ -0,0 +1,225 @@
+"""Профилирование отдельных операций бота по запросу.
+
+Операции, обернутые @profiled, профилируются, пока у профайлера есть
+заряд (/profile N или переменная окружения PROFILE_NEXT). Без заряда обертка
+только проверяет счетчик.
+
+Режимы:
+    cpu    - cProfile по CPU потока event loop, файл .prof (snakeviz, flameprof, pstats)
+    sample - выборка стеков event loop и потоков to_thread каждые
+             PROFILE_INTERVAL сек, файл .folded для flamegraph.pl / speedscope
+
+В отчете по операции: общее время, CPU потока event loop, ожидание
+Sheets API (сумма HTTP-запросов операции) и самые дорогие функции.
+Профилируется одна операция за раз; CPU и выборка захватывают все, что
+event loop делал в это время, в том числе чужие обработчики.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from app.settings import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_MODE, PROFILE_NEXT
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cpu', 'sample')
+TOP_FUNCTIONS = 10
+
+# Операция, которая сейчас профилируется (видна и в потоках to_thread)
+current_session = contextvars.ContextVar('profile_session', default=None)
+
+
+class ProfileSession:
+    __slots__ = ('name', 'mode', 'wall', 'cpu', 'io_time', 'io_calls', 'top', 'path', '_lock')
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.io_time = 0.0
+        self.io_calls = 0
+        self.top = []  # [(функция, секунды или доля выборок)]
+        self.path = None
+        self._lock = threading.Lock()
+
+    def add_io(self, seconds):
+        with self._lock:
+            self.io_time += seconds
+            self.io_calls += 1
+
+    def summary(self):
+        lines = [
+            f"{self.name} ({self.mode}): {self.wall * 1000:.0f} мс, "
+            f"CPU event loop {self.cpu * 1000:.0f} мс, "
+            f"Sheets API {self.io_time * 1000:.0f} мс за {self.io_calls} запр."
+        ]
+        unit = "мс" if self.mode == 'cpu' else "%"
+        for function, value in self.top:
+            lines.append(f"  {value * (1000 if self.mode == 'cpu' else 100):7.1f} {unit}  {function}")
+        if self.path:
+            lines.append(f"  файл: {self.path}")
+        return "\n".join(lines)
+
+
+def record_sheets_io(seconds):
+    """Время HTTP-запроса к Sheets API; учитывается, если запрос сделан внутри профилируемой операции"""
+    session = current_session.get()
+    if session is not None:
+        session.add_io(seconds)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def folded_stack(frame, role):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.append(role)
+    return ";".join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Снимает стеки потока event loop и потоков to_thread с заданным интервалом"""
+
+    def __init__(self, loop_thread_id, interval):
+        super().__init__(daemon=True, name='profile-sampler')
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.loop_thread_id:
+                    role = 'loop'
+                elif names.get(thread_id, '').startswith(('asyncio', 'sheets-')):
+                    role = 'io'
+                else:
+                    continue
+                self.stacks[folded_stack(frame, role)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+    def top_functions(self, count=TOP_FUNCTIONS):
+        """Собственные выборки функций (вершина стека) как доля всех выборок"""
+        own = Counter()
+        for stack, hits in self.stacks.items():
+            role, _, rest = stack.partition(';')
+            own[f"[{role}] {rest.rsplit(';', 1)[-1]}"] += hits
+        total = max(self.samples, 1)
+        return [(name, hits / total) for name, hits in own.most_common(count)]
+
+
+class Profiler:
+    def __init__(self, remaining=PROFILE_NEXT, mode=PROFILE_MODE, out_dir=PROFILE_DIR):
+        self.remaining = remaining
+        self.mode = mode if mode in MODES else 'cpu'
+        self.out_dir = out_dir
+        self.reports = deque(maxlen=20)
+        self._busy = False
+
+    def arm(self, count, mode=None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Режим должен быть одним из: {', '.join(MODES)}")
+            self.mode = mode
+        self.remaining = max(0, count)
+
+    async def run(self, name, func, args, kwargs):
+        # Одновременно профилируется одна операция, остальные выполняются как обычно
+        if self._busy:
+            return await func(*args, **kwargs)
+        self._busy = True
+        self.remaining -= 1
+
+        session = ProfileSession(name, self.mode)
+        token = current_session.set(session)
+        if session.mode == 'cpu':
+            # Время функций считается по CPU потока event loop, ожидание I/O в него не входит
+            collector = cProfile.Profile(time.thread_time)
+            collector.enable()
+        else:
+            collector = StackSampler(threading.get_ident(), PROFILE_INTERVAL)
+            collector.start()
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            session.wall = time.perf_counter() - started
+            session.cpu = time.thread_time() - cpu_started
+            if session.mode == 'cpu':
+                collector.disable()
+            else:
+                collector.stop()
+            current_session.reset(token)
+            self._busy = False
+            self.finish(session, collector)
+
+    def finish(self, session, collector):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            if session.mode == 'cpu':
+                session.path = os.path.join(self.out_dir, f"{session.name}-{stamp}.prof")
+                collector.dump_stats(session.path)
+                session.top = cprofile_top(collector)
+            else:
+                session.path = os.path.join(self.out_dir, f"{session.name}-{stamp}.folded")
+                with open(session.path, 'w', encoding='utf-8') as f:
+                    for stack, hits in collector.stacks.most_common():
+                        f.write(f"{stack} {hits}\n")
+                session.top = collector.top_functions()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения профиля {session.name}: {e}")
+
+        self.reports.append(session)
+        logger.info(f"Профиль: {session.summary()}")
+
+    def format_reports(self, count=5):
+        if not self.reports:
+            return "Профилей пока нет"
+        return "\n\n".join(session.summary() for session in list(self.reports)[-count:])
+
+
+def cprofile_top(collector, count=TOP_FUNCTIONS):
+    """Функции с наибольшим собственным временем CPU: [(функция, секунды)]"""
+    stats = pstats.Stats(collector, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+    return [
+        (f"{function} ({os.path.basename(filename)}:{line})", own_time)
+        for (filename, line, function), (_, _, own_time, _, _) in rows
+    ]
+
+
+profiler = Profiler()
+
+
+def profiled(name):
+    """Профилирует вызовы корутины, пока у profiler есть заряд"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not profiler.remaining or current_session.get() is not None:
+                return await func(*args, **kwargs)
+            return await profiler.run(name, func, args, kwargs)
+        return wrapper
+    return decorator
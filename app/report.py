@@ -0,0 +1,158 @@
+import itertools
+import re
+import secrets
+from collections import OrderedDict
+
+from app.layout import get_groups
+
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+# Сколько отрендеренных отчетов держим для кнопок "назад/вперед"
+REPORT_CACHE_SIZE = 256
+
+# Неделимые части HTML строки отчета: теги и сущности
+TAG_RE = re.compile(r'<[^>]*>')
+HTML_UNIT_RE = re.compile(r'<(?P<closing>/?)[^>]*>|&#?\w+;')
+
+
+def format_report(render_line, groups=None, channels_count=None):
+    """Строки отчета по группам каналов (пустая строка между группами).
+
+    render_line(channel_idx) возвращает строку канала или None, если канал
+    в отчет не попадает. Строки строятся только по мере обхода генератора.
+    Каналы, не вошедшие ни в одну группу, идут в конце отдельной группой.
+    """
+    groups = [list(group) for group in (groups if groups is not None else get_groups())]
+    if channels_count is not None:
+        grouped = set(itertools.chain.from_iterable(groups))
+        rest = [idx for idx in range(channels_count) if idx not in grouped]
+        if rest:
+            groups.append(rest)
+
+    has_lines = False
+    for group in groups:
+        group_lines = [line for line in map(render_line, group) if line]
+        if not group_lines:
+            continue
+        if has_lines:
+            yield ""
+        has_lines = True
+        yield from group_lines
+
+    if not has_lines:
+        yield "Все каналы заняты"
+
+
+def iter_chunks(lines, limit=MESSAGE_LIMIT):
+    """Склеивает строки в куски не длиннее limit, разрывая только между строками.
+
+    Строку длиннее limit приходится резать: разрез не попадает внутрь тега,
+    сущности или элемента вроде <a href>, иначе Telegram не примет HTML.
+    """
+    chunk = []
+    size = 0
+    for line in lines:
+        # Слишком длинную строку режем принудительно
+        while len(line) > limit:
+            if chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            cut = _cut_position(line, limit)
+            if not cut:
+                # Элемент целиком длиннее limit: теги убираем, текст режем между сущностями
+                line = TAG_RE.sub('', line)
+                cut = _cut_position(line, limit) or limit
+            yield line[:cut]
+            line = line[cut:]
+
+        added = len(line) + (1 if chunk else 0)
+        if chunk and size + added > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+            added = len(line)
+        chunk.append(line)
+        size += added
+
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def _cut_position(line, limit):
+    """Самый дальний разрез не дальше limit вне тега, сущности и незакрытого элемента; 0 - такого нет"""
+    best = 0
+    depth = 0
+    pos = 0
+    for match in HTML_UNIT_RE.finditer(line):
+        if depth == 0 and match.start() > pos:
+            best = min(match.start(), limit)
+        if match.end() > limit:
+            return best
+        if match.group(0).startswith('<'):
+            depth += -1 if match.group('closing') else 1
+        pos = match.end()
+        if depth == 0:
+            best = pos
+    return limit if depth == 0 else best
+
+
+class ReportPages:
+    """Страницы отчета: строятся лениво по мере запроса и запоминаются"""
+
+    __slots__ = ('title', 'footer', 'context', '_chunks', '_pages', '_done')
+
+    def __init__(self, lines, title="", footer="", context=None):
+        self.title = title
+        self.footer = footer
+        self.context = context
+        # Заголовок и подвал повторяются на каждой странице
+        limit = MESSAGE_LIMIT - len(title) - len(footer)
+        self._chunks = iter_chunks(lines, limit)
+        self._pages = []
+        self._done = False
+
+    def _build_until(self, page):
+        while not self._done and len(self._pages) <= page:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._done = True
+            else:
+                self._pages.append(chunk)
+
+    def get(self, page):
+        """Текст страницы page (с нуля) или None, если такой нет"""
+        self._build_until(page)
+        if 0 <= page < len(self._pages):
+            return f"{self.title}{self._pages[page]}{self.footer}"
+        return None
+
+    def has_next(self, page):
+        self._build_until(page + 1)
+        return page + 1 < len(self._pages)
+
+
+class ReportCache:
+    """Последние отчеты по короткому ключу для callback_data.
+
+    Ключ случайный, чтобы по подобранному callback_data нельзя было открыть
+    чужой отчет.
+    """
+
+    def __init__(self, maxsize=REPORT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def add(self, pages):
+        key = secrets.token_hex(6)
+        while key in self._items:
+            key = secrets.token_hex(6)
+        self._items[key] = pages
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return key
+
+    def get(self, key):
+        pages = self._items.get(key)
+        if pages is not None:
+            self._items.move_to_end(key)
+        return pages
@@ -0,0 +1,114 @@
+import bisect
+import re
+
+from app.cache import GridListener
+from app.layout import DAYS_IN_TABLE, SHIFTS
+from app.sheets import sheet_month
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Слова текста ячейки без учета регистра и ё"""
+    return set(TOKEN_RE.findall(text.lower().replace('ё', 'е')))
+
+
+def query_terms(query):
+    """Слова запроса в порядке ввода, без повторов"""
+    return list(dict.fromkeys(TOKEN_RE.findall(query.lower().replace('ё', 'е'))))
+
+
+def cell_of(pos):
+    """Номер ячейки в сетке -> (канал, день, смена)"""
+    channel_idx, rest = divmod(pos, DAYS_IN_TABLE * len(SHIFTS))
+    day, shift = divmod(rest, len(SHIFTS))
+    return channel_idx, day + 1, shift
+
+
+class SearchIndex(GridListener):
+    """Обратный индекс текстов смен по закэшированным листам: слово -> ячейки.
+
+    Строится при чтении листа и обновляется записями бота: у измененной
+    ячейки убираются слова прежнего текста и добавляются слова нового, так
+    что текст, дописанный через запятую в голубую ячейку, ищется сразу.
+    Слова листа хранятся и отсортированным списком: слова с началом из
+    запроса находятся двоичным поиском, без обхода всего словаря.
+    """
+
+    def __init__(self):
+        self.sheets = {}  # название листа -> {слово: номера ячеек}
+        self.tokens = {}  # название листа -> отсортированные слова
+        self.grids = {}  # название листа -> сетка (для текста найденных ячеек)
+
+    def grid_loaded(self, grid):
+        postings = {}
+        for pos, text in enumerate(grid.texts):
+            if text:
+                for token in tokenize(text):
+                    postings.setdefault(token, set()).add(pos)
+        self.sheets[grid.sheet_name] = postings
+        self.tokens[grid.sheet_name] = sorted(postings)
+        self.grids[grid.sheet_name] = grid
+
+    def cells_changed(self, grid, changes):
+        postings = self.sheets.get(grid.sheet_name)
+        if postings is None:
+            return
+        tokens = self.tokens[grid.sheet_name]
+        for change in changes:
+            pos = grid.index(change.channel_idx, change.day, change.shift)
+            old_tokens = tokenize(change.old_text)
+            new_tokens = tokenize(change.text)
+            for token in old_tokens - new_tokens:
+                cells = postings.get(token)
+                if cells is not None:
+                    cells.discard(pos)
+                    if not cells:
+                        del postings[token]
+                        del tokens[bisect.bisect_left(tokens, token)]
+            for token in new_tokens - old_tokens:
+                if token not in postings:
+                    bisect.insort(tokens, token)
+                postings.setdefault(token, set()).add(pos)
+
+    def grid_dropped(self, sheet_name):
+        self.sheets.pop(sheet_name, None)
+        self.tokens.pop(sheet_name, None)
+        self.grids.pop(sheet_name, None)
+
+    def search(self, query, sheet_names=None):
+        """Смены, текст которых содержит все слова запроса (слово запроса - начало слова в ячейке).
+
+        Возвращает [(лист, канал, день, смена, текст), ...] по месяцам, дням и сменам.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        if sheet_names is None:
+            sheet_names = list(self.sheets)
+        sheet_names = [name for name in sheet_names if name in self.sheets]
+        sheet_names.sort(key=lambda name: (sheet_month(name) is None, sheet_month(name) or name))
+
+        found = []
+        for sheet_name in sheet_names:
+            postings = self.sheets[sheet_name]
+            tokens = self.tokens[sheet_name]
+            cells = None
+            for term in terms:
+                matched = set()
+                # Слова с началом term идут в отсортированном списке подряд
+                for i in range(bisect.bisect_left(tokens, term), len(tokens)):
+                    if not tokens[i].startswith(term):
+                        break
+                    matched |= postings[tokens[i]]
+                cells = matched if cells is None else cells & matched
+                if not cells:
+                    break
+            if not cells:
+                continue
+
+            grid = self.grids[sheet_name]
+            hits = sorted((day, shift, channel_idx, pos) for pos in cells for channel_idx, day, shift in [cell_of(pos)])
+            for day, shift, channel_idx, pos in hits:
+                found.append((sheet_name, channel_idx, day, shift, grid.texts[pos]))
+        return found
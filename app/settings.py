@@ -0,0 +1,90 @@
+# Необязательные настройки: берутся из config.py, если заданы, иначе значения по умолчанию
+import os
+
+import config
+
+
+# Архив прошедших месяцев
+ARCHIVE_DIR = getattr(config, 'ARCHIVE_DIR', 'archive')
+ARCHIVE_FORMAT = getattr(config, 'ARCHIVE_FORMAT', 'arrow')  # arrow / parquet / csv
+
+# Пауза, после которой обслуживается последнее из быстрых нажатий на день (сек)
+DAY_TAP_DEBOUNCE = getattr(config, 'DAY_TAP_DEBOUNCE', 0.3)
+
+# Шарды: каналы по разным таблицам, например
+# [{'spreadsheet_id': '...', 'groups': [1]}, {'spreadsheet_id': '...', 'channels': ['Канал 2']}]
+# Каналы, не попавшие ни в один шард, остаются в SPREADSHEET_ID на прежних местах, поэтому SHARDS
+# можно включить при существующих листах: таблицы вынесенных каналов в SPREADSHEET_ID просто
+# перестают использоваться (старые данные переносятся вручную). В таблице шарда каналы лежат по
+# порядку в шарде: таблица шарда должна быть новой, а изменение состава шарда при существующих
+# листах требует их переноса - иначе каналы попадут в чужие таблицы
+SHARDS = getattr(config, 'SHARDS', [])
+
+# Сервисные аккаунты: запросы распределяются между ними по загрузке
+CREDS_FILES = getattr(config, 'CREDS_FILES', [config.CREDS_FILE])
+ACCOUNT_WINDOW = getattr(config, 'ACCOUNT_WINDOW', 60)  # окно учета запросов (сек)
+ACCOUNT_COOLDOWN = getattr(config, 'ACCOUNT_COOLDOWN', 60)  # пауза после серии 429 (сек)
+ACCOUNT_COOLDOWN_AFTER = getattr(config, 'ACCOUNT_COOLDOWN_AFTER', 3)  # сколько 429 подряд
+
+# Сжатие тел запросов к Sheets API (ответы сжимаются всегда); тела меньше порога не сжимаются
+GZIP_REQUESTS = getattr(config, 'GZIP_REQUESTS', False)
+GZIP_MIN_BYTES = getattr(config, 'GZIP_MIN_BYTES', 1024)
+
+# Допуск к таблице: обработчиков одновременно, длина очереди, запросов пользователя в секунду и запас
+ADMISSION_MAX_CONCURRENT = getattr(config, 'ADMISSION_MAX_CONCURRENT', 8)
+ADMISSION_QUEUE_SIZE = getattr(config, 'ADMISSION_QUEUE_SIZE', 50)
+ADMISSION_USER_RATE = getattr(config, 'ADMISSION_USER_RATE', 0.5)
+ADMISSION_USER_BURST = getattr(config, 'ADMISSION_USER_BURST', 5)
+
+# Через сколько секунд закэшированный лист месяца перечитывается (правки вручную)
+GRID_CACHE_TTL = getattr(config, 'GRID_CACHE_TTL', 600)
+
+# Профилирование: сколько следующих операций профилировать при запуске, режим (cpu / sample),
+# каталог файлов и интервал выборки стеков (сек)
+PROFILE_NEXT = int(os.getenv('PROFILE_NEXT') or getattr(config, 'PROFILE_NEXT', 0))
+PROFILE_MODE = os.getenv('PROFILE_MODE') or getattr(config, 'PROFILE_MODE', 'cpu')
+PROFILE_DIR = getattr(config, 'PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = getattr(config, 'PROFILE_INTERVAL', 0.005)
+
+# Ежедневная сводка свободных смен подписчикам: время рассылки (None - выключена), файл подписок,
+# сообщений в секунду (лимит Telegram - около 30) и повторов при flood wait
+DIGEST_TIME = getattr(config, 'DIGEST_TIME', None)
+DIGEST_FILE = getattr(config, 'DIGEST_FILE', 'digest_subscribers.json')
+BROADCAST_RATE = getattr(config, 'BROADCAST_RATE', 25)
+BROADCAST_RETRIES = getattr(config, 'BROADCAST_RETRIES', 3)
+
+# Сколько секунд Telegram кэширует ответ на инлайн-запрос
+INLINE_CACHE_TIME = getattr(config, 'INLINE_CACHE_TIME', 30)
+
+# Сколько секунд не повторять фоновую загрузку листа после неудачи: лист следующего месяца может
+# быть еще не создан, и инлайн-запросы не должны читать его на каждое нажатие клавиши
+LOAD_RETRY_DELAY = getattr(config, 'LOAD_RETRY_DELAY', 60)
+
+# Арендаторы: команды со своими таблицами в одном процессе. Чаты из 'chats' работают с таблицей
+# арендатора, остальные - с SPREADSHEET_ID. Ключи: name, spreadsheet_id, channels, chats и
+# необязательные table_config, channel_groups, channels_dict, shards, creds_files, admission
+# (параметры AdmissionControl: max_concurrent, queue_size, user_rate, user_burst) и threads
+TENANTS = getattr(config, 'TENANTS', [])
+# Потоков для обращений к Sheets API у каждого арендатора (если не задано threads)
+TENANT_THREADS = getattr(config, 'TENANT_THREADS', 8)
+
+# Файл JSON с CHANNELS, CHANNELS_DICT, CHANNEL_GROUPS и TABLE_CONFIG поверх config.py: изменения
+# подхватываются без перезапуска; проверка времени изменения раз в LAYOUT_POLL_INTERVAL сек
+LAYOUT_FILE = getattr(config, 'LAYOUT_FILE', None)
+LAYOUT_POLL_INTERVAL = getattr(config, 'LAYOUT_POLL_INTERVAL', 5)
+
+# Снимок теплого состояния (сетки месяцев, состояния пользователей): пишется при остановке и
+# каждые SNAPSHOT_INTERVAL сек, читается при запуске. None - не сохранять
+SNAPSHOT_FILE = getattr(config, 'SNAPSHOT_FILE', None)
+SNAPSHOT_INTERVAL = getattr(config, 'SNAPSHOT_INTERVAL', 300)
+
+# Повторы команд записи: сколько отчетов помнить и сколько секунд та же команда из того же чата
+# считается двойной отправкой (повтор сообщения с тем же id узнается, пока запись не вытеснена)
+DEDUP_SIZE = getattr(config, 'DEDUP_SIZE', 1024)
+DEDUP_WINDOW = getattr(config, 'DEDUP_WINDOW', 10)
+
+# Администраторы бота: им доступны служебные команды
+ADMIN_IDS = set(getattr(config, 'ADMIN_IDS', []))
+
+# Свой сервер Bot API (локальный или тестовый), например http://127.0.0.1:8081
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER') or getattr(config, 'TELEGRAM_API_SERVER', None)
@@ -0,0 +1,170 @@
+import asyncio
+import dataclasses
+import logging
+
+from app.context import current_tenant, to_thread
+from app.grid import MonthGrid, fetch_month_grid
+from app.layout import Layout, get_layout
+from app.settings import SHARDS
+from config import *
+
+logger = logging.getLogger(__name__)
+
+
+class Shard:
+    """Таблица с подмножеством каналов.
+
+    В дополнительных таблицах каналы лежат по локальным индексам (по порядку
+    в шарде). Основная таблица (keep_positions) сохраняет общие позиции
+    каналов: листы, созданные до включения SHARDS, читаются и пишутся по
+    тем же ячейкам, а таблицы вынесенных каналов на ее листах не используются.
+    """
+
+    __slots__ = ('spreadsheet_id', 'channels', 'layout', '_local', '_global')
+
+    def __init__(self, spreadsheet_id, channels, layout, keep_positions=False):
+        self.spreadsheet_id = spreadsheet_id
+        self.channels = list(channels)
+        if keep_positions:
+            self.layout = Layout(layout.channels, layout.table_config)
+            self._local = {channel_idx: channel_idx for channel_idx in self.channels}
+        else:
+            self.layout = Layout([layout.channels[idx] for idx in self.channels], layout.table_config)
+            self._local = {channel_idx: local_idx for local_idx, channel_idx in enumerate(self.channels)}
+        self._global = {local_idx: channel_idx for channel_idx, local_idx in self._local.items()}
+
+    def __repr__(self):
+        return f"Shard({self.spreadsheet_id!r}, {len(self.channels)} каналов)"
+
+    def __contains__(self, channel_idx):
+        return channel_idx in self._local
+
+    def local_index(self, channel_idx):
+        return self._local[channel_idx]
+
+    def global_index(self, local_idx):
+        return self._global[local_idx]
+
+    def local_channels(self):
+        """Локальные индексы каналов шарда на его листах"""
+        return [self._local[channel_idx] for channel_idx in self.channels]
+
+
+def build_shards(layout, shards_config=None, groups=None, default_spreadsheet_id=None):
+    """Раскладывает каналы по шардам; оставшиеся каналы идут в основную таблицу"""
+    shards_config = SHARDS if shards_config is None else shards_config
+    groups = layout.groups if groups is None else groups
+    default_spreadsheet_id = default_spreadsheet_id or SPREADSHEET_ID
+
+    assigned = set()
+    shards = []
+    for config_entry in shards_config:
+        channels = []
+        for group_idx in config_entry.get('groups', []):
+            channels.extend(groups[group_idx])
+        for name in config_entry.get('channels', []):
+            if name not in layout.channel_index:
+                raise ValueError(f"Канал '{name}' из SHARDS не найден")
+            channels.append(layout.channel_index[name])
+
+        channels = [idx for idx in dict.fromkeys(channels) if idx not in assigned]
+        assigned.update(channels)
+        if channels:
+            shards.append(Shard(config_entry['spreadsheet_id'], channels, layout))
+
+    rest = [idx for idx in range(len(layout.channels)) if idx not in assigned]
+    if rest:
+        # Основная таблица не переставляет каналы: ее существующие листы остаются верными
+        shards.insert(0, Shard(default_spreadsheet_id, rest, layout, keep_positions=True))
+    return shards
+
+
+_shards_cache = (None, [])
+
+
+def get_shards(layout=None):
+    """Шарды для раскладки (пересчитываются только при смене раскладки)"""
+    global _shards_cache
+    tenant = current_tenant.get()
+    if tenant is not None and layout in (None, tenant.layout):
+        return tenant.shards
+    layout = layout or get_layout()
+    cached_layout, shards = _shards_cache
+    if cached_layout is not layout:
+        shards = build_shards(layout)
+        _shards_cache = (layout, shards)
+    return shards
+
+
+def split_by_shard(slots, shards):
+    """Раскладывает записи по шардам, переводя индекс канала в локальный"""
+    by_shard = {}
+    for slot in slots:
+        for shard in shards:
+            if slot.channel_idx in shard:
+                local_slot = dataclasses.replace(slot, channel_idx=shard.local_index(slot.channel_idx))
+                by_shard.setdefault(shard, []).append(local_slot)
+                break
+    return list(by_shard.items())
+
+
+async def fan_out(func, shards, *args):
+    """Запускает func(shard, *args) для всех шардов одновременно; результаты в порядке шардов.
+
+    Ошибка шарда поднимается только после завершения остальных: работа
+    других таблиц не обрывается на середине.
+    """
+    results = await asyncio.gather(*(func(shard, *args) for shard in shards), return_exceptions=True)
+    errors = [(shard, result) for shard, result in zip(shards, results) if isinstance(result, BaseException)]
+    for shard, error in errors:
+        logger.error(f"Ошибка таблицы {shard.spreadsheet_id}: {error}")
+    if errors:
+        raise errors[0][1]
+    return results
+
+
+async def gather_shards(func, by_shard):
+    """Запускает func(shard, slots) для [(shard, slots), ...] одновременно: [(shard, slots, результат или исключение)]"""
+    results = await asyncio.gather(*(func(shard, slots) for shard, slots in by_shard), return_exceptions=True)
+    for (shard, _), result in zip(by_shard, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Ошибка таблицы {shard.spreadsheet_id}: {result}")
+    return [(shard, slots, result) for (shard, slots), result in zip(by_shard, results)]
+
+
+async def fetch_fingerprints(client, layout=None):
+    """Время последнего изменения таблиц всех шардов: {spreadsheet_id: modifiedTime}"""
+    shards = get_shards(layout)
+
+    async def fetch_shard(shard):
+        return await to_thread(client.modified_time, shard.spreadsheet_id)
+
+    return dict(zip((shard.spreadsheet_id for shard in shards), await fan_out(fetch_shard, shards)))
+
+
+def merge_grids(sheet_name, layout, parts):
+    """Собирает общую сетку из сеток шардов [(shard, grid), ...]"""
+    grid = MonthGrid(sheet_name, layout)
+    for shard, part in parts:
+        for channel_idx in shard.channels:
+            grid.copy_channel(part, shard.local_index(channel_idx), channel_idx)
+    return grid
+
+
+async def fetch_grid(client, sheet_name, day=None, layout=None):
+    """Сетка месяца (или одного дня) по всем шардам: по одному spreadsheets.get на шард"""
+    layout = layout or get_layout()
+    shards = get_shards(layout)
+
+    async def fetch_shard(shard):
+        spreadsheet = await to_thread(client.open_by_key, shard.spreadsheet_id)
+        return await to_thread(
+            fetch_month_grid, spreadsheet, sheet_name, channels=shard.local_channels(), day=day, layout=shard.layout
+        )
+
+    parts = await fan_out(fetch_shard, shards)
+    if len(shards) == 1 and shards[0].channels == list(range(len(layout.channels))):
+        # Без шардирования локальные индексы совпадают с общими
+        parts[0].layout = layout
+        return parts[0]
+    return merge_grids(sheet_name, layout, zip(shards, parts))
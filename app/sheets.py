@@ -2,50 +2,68 @@
 
 import logging
 from datetime import datetime
-from google.api_core import retry
-from googleapiclient.errors import HttpError
 from dateutil.relativedelta import relativedelta
-import gspread
-from google.oauth2.service_account import Credentials
+from functools import lru_cache
 import asyncio
 import re
 import os
 import html
 
 from config import *
+from app.accounts import AccountPool
+from app.archive import export_month_sheet
+from app.cache import get_grid_cache
+from app.context import current_tenant, to_thread
+from app.compiler import compile_cell_updates, iter_batches
+from app.grid import fetch_month_grid
+from app.profiling import profiled
+from app.layout import BOOKING_COLORS, CANCEL_COLOR, DEFAULT_COLOR, get_channel_links
+from app.settings import CREDS_FILES
+from app.shards import fan_out, gather_shards, get_shards, split_by_shard
 
 logger = logging.getLogger(__name__)
 
+# Заголовок раздела ошибок в отчетах записи и отмены
+REPORT_ERRORS_HEADER = "❌ Ошибки:"
+REPORT_SUCCESS_HEADER = "✅ Успешно:"
+READ_ERROR_MESSAGE = "Ошибка чтения ячейки"
+SHARD_ERROR_MESSAGE = "Ошибка таблицы, смена не обработана"
+
+
+# Пул сервисных аккаунтов (авторизуется один раз за процесс)
+account_pool = None
+_account_pool_lock = asyncio.Lock()
+
 
 # Подключение к Google Sheets
 async def setup_google_sheets():
+    """Возвращает пул аккаунтов; он используется вместо клиента gspread"""
+    global account_pool
+    tenant = current_tenant.get()
+    if tenant is not None:
+        return await tenant.get_account_pool()
     try:
-        if not os.path.exists(CREDS_FILE):
-            raise FileNotFoundError(f"Файл {CREDS_FILE} не найден!")
-        
-        creds = Credentials.from_service_account_file(
-            CREDS_FILE, 
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
-        )
-        client = gspread.authorize(creds)
-        logger.info(f"Используем сервисный аккаунт: {creds.service_account_email}")
-        return client
+        async with _account_pool_lock:
+            if account_pool is None:
+                pool = AccountPool(CREDS_FILES)
+                await to_thread(pool.authorize)
+                account_pool = pool
+        return account_pool
     except Exception as e:
         logger.error(f"Ошибка Google Sheets: {e}")
         raise
 
 
 
-def create_sheet_structure(sheet, channels, target_date):
+def create_sheet_structure(sheet, channels, target_date, table_config=None):
+    # У арендаторов своя раскладка таблиц
+    table_config = table_config or TABLE_CONFIG
     try:
         # Очищаем лист одним запросом
         sheet.clear()
         
         # Рассчитываем необходимое количество колонок
-        required_cols = (TABLE_CONFIG['table_width'] + TABLE_CONFIG['h_spacing']) * TABLE_CONFIG['tables_per_row']
+        required_cols = (table_config['table_width'] + table_config['h_spacing']) * table_config['tables_per_row']
         if sheet.col_count < required_cols:
             sheet.resize(cols=required_cols)
         
@@ -53,11 +71,11 @@ def create_sheet_structure(sheet, channels, target_date):
         requests = []
         
         for idx, channel in enumerate(channels):
-            row_idx = idx // TABLE_CONFIG['tables_per_row']
-            col_idx = idx % TABLE_CONFIG['tables_per_row']
+            row_idx = idx // table_config['tables_per_row']
+            col_idx = idx % table_config['tables_per_row']
             
-            start_row = 1 + row_idx * (TABLE_CONFIG['table_height'] + TABLE_CONFIG['v_spacing'])
-            start_col = 1 + col_idx * (TABLE_CONFIG['table_width'] + TABLE_CONFIG['h_spacing'])
+            start_row = 1 + row_idx * (table_config['table_height'] + table_config['v_spacing'])
+            start_col = 1 + col_idx * (table_config['table_width'] + table_config['h_spacing'])
             
             # Название канала (объединенные ячейки + форматирование)
             requests.extend([
@@ -68,7 +86,7 @@ def create_sheet_structure(sheet, channels, target_date):
                             'startRowIndex': start_row - 1,
                             'endRowIndex': start_row,
                             'startColumnIndex': start_col - 1,
-                            'endColumnIndex': start_col + TABLE_CONFIG['table_width'] - 1
+                            'endColumnIndex': start_col + table_config['table_width'] - 1
                         },
                         'mergeType': 'MERGE_ALL'
                     }
@@ -80,7 +98,7 @@ def create_sheet_structure(sheet, channels, target_date):
                             'startRowIndex': start_row - 1,
                             'endRowIndex': start_row,
                             'startColumnIndex': start_col - 1,
-                            'endColumnIndex': start_col + TABLE_CONFIG['table_width'] - 1
+                            'endColumnIndex': start_col + table_config['table_width'] - 1
                         },
                         'rows': [{
                             'values': [{
@@ -190,9 +208,8 @@ def add_table_data(requests, sheet_id, start_row, start_col, target_date):
         rows.append({
             'values': [
                 {'userEnteredValue': {'stringValue': weekday}},
-                {'userEnteredValue': {'stringValue': date_str}},
-                {}, {}, {}, {}  # Пустые значения для смен
-            ]
+                {'userEnteredValue': {'stringValue': date_str}}
+            ]  # Ячейки смен пусты после clear(), их не передаем
         })
     
     requests.append({
@@ -202,25 +219,38 @@ def add_table_data(requests, sheet_id, start_row, start_col, target_date):
                 'startRowIndex': start_row + 1,
                 'endRowIndex': start_row + 1 + len(days_data),
                 'startColumnIndex': start_col - 1,
-                'endColumnIndex': start_col + TABLE_CONFIG['table_width'] - 1
+                'endColumnIndex': start_col + 1
             },
             'rows': rows,
             'fields': 'userEnteredValue'
         }
     })
 
-@retry.Retry(
-    initial=1.0,
-    maximum=60.0,
-    multiplier=2.0,
-    predicate=retry.if_exception_type(HttpError),
-)
 def execute_requests_with_retry(sheet, requests):
     """Выполняет запросы с повторными попытками"""
+    return _retrying_execute()(sheet, requests)
+
+
+@lru_cache(maxsize=None)
+def _retrying_execute():
+    # Клиенты Google грузятся при первом вызове, а не при старте бота
+    from google.api_core import retry
+    from googleapiclient.errors import HttpError
+    
+    return retry.Retry(
+        initial=1.0,
+        maximum=60.0,
+        multiplier=2.0,
+        predicate=retry.if_exception_type(HttpError),
+    )(_execute_requests)
+
+
+def _execute_requests(sheet, requests):
+    from googleapiclient.errors import HttpError
+    
     try:
-        # Разбиваем запросы на пакеты по 50 (ограничение API)
-        for i in range(0, len(requests), 50):
-            batch = requests[i:i + 50]
+        # Разбиваем запросы на пакеты по MAX_BATCH_REQUESTS
+        for batch in iter_batches(requests):
             sheet.spreadsheet.batch_update({'requests': batch})
     except HttpError as e:
         logger.warning(f"Ошибка API (будет повторная попытка): {e}")
@@ -229,9 +259,22 @@ def execute_requests_with_retry(sheet, requests):
         logger.error(f"Неизвестная ошибка при выполнении запросов: {e}")
         raise
 
+@profiled('ensure_sheet_exists')
 async def ensure_sheet_exists(client, target_date):
+    """Находит или создает лист месяца в таблицах всех шардов (одновременно)"""
+    async def ensure_shard(shard):
+        spreadsheet = await to_thread(client.open_by_key, shard.spreadsheet_id)
+        return await to_thread(
+            ensure_month_sheet, spreadsheet, target_date, shard.layout.channels, shard.layout.table_config
+        )
+    
+    return await fan_out(ensure_shard, get_shards())
+
+
+def ensure_month_sheet(spreadsheet, target_date, channels, table_config=None):
+    import gspread
+    
     try:
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
         base_sheet_name = get_sheet_name(target_date)
         
         # Проверяем существование листа без конфликтного суффикса
@@ -262,7 +305,7 @@ async def ensure_sheet_exists(client, target_date):
         try:
             sheet = spreadsheet.add_worksheet(title=base_sheet_name, rows=1000, cols=100)
             logger.info(f"Создан новый лист: {base_sheet_name}")
-            create_sheet_structure(sheet, CHANNELS, target_date)
+            create_sheet_structure(sheet, channels, target_date, table_config)
             return sheet
         except Exception as e:
             logger.error(f"Ошибка при создании листа: {e}")
@@ -272,8 +315,11 @@ async def ensure_sheet_exists(client, target_date):
         logger.error(f"Ошибка при работе с листом: {e}")
         raise
 
-def process_existing_sheets(spreadsheet, sheets, months_to_keep):
-    """Обрабатывает существующие листы (удаляет старые)"""
+def process_existing_sheets(spreadsheet, sheets, months_to_keep, archive=True, layout=None, archive_dir=None):
+    """Обрабатывает существующие листы (удаляет старые, предварительно сохранив в архив).
+
+    Для таблицы шарда передаются его раскладка и отдельный каталог архива.
+    """
     pattern = re.compile(r'^(' + '|'.join(MONTH_NAMES.values()) + r')\d{4}$')
     for sheet in sheets:
         if pattern.match(sheet.title):
@@ -286,6 +332,14 @@ def process_existing_sheets(spreadsheet, sheets, months_to_keep):
             sheet_date = datetime(sheet_year, sheet_month, 1)
             
             if not any(sheet_date.year == d.year and sheet_date.month == d.month for d in months_to_keep):
+                if archive:
+                    try:
+                        export_month_sheet(spreadsheet, sheet.title, sheet_date, out_dir=archive_dir, layout=layout)
+                    except Exception as e:
+                        # Без архива лист не удаляем, чтобы не потерять историю
+                        logger.error(f"Ошибка при архивации листа {sheet.title}: {e}")
+                        continue
+
                 try:
                     spreadsheet.del_worksheet(sheet)
                     logger.info(f"Удален лист: {sheet.title}")
@@ -294,6 +348,8 @@ def process_existing_sheets(spreadsheet, sheets, months_to_keep):
 
 def get_or_create_sheet(spreadsheet, sheet_name):
     """Получает или создает лист с указанным именем"""
+    import gspread
+    
     try:
         # Пытаемся получить существующий лист
         sheet = spreadsheet.worksheet(sheet_name)
@@ -312,175 +368,60 @@ def get_sheet_name(date):
     """Генерирует название листа на основе даты"""
     return f"{MONTH_NAMES[date.month]}{date.year}"
 
+def sheet_month(sheet_name):
+    """Первое число месяца по названию листа (или None, если это не лист месяца)"""
+    for month, name in MONTH_NAMES.items():
+        if sheet_name.startswith(name) and sheet_name[len(name):].isdigit():
+            return datetime(int(sheet_name[len(name):]), month, 1).date()
+    return None
+
+
+async def send_cells(spreadsheet, sheet, cells, delay):
+    """Записывает {(строка, колонка): (текст, цвет)} минимальным числом запросов"""
+    if not cells:
+        return
+    
+    requests = compile_cell_updates(sheet.id, cells)
+    for i, batch in enumerate(iter_batches(requests)):
+        if i:
+            await asyncio.sleep(delay)  # Задержка между пакетами
+        await to_thread(spreadsheet.batch_update, {'requests': batch})
 
-async def update_table_cells(client, target_date, day, color_name, text, channels_data):
+
+def unknown_channel_entries(unknown):
+    """Строки отчета для каналов, которых нет в таблице"""
+    return [
+        {"channel": slot.channel, "time": slot.time, "status": "error", "message": f"Канал '{slot.channel}' не найден"}
+        for slot in unknown
+    ]
+
+
+def shard_report_data(results):
+    """Строки отчета по результатам шардов: смены упавшего шарда - ошибки"""
+    report_data = []
+    for _, slots, result in results:
+        if isinstance(result, BaseException):
+            report_data.extend(
+                {"channel": slot.channel, "time": slot.time, "status": "error", "message": SHARD_ERROR_MESSAGE}
+                for slot in slots
+            )
+        else:
+            report_data.extend(result)
+    return report_data
+
+
+async def update_table_cells(client, target_date, day, color_name, text, slots, unknown=()):
     try:
         sheet_name = get_sheet_name(target_date)
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = get_or_create_sheet(spreadsheet, sheet_name)
-        
-        # Цвета
-        colors = {
-            "красный": {"red": 1, "green": 0, "blue": 0},
-            "желтый": {"red": 1, "green": 1, "blue": 0},
-            "розовый": {"red": 1, "green": 0, "blue": 1},
-            "голубой": {"red": 0, "green": 1, "blue": 1},
-            "зеленый": {"red": 0, "green": 1, "blue": 0}
-        }
-        color = colors.get(color_name, {"red": 1, "green": 1, "blue": 1})
         
-        # Определяем смену по времени
-        def get_shift(time_str):
-            try:
-                hours = int(time_str.split(':')[0])
-                if 6 <= hours < 12: return 'morning'
-                elif 12 <= hours < 15: return 'afternoon'
-                elif 15 <= hours < 18: return 'day'
-                else: return 'evening'
-            except: return 'evening'
-        
-        # Для сбора результатов
-        report_data = []
-        requests = []
-        
-        # Собираем все ячейки для чтения
-        read_cells = {}
-        
-        for data in channels_data:
-            channel_name = data['channel']
-            time_str = data['time']
-            shift = get_shift(time_str)
-            entry = {
-                "channel": channel_name,
-                "time": time_str,
-                "status": None,
-                "message": ""
-            }
-            
-            # Проверяем наличие времени
-            if not time_str or time_str.strip() == "":
-                entry["status"] = "error"
-                entry["message"] = "Не указано время для канала"
-                report_data.append(entry)
-                continue
-            
-            try:
-                channel_idx = CHANNELS.index(channel_name)
-            except ValueError:
-                entry["status"] = "error"
-                entry["message"] = f"Канал '{channel_name}' не найден"
-                report_data.append(entry)
-                continue
-            
-            # Определяем положение таблицы
-            tables_per_row = TABLE_CONFIG['tables_per_row']
-            row_idx = channel_idx // tables_per_row
-            col_idx = channel_idx % tables_per_row
-            
-            table_config = TABLE_CONFIG
-            start_row = 2 + row_idx * (table_config['table_height'] + table_config['v_spacing'])
-            start_col = 1 + col_idx * (table_config['table_width'] + table_config['h_spacing'])
-            
-            # Определяем строку дня
-            row = start_row + day
-            
-            # Определяем колонку для смены
-            shift_columns = {
-                'morning': 2, 'afternoon': 3, 'day': 4, 'evening': 5
-            }
-            col = start_col + shift_columns.get(shift, 5)
-            
-            # Сохраняем для batch-чтения
-            key = (row, col)
-            if key not in read_cells:
-                read_cells[key] = []
-            read_cells[key].append({
-                'entry': entry,
-                'channel_name': channel_name,
-                'time_str': time_str
-            })
-        
-        # Читаем все ячейки одним запросом
-        cell_values = {}
-        if read_cells:
-            try:
-                # Получаем список всех ячеек для чтения
-                cell_list = sheet.range(
-                    f"A1:{gspread.utils.rowcol_to_a1(max(row for row, _ in read_cells.keys()), max(col for _, col in read_cells.keys()))}"
-                )
-                
-                # Создаем словарь значений по координатам
-                for cell in cell_list:
-                    cell_values[(cell.row, cell.col)] = cell.value
-                    
-            except Exception as e:
-                logger.error(f"Ошибка чтения ячеек: {e}")
-                for key, items in read_cells.items():
-                    for item in items:
-                        item['entry']['status'] = "error"
-                        item['entry']['message'] = "Ошибка чтения ячейки"
-                        report_data.append(item['entry'])
-        
-        # Обрабатываем ячейки
-        for (row, col), items in read_cells.items():
-            for item in items:
-                entry = item['entry']
-                time_str = item['time_str']
-                
-                # Получаем значение из кэша
-                current_value = cell_values.get((row, col), "")
-                
-                # Заменяем @@ на время в тексте
-                if '@@' in text:
-                    text = html.unescape(text)
-                    formatted_text = text.replace('@@', time_str)
-                else:
-                    formatted_text = text
-                
-                # Проверяем возможность записи
-                if current_value and str(current_value).strip():
-                    if color_name == "голубой":
-                        new_text = f"{current_value}, {formatted_text}"
-                        entry["status"] = "success"
-                        entry["message"] = "Текст дополнен"
-                    else:
-                        entry["status"] = "skip"
-                        entry["message"] = "Ячейка занята (не голубой)"
-                        report_data.append(entry)
-                        continue
-                else:
-                    new_text = formatted_text
-                    entry["status"] = "success"
-                    entry["message"] = "Текст записан"
-                
-                # Формируем запрос на обновление
-                requests.append({
-                    'updateCells': {
-                        'range': {
-                            'sheetId': sheet.id,
-                            'startRowIndex': row - 1,
-                            'endRowIndex': row,
-                            'startColumnIndex': col - 1,
-                            'endColumnIndex': col
-                        },
-                        'rows': [{
-                            'values': [{
-                                'userEnteredValue': {'stringValue': new_text},
-                                'userEnteredFormat': {'backgroundColor': color}
-                            }]
-                        }],
-                        'fields': 'userEnteredValue,userEnteredFormat.backgroundColor'
-                    }
-                })
-                report_data.append(entry)
+        # Каждый шард читает и пишет свою таблицу, все одновременно; сбой одного шарда не
+        # отменяет записи других, его смены уходят в отчет ошибками
+        results = await gather_shards(
+            lambda shard, shard_slots: update_shard_cells(client, shard, sheet_name, day, color_name, text, shard_slots),
+            split_by_shard(slots, get_shards())
+        )
+        report_data = shard_report_data(results) + unknown_channel_entries(unknown)
         
-        # Отправляем запросы с задержкой
-        if requests:
-            for i in range(0, len(requests), 10):  # Разбиваем на пакеты по 10
-                batch = requests[i:i+10]
-                sheet.spreadsheet.batch_update({'requests': batch})
-                await asyncio.sleep(1)  # Задержка 1 сек между пакетами
-            
         # Формируем отчет
         success_messages = []
         skip_messages = []
@@ -494,7 +435,7 @@ async def update_table_cells(client, target_date, day, color_name, text, channel
             channel_name_escaped = html.escape(channel_name)
             time_str_escaped = html.escape(time_str)
             
-            channel_link = CHANNELS_DICT.get(channel_name)
+            channel_link = get_channel_links().get(channel_name)
             
             if channel_link:
                 channel_info = f"<a href='{channel_link}'>{channel_name_escaped}</a> ({time_str_escaped})"
@@ -512,11 +453,11 @@ async def update_table_cells(client, target_date, day, color_name, text, channel
 
         report = ""
         if success_messages:
-            report += "✅ Успешно:\n" + "\n".join(success_messages) + "\n\n"
+            report += f"{REPORT_SUCCESS_HEADER}\n" + "\n".join(success_messages) + "\n\n"
         if skip_messages:
             report += "⏩ Пропущено:\n" + "\n".join(skip_messages) + "\n\n"
         if error_messages:
-            report += "❌ Ошибки:\n" + "\n".join(error_messages) + "\n\n"
+            report += f"{REPORT_ERRORS_HEADER}\n" + "\n".join(error_messages) + "\n\n"
             
         return report.strip()
             
@@ -525,100 +466,121 @@ async def update_table_cells(client, target_date, day, color_name, text, channel
         raise
 
 
-# В sheets.py
+def format_slot_text(text, time_str):
+    """Текст записи для смены: @@ заменяется на время из строки канала"""
+    if '@@' in text:
+        return html.unescape(text).replace('@@', time_str)
+    return text
 
-# Обновим функцию cancel_table_cells
-async def cancel_table_cells(client, target_date, day, channels_data):
-    try:
-        sheet_name = get_sheet_name(target_date)
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = get_or_create_sheet(spreadsheet, sheet_name)
-        
-        # Для сбора запросов
-        requests = []
-        report_data = []
-        
-        # ЗЕЛЕНЫЙ ЦВЕТ ДЛЯ ОТМЕНЫ
-        green_color = {"red": 0, "green": 1, "blue": 0}
+
+def booking_result(current_value, color_name, text):
+    """Правило записи в смену: (новый текст или None, статус, сообщение для отчета).
+
+    В свободную смену текст записывается, в занятую - только дописывается
+    через запятую голубым цветом, иначе смена пропускается.
+    """
+    if current_value and str(current_value).strip():
+        if color_name == "голубой":
+            return f"{current_value}, {text}", "success", "Текст дополнен"
+        return None, "skip", "Ячейка занята (не голубой)"
+    return text, "success", "Текст записан"
+
+
+async def update_shard_cells(client, shard, sheet_name, day, color_name, text, slots):
+    """Записи одного шарда: чтение строки дня, проверка занятости и запись"""
+    spreadsheet = await to_thread(client.open_by_key, shard.spreadsheet_id)
+    sheet = await to_thread(get_or_create_sheet, spreadsheet, sheet_name)
+    
+    color = BOOKING_COLORS.get(color_name, DEFAULT_COLOR)
+    layout = shard.layout
+    
+    # Для сбора результатов
+    report_data = []
+    cells = {}
+    written = []  # записи для кэша сеток: (общий индекс канала, день, смена, текст, цвет)
+    
+    # Собираем все ячейки для чтения
+    read_cells = {}
+    
+    # Записи уже проверены парсером: канал найден, смена определена
+    for slot in slots:
+        entry = {
+            "channel": slot.channel,
+            "time": slot.time,
+            "status": None,
+            "message": ""
+        }
         
-        for data in channels_data:
-            channel_name = data['channel']
-            time_str = data['time']
-            entry = {
-                "channel": channel_name,
-                "time": time_str,
-                "status": None,
-                "message": ""
-            }
+        # Сохраняем для batch-чтения
+        key = layout.cell(slot.channel_idx, day, slot.shift)
+        if key not in read_cells:
+            read_cells[key] = []
+        read_cells[key].append({
+            'entry': entry,
+            'channel_idx': slot.channel_idx,
+            'shift': slot.shift,
+            'time_str': slot.time
+        })
+    
+    # Читаем строку дня нужных каналов одним запросом (значения и цвета)
+    grid = None
+    if read_cells:
+        try:
+            channels = sorted({item['channel_idx'] for items in read_cells.values() for item in items})
+            grid = await to_thread(
+                fetch_month_grid, spreadsheet, sheet_name, channels=channels, day=day, layout=layout
+            )
+        except Exception as e:
+            logger.error(f"Ошибка чтения ячеек: {e}")
+            for key, items in read_cells.items():
+                for item in items:
+                    item['entry']['status'] = "error"
+                    item['entry']['message'] = READ_ERROR_MESSAGE
+                    report_data.append(item['entry'])
+            read_cells = {}
+    
+    # Обрабатываем ячейки
+    for (row, col), items in read_cells.items():
+        for item in items:
+            entry = item['entry']
+            time_str = item['time_str']
             
-            try:
-                channel_idx = CHANNELS.index(channel_name)
-            except ValueError:
-                entry["status"] = "error"
-                entry["message"] = f"Канал '{channel_name}' не найден"
+            # Получаем значение из прочитанной сетки и проверяем возможность записи
+            current_value = grid.text(item['channel_idx'], day, item['shift'])
+            new_text, entry["status"], entry["message"] = booking_result(
+                current_value, color_name, format_slot_text(text, time_str)
+            )
+            if new_text is None:
                 report_data.append(entry)
                 continue
             
-            # Определяем положение таблицы
-            tables_per_row = TABLE_CONFIG['tables_per_row']
-            row_idx = channel_idx // tables_per_row
-            col_idx = channel_idx % tables_per_row
-            
-            table_config = TABLE_CONFIG
-            start_row = 2 + row_idx * (table_config['table_height'] + table_config['v_spacing'])
-            start_col = 1 + col_idx * (table_config['table_width'] + table_config['h_spacing'])
-            
-            # Определяем строку дня
-            row = start_row + day
-            
-            # Определяем смену по времени
-            def get_shift(time_str):
-                try:
-                    hours = int(time_str.split(':')[0])
-                    if 6 <= hours < 12: return 'morning'
-                    elif 12 <= hours < 15: return 'afternoon'
-                    elif 15 <= hours < 18: return 'day'
-                    else: return 'evening'
-                except: return 'evening'
-            
-            shift = get_shift(time_str)
-            shift_columns = {
-                'morning': 2, 'afternoon': 3, 'day': 4, 'evening': 5
-            }
-            col = start_col + shift_columns.get(shift, 5)
-            
-            # Добавляем запрос на очистку ячейки И ЗЕЛЕНЫЙ ЦВЕТ
-            requests.append({
-                'updateCells': {
-                    'range': {
-                        'sheetId': sheet.id,
-                        'startRowIndex': row-1,
-                        'endRowIndex': row,
-                        'startColumnIndex': col-1,
-                        'endColumnIndex': col
-                    },
-                    'rows': [{
-                        'values': [{
-                            'userEnteredValue': {'stringValue': ''},   # пустая строка
-                            'userEnteredFormat': {
-                                'backgroundColor': green_color  # ЗЕЛЕНЫЙ ЦВЕТ
-                            }
-                        }]
-                    }],
-                    'fields': 'userEnteredValue,userEnteredFormat.backgroundColor'
-                }
-            })
-            
-            entry["status"] = "success"
-            entry["message"] = "Ячейка отменена (зеленая)"
+            # Ячейка записывается один раз: повтор в сообщении перекрывает предыдущий текст
+            cells[(row, col)] = (new_text, color)
+            written.append((shard.global_index(item['channel_idx']), day, item['shift'], new_text, color_name))
             report_data.append(entry)
+    
+    # Соседние ячейки уходят одним блоком, все блоки - одним batchUpdate
+    cache = get_grid_cache()
+    with cache.writing(sheet_name):
+        await send_cells(spreadsheet, sheet, cells, delay=1)
+        cache.apply(sheet_name, written)
+    
+    return report_data
+
+
+# В sheets.py
+
+# Обновим функцию cancel_table_cells
+async def cancel_table_cells(client, target_date, day, slots, unknown=()):
+    try:
+        sheet_name = get_sheet_name(target_date)
         
-        # Отправляем запросы
-        if requests:
-            for i in range(0, len(requests), 10):  # Разбиваем на пакеты по 10
-                batch = requests[i:i+10]
-                sheet.spreadsheet.batch_update({'requests': batch})
-                await asyncio.sleep(0.5)  # Короткая задержка
+        # Каждый шард отменяет записи в своей таблице, все одновременно
+        results = await gather_shards(
+            lambda shard, shard_slots: cancel_shard_cells(client, shard, sheet_name, day, shard_slots),
+            split_by_shard(slots, get_shards())
+        )
+        report_data = shard_report_data(results) + unknown_channel_entries(unknown)
         
         # Формируем отчет
         success_messages = []
@@ -632,7 +594,7 @@ async def cancel_table_cells(client, target_date, day, channels_data):
             channel_name_escaped = html.escape(channel_name)
             time_str_escaped = html.escape(time_str)
             
-            channel_link = CHANNELS_DICT.get(channel_name)
+            channel_link = get_channel_links().get(channel_name)
             
             if channel_link:
                 channel_info = f"<a href='{channel_link}'>{channel_name_escaped}</a> ({time_str_escaped})"
@@ -646,12 +608,53 @@ async def cancel_table_cells(client, target_date, day, channels_data):
                 
         report = ""
         if success_messages:
-            report += "✅ Успешно:\n" + "\n".join(success_messages) + "\n\n"
+            report += f"{REPORT_SUCCESS_HEADER}\n" + "\n".join(success_messages) + "\n\n"
         if error_messages:
-            report += "❌ Ошибки:\n" + "\n".join(error_messages) + "\n\n"
+            report += f"{REPORT_ERRORS_HEADER}\n" + "\n".join(error_messages) + "\n\n"
             
         return report.strip()
             
     except Exception as e:
         logger.error(f"Ошибка при отмене записи: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+async def cancel_shard_cells(client, shard, sheet_name, day, slots):
+    """Отмена записей одного шарда: очистка ячеек и зеленый цвет"""
+    spreadsheet = await to_thread(client.open_by_key, shard.spreadsheet_id)
+    sheet = await to_thread(get_or_create_sheet, spreadsheet, sheet_name)
+    
+    # Для сбора ячеек
+    cells = {}
+    written = []
+    report_data = []
+    
+    # ЗЕЛЕНЫЙ ЦВЕТ ДЛЯ ОТМЕНЫ
+    green_color = BOOKING_COLORS[CANCEL_COLOR]
+    layout = shard.layout
+    
+    for slot in slots:
+        entry = {
+            "channel": slot.channel,
+            "time": slot.time,
+            "status": None,
+            "message": ""
+        }
+        
+        row, col = layout.cell(slot.channel_idx, day, slot.shift)
+        
+        # Очищаем ячейку И ставим ЗЕЛЕНЫЙ ЦВЕТ
+        cells[(row, col)] = ('', green_color)
+        written.append((shard.global_index(slot.channel_idx), day, slot.shift, '', CANCEL_COLOR))
+        
+        entry["status"] = "success"
+        entry["message"] = "Ячейка отменена (зеленая)"
+        report_data.append(entry)
+    
+    # Отправляем запросы
+    cache = get_grid_cache()
+    with cache.writing(sheet_name):
+        await send_cells(spreadsheet, sheet, cells, delay=0.5)
+        cache.apply(sheet_name, written)
+    
+    return report_data
@@ -0,0 +1,192 @@
+"""Снимок теплого состояния бота на диске.
+
+В снимок попадают закэшированные сетки месяцев (с отпечатками таблиц -
+временем последнего изменения по Drive API), состояния пользователей и
+журнал выполненных команд записи (app.dedup).
+Снимок пишется при остановке и периодически, при запуске загружается до
+начала опроса. Сетки из снимка используются после одной дешевой сверки
+отпечатков (app.cache.GridCache.revalidate) вместо полного чтения листа.
+
+Формат - msgpack (первый байт файла - метка формата). Файл снимка только
+читается как данные: код из него не выполняется.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+import msgpack
+
+from app.cache import get_grid_cache
+from app.context import current_tenant
+from app.grid import MonthGrid
+from app.layout import get_layout
+from app.settings import SNAPSHOT_FILE, SNAPSHOT_INTERVAL
+from app.shards import fetch_fingerprints
+from app.sheets import setup_google_sheets
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+FORMAT_MSGPACK = b'M'
+
+
+def dump_snapshot(state, path):
+    body = FORMAT_MSGPACK + msgpack.packb(state, use_bin_type=True)
+
+    # Через временный файл: оборванная запись не портит прежний снимок
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return len(body)
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as f:
+        kind, body = f.read(1), f.read()
+    if kind != FORMAT_MSGPACK:
+        raise ValueError("Неизвестный формат снимка")
+    return msgpack.unpackb(body, raw=False, strict_map_key=False)
+
+
+def encode_value(value):
+    # Даты в состояниях пользователей; msgpack их не поддерживает
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict) and set(value) == {'datetime'}:
+        return datetime.fromisoformat(value['datetime'])
+    return value
+
+
+def encode_grid(grid, age, fingerprints):
+    return {
+        'sheet': grid.sheet_name,
+        'statuses': bytes(grid.statuses),
+        'colors': bytes(grid.colors),
+        'texts': grid.texts,
+        'age': age,
+        'fingerprints': fingerprints
+    }
+
+
+def decode_grid(data, layout):
+    grid = MonthGrid(data['sheet'], layout)
+    if len(data['statuses']) != len(grid.statuses):
+        return None
+    grid.statuses[:] = data['statuses']
+    grid.colors[:] = data['colors']
+    grid.texts = list(data['texts'])
+    return grid
+
+
+async def snapshot_cache():
+    """Сетки кэша текущего арендатора, которые еще не устарели, с отпечатками таблиц"""
+    cache = get_grid_cache()
+    layout = get_layout()
+    entries = [entry for entry in cache.entries() if entry[0].layout is layout and entry[1] < cache.ttl]
+    if not entries:
+        return None
+
+    current = None
+    if any(fingerprints is None for _, _, fingerprints in entries):
+        try:
+            current = await fetch_fingerprints(await setup_google_sheets(), layout)
+        except Exception as e:
+            logger.warning(f"Не удалось получить отпечатки таблиц для снимка: {e}")
+
+    grids = []
+    for grid, age, fingerprints in entries:
+        # Отпечаток снят раньше сетки: запись, начатая до него и еще не перенесенная в кэш, дала бы
+        # совпадающий отпечаток при неполной сетке, поэтому листы с идущей записью пропускаются
+        if cache.is_writing(grid.sheet_name):
+            continue
+        fingerprints = fingerprints or current
+        if fingerprints:
+            grids.append(encode_grid(grid, age, fingerprints))
+    return {'channels': layout.channels, 'table_config': layout.table_config, 'grids': grids}
+
+
+async def save_snapshot(tenants, sessions, path=SNAPSHOT_FILE, commands=None):
+    """Пишет снимок кэшей всех арендаторов (и таблицы из config.py), состояний пользователей и журнала команд"""
+    state = {
+        'commands': commands.dump() if commands is not None else [],
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'caches': {},
+        # Ключи сессий - (арендатор, пользователь), поэтому списком: ключ-массив msgpack не читает
+        'sessions': [
+            [tenant_name, user_id, {key: encode_value(value) for key, value in user_state.items()}]
+            for (tenant_name, user_id), user_state in sessions.items()
+        ]
+    }
+    for tenant in [None, *tenants]:
+        token = current_tenant.set(tenant)
+        try:
+            cache_state = await snapshot_cache()
+        finally:
+            current_tenant.reset(token)
+        if cache_state:
+            state['caches'][tenant.name if tenant is not None else ''] = cache_state
+
+    size = await asyncio.to_thread(dump_snapshot, state, path)
+    grids = sum(len(cache_state['grids']) for cache_state in state['caches'].values())
+    logger.info(f"Снимок сохранен: сеток {grids}, пользователей {len(sessions)}, {size} байт")
+
+
+def restore_snapshot(tenants, sessions, path=SNAPSHOT_FILE, commands=None):
+    """Загружает снимок: сетки ждут сверки в кэшах, состояния пользователей добавляются в sessions"""
+    try:
+        state = read_snapshot(path)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.error(f"Снимок {path} не прочитан: {e}")
+        return
+    if state.get('version') != SNAPSHOT_VERSION:
+        logger.info(f"Снимок {path} другой версии, пропускаем")
+        return
+
+    by_name = {tenant.name: tenant for tenant in tenants}
+    restored = 0
+    for name, cache_state in state['caches'].items():
+        tenant = by_name.get(name) if name else None
+        if name and tenant is None:
+            continue
+        token = current_tenant.set(tenant)
+        try:
+            layout = get_layout()
+            cache = get_grid_cache()
+            if cache_state['channels'] != layout.channels or cache_state['table_config'] != layout.table_config:
+                logger.info(f"Раскладка {name or 'config.py'} изменилась, сетки из снимка не используются")
+                continue
+            for data in cache_state['grids']:
+                grid = decode_grid(data, layout)
+                if grid is not None and data['age'] < cache.ttl:
+                    # Простой не старит сетку: если таблица не менялась, сверка это подтвердит
+                    cache.restore(grid, time.monotonic() - data['age'], data['fingerprints'])
+                    restored += 1
+        finally:
+            current_tenant.reset(token)
+
+    for tenant_name, user_id, user_state in state['sessions']:
+        sessions.setdefault((tenant_name, user_id), {key: decode_value(value) for key, value in user_state.items()})
+    if commands is not None:
+        # Повторная доставка сообщений после перезапуска тоже узнается
+        commands.load(state.get('commands', []))
+    logger.info(f"Снимок загружен: сеток {restored}, пользователей {len(state['sessions'])}")
+
+
+async def run_snapshots(tenants, sessions, interval=SNAPSHOT_INTERVAL, path=SNAPSHOT_FILE, commands=None):
+    """Периодический снимок на случай аварийной остановки"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await save_snapshot(tenants, sessions, path, commands)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения снимка: {e}")
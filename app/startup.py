@@ -0,0 +1,70 @@
+"""Замеры запуска бота.
+
+python -m app.startup [N] - отчет в духе -X importtime: N самых дорогих импортов при import bot
+"""
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+_started = time.perf_counter()
+
+# Этап запуска -> секунды с момента импорта этого модуля
+milestones = {}
+
+# Тяжелые клиенты Google: грузятся в фоне, когда бот уже опрашивает Telegram
+HEAVY_MODULES = (
+    'gspread',
+    'google.oauth2.service_account',
+    'google.api_core.retry',
+    'googleapiclient.errors'
+)
+
+
+def mark(name):
+    """Запоминает момент этапа (повторные вызовы ничего не меняют)"""
+    if name not in milestones:
+        milestones[name] = time.perf_counter() - _started
+
+
+def preload_modules(modules=HEAVY_MODULES):
+    for name in modules:
+        importlib.import_module(name)
+
+
+def format_milestones():
+    if not milestones:
+        return "Нет данных"
+    return "\n".join(f"{name}: {seconds * 1000:.0f} мс" for name, seconds in milestones.items())
+
+
+def import_report(module='bot', top=20):
+    """Запускает python -X importtime -c 'import module' и возвращает самые дорогие импорты"""
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=project_dir,
+        capture_output=True,
+        text=True
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    if not rows:
+        return f"Не удалось замерить импорт {module}:\n{result.stderr[-1000:]}"
+
+    total = max(rows)[0]
+    lines = [f"import {module}: {total / 1000:.0f} мс", "   сумм.    собств.  модуль"]
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        lines.append(f"{cumulative_us / 1000:7.1f} {self_us / 1000:9.1f}  {name}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(import_report(top=int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,142 @@
+import calendar
+import csv
+import html
+import io
+
+from app.cache import GridListener
+from app.grid import CellStatus, cell_status
+from app.layout import SHIFT_LABELS, SHIFTS
+from app.sheets import sheet_month
+
+STATUSES = tuple(CellStatus)
+
+
+class MonthStats:
+    """Счетчики смен месяца по статусам: канал × неделя × смена.
+
+    Неделя - строка календаря (с понедельника), неполные первая и последняя
+    недели считаются как есть. Дни таблицы за концом месяца не учитываются.
+    """
+
+    __slots__ = ('month', 'days', 'first_weekday', 'weeks', 'channels_count', 'counts')
+
+    def __init__(self, month, channels_count):
+        self.month = month  # date первого числа
+        self.first_weekday, self.days = calendar.monthrange(month.year, month.month)
+        self.weeks = self.week_of(self.days) + 1
+        self.channels_count = channels_count
+        self.counts = [0] * (channels_count * self.weeks * len(SHIFTS) * len(STATUSES))
+
+    @classmethod
+    def from_grid(cls, month, grid):
+        stats = cls(month, len(grid.layout.channels))
+        for channel_idx in range(stats.channels_count):
+            for day in range(1, stats.days + 1):
+                for shift, status in enumerate(grid.day_statuses(channel_idx, day)):
+                    stats.add(channel_idx, day, shift, status, 1)
+        return stats
+
+    def week_of(self, day):
+        return (day - 1 + self.first_weekday) // 7
+
+    def week_days(self, week):
+        """Первый и последний день недели week в пределах месяца"""
+        first = max(1, week * 7 - self.first_weekday + 1)
+        return first, min(self.days, first + 6 - (self.first_weekday if week == 0 else 0))
+
+    def _pos(self, channel_idx, week, shift):
+        return ((channel_idx * self.weeks + week) * len(SHIFTS) + shift) * len(STATUSES)
+
+    def add(self, channel_idx, day, shift, status, delta):
+        if channel_idx < self.channels_count and day <= self.days:
+            self.counts[self._pos(channel_idx, self.week_of(day), shift) + status] += delta
+
+    def cell(self, channel_idx, week, shift):
+        """(свободно, занято, отменено) для канала, недели и смены"""
+        pos = self._pos(channel_idx, week, shift)
+        return tuple(self.counts[pos:pos + len(STATUSES)])
+
+    def totals(self, channels=None, weeks=None, shifts=None):
+        """Сумма (свободно, занято, отменено) по выбранным каналам, неделям и сменам (None - все)"""
+        totals = [0] * len(STATUSES)
+        for channel_idx in channels if channels is not None else range(self.channels_count):
+            for week in weeks if weeks is not None else range(self.weeks):
+                for shift in shifts if shifts is not None else range(len(SHIFTS)):
+                    pos = self._pos(channel_idx, week, shift)
+                    for status in STATUSES:
+                        totals[status] += self.counts[pos + status]
+        return tuple(totals)
+
+
+class StatsIndex(GridListener):
+    """Статистика заполненности по закэшированным листам: строится по сетке, записи бота меняют счетчики"""
+
+    def __init__(self):
+        self.months = {}  # название листа -> MonthStats
+
+    def grid_loaded(self, grid):
+        month = sheet_month(grid.sheet_name)
+        if month is not None:
+            self.months[grid.sheet_name] = MonthStats.from_grid(month, grid)
+
+    def cells_changed(self, grid, changes):
+        stats = self.months.get(grid.sheet_name)
+        if stats is None:
+            return
+        for change in changes:
+            old_status = cell_status(change.old_text, change.old_color)
+            new_status = grid.status(change.channel_idx, change.day, change.shift)
+            if old_status != new_status:
+                stats.add(change.channel_idx, change.day, change.shift, old_status, -1)
+                stats.add(change.channel_idx, change.day, change.shift, new_status, 1)
+
+    def grid_dropped(self, sheet_name):
+        self.months.pop(sheet_name, None)
+
+
+def fill_rate(totals):
+    booked = totals[CellStatus.BOOKED]
+    total = sum(totals)
+    return f"{booked}/{total} ({booked / total:.0%})" if total else "0/0"
+
+
+def format_stats(stats, channels):
+    """Строки отчета (HTML): итог, по каналам, по сменам и по неделям"""
+    month = stats.month
+    totals = stats.totals()
+    yield f"Всего занято: {fill_rate(totals)}, отменено {totals[CellStatus.CANCELLED]}"
+    yield ""
+    yield "<b>По каналам:</b>"
+    for channel_idx in range(min(stats.channels_count, len(channels))):
+        yield f"{html.escape(channels[channel_idx])}: {fill_rate(stats.totals(channels=[channel_idx]))}"
+    yield ""
+    yield "<b>По сменам:</b>"
+    for shift, label in enumerate(SHIFT_LABELS):
+        yield f"{label}:00: {fill_rate(stats.totals(shifts=[shift]))}"
+    yield ""
+    yield "<b>По неделям:</b>"
+    for week in range(stats.weeks):
+        first, last = stats.week_days(week)
+        yield f"{first:02d}–{last:02d}.{month:%m}: {fill_rate(stats.totals(weeks=[week]))}"
+
+
+def stats_csv(stats, channels):
+    """CSV по каналам, неделям и сменам (UTF-8 с BOM, чтобы Excel распознал кириллицу)"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['channel', 'week_start', 'week_end', 'shift', 'booked', 'cancelled', 'free', 'fill_rate'])
+    for channel_idx in range(min(stats.channels_count, len(channels))):
+        for week in range(stats.weeks):
+            first, last = stats.week_days(week)
+            for shift, label in enumerate(SHIFT_LABELS):
+                free, booked, cancelled = stats.cell(channel_idx, week, shift)
+                total = free + booked + cancelled
+                writer.writerow([
+                    channels[channel_idx],
+                    stats.month.replace(day=first).isoformat(),
+                    stats.month.replace(day=last).isoformat(),
+                    f"{label}:00",
+                    booked, cancelled, free,
+                    f"{booked / total:.3f}" if total else ""
+                ])
+    return output.getvalue().encode('utf-8-sig')
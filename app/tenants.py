@@ -0,0 +1,118 @@
+"""Несколько команд (арендаторов) в одном процессе бота.
+
+У каждого арендатора своя таблица, раскладка каналов, сервисные аккаунты,
+кэш сеток с индексами, допуск к таблице (лимиты и очередь) и пул потоков
+для Sheets API. Чаты
+привязываются к арендатору в TENANTS; остальные чаты обслуживает таблица из
+config.py. Арендатор выбирается TenantRouter на время обработки обновления
+и доступен через app.context.current_tenant.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app.accounts import AccountPool
+from app.admission import AdmissionControl
+from app.cache import GridCache
+from app.context import current_tenant, to_thread
+from app.freeslots import FreeSlotIndex
+from app.groups import GroupIndex
+from app.layout import Layout
+from app.report import ReportCache
+from app.search import SearchIndex
+from app.stats import StatsIndex
+from app.settings import CREDS_FILES, TENANT_THREADS, TENANTS
+from app.shards import build_shards
+from config import TABLE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class Tenant:
+    """Таблица команды и все, что бот держит для нее в памяти"""
+
+    def __init__(self, name, spreadsheet_id, channels, table_config=None, channel_groups=(), channels_dict=None,
+                 shards=(), creds_files=None, chats=(), admission=None, threads=None):
+        self.name = name
+        self.layout = Layout(channels, table_config or TABLE_CONFIG, channel_groups, channels_dict)
+        self.shards = build_shards(self.layout, list(shards), default_spreadsheet_id=spreadsheet_id)
+        self.creds_files = list(creds_files or CREDS_FILES)
+        self.chats = set(chats)
+
+        # Свой допуск: очередь и лимиты одной команды не задерживают другие
+        self.admission = AdmissionControl(**(admission or {}))
+        # Свой пул потоков: медленная таблица одной команды не занимает потоки других (app.context.to_thread)
+        self.executor = ThreadPoolExecutor(max_workers=threads or TENANT_THREADS, thread_name_prefix=f"sheets-{name}")
+
+        self.grid_cache = GridCache()
+        self.free_slots = FreeSlotIndex()
+        self.group_index = GroupIndex()
+        self.search_index = SearchIndex()
+        self.stats_index = StatsIndex()
+        # Отчеты для листания: кнопки чатов команды открывают только ее отчеты
+        self.report_cache = ReportCache()
+        self.grid_cache.add_listener(self.free_slots)
+        self.grid_cache.add_listener(self.group_index)
+        self.grid_cache.add_listener(self.search_index)
+        self.grid_cache.add_listener(self.stats_index)
+
+        self.account_pool = None
+        self._account_pool_lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"Tenant({self.name!r}, {len(self.layout.channels)} каналов)"
+
+    async def get_account_pool(self):
+        """Пул аккаунтов арендатора (авторизуется при первом обращении)"""
+        async with self._account_pool_lock:
+            if self.account_pool is None:
+                pool = AccountPool(self.creds_files)
+                await to_thread(pool.authorize)
+                self.account_pool = pool
+                logger.info(f"Арендатор {self.name}: авторизовано аккаунтов {len(pool.accounts)}")
+        return self.account_pool
+
+
+def build_tenants(tenants_config=None):
+    """Арендаторы из TENANTS: [{'name': ..., 'spreadsheet_id': ..., 'channels': [...], 'chats': [...]}, ...]"""
+    tenants_config = TENANTS if tenants_config is None else tenants_config
+    tenants = [Tenant(**entry) for entry in tenants_config]
+    names = [tenant.name for tenant in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError("Названия арендаторов в TENANTS повторяются")
+    return tenants
+
+
+class TenantRouter:
+    """Outer-middleware обновлений: выбирает арендатора по чату (для инлайн-запросов - по пользователю)"""
+
+    def __init__(self, tenants):
+        self.tenants = list(tenants)
+        self.by_chat = {}
+        for tenant in self.tenants:
+            for chat_id in tenant.chats:
+                if chat_id in self.by_chat:
+                    raise ValueError(f"Чат {chat_id} привязан к арендаторам {self.by_chat[chat_id].name} и {tenant.name}")
+                self.by_chat[chat_id] = tenant
+
+    async def __call__(self, handler, event, data):
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        chat_id = chat.id if chat is not None else (user.id if user is not None else None)
+
+        token = current_tenant.set(self.by_chat.get(chat_id))
+        try:
+            return await handler(event, data)
+        finally:
+            current_tenant.reset(token)
+
+    def tenant_for(self, chat_id):
+        """Арендатор чата или None (таблица из config.py)"""
+        return self.by_chat.get(chat_id)
+
+    def split(self, chat_ids):
+        """Чаты по арендаторам: [(арендатор или None, [чаты]), ...]"""
+        by_tenant = {}
+        for chat_id in chat_ids:
+            by_tenant.setdefault(self.tenant_for(chat_id), []).append(chat_id)
+        return list(by_tenant.items())
@@ -0,0 +1,42 @@
+"""Скорость разбора больших вставленных сообщений.
+
+Запуск из корня проекта: python benchmarks/bench_parser.py [число строк]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.layout import get_layout
+from app.parser import parse_booking
+
+
+def make_message(lines_count, bad_every=0):
+    channels = get_layout().channels
+    rnd = random.Random(42)
+    lines = ["Экстренный выпуск новостей", "15", "голубой"]
+    for i in range(lines_count):
+        if bad_every and i % bad_every == 0:
+            lines.append(f"{rnd.choice(channels)} 9-05")
+        else:
+            lines.append(f"{rnd.choice(channels)} {rnd.randint(0, 23)}:{rnd.randint(0, 59):02d}")
+    return "\n".join(lines)
+
+
+def main():
+    lines_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for bad_every in (0, 100):
+        text = make_message(lines_count, bad_every)
+        number = 20
+        elapsed = min(timeit.repeat(lambda: parse_booking(text), number=number, repeat=5)) / number
+        command, errors = parse_booking(text)
+        print(
+            f"{lines_count} строк, ошибок {len(errors)}: {elapsed * 1000:.2f} мс на сообщение, "
+            f"{lines_count / elapsed:,.0f} строк/с"
+        )
+
+
+if __name__ == "__main__":
+    main()
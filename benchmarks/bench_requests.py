@@ -0,0 +1,89 @@
+"""Размер записей в Sheets API: по запросу на ячейку против скомпилированных блоков.
+
+Для нескольких типичных команд сравнивает число запросов, вызовов
+batchUpdate и байт тела (как есть и в gzip).
+
+Запуск из корня проекта: python benchmarks/bench_requests.py
+"""
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.compiler import MAX_BATCH_REQUESTS, compile_cell_updates
+
+SHEET_ID = 123456789
+BLUE = {'red': 0.0, 'green': 0.8, 'blue': 1.0}
+GREEN = {'red': 0.0, 'green': 1.0, 'blue': 0.0}
+OLD_BATCH = 10
+
+
+def legacy_requests(cells):
+    """Прежняя схема: отдельный updateCells на каждую ячейку"""
+    return [{
+        'updateCells': {
+            'range': {
+                'sheetId': SHEET_ID,
+                'startRowIndex': row - 1,
+                'endRowIndex': row,
+                'startColumnIndex': col - 1,
+                'endColumnIndex': col
+            },
+            'rows': [{
+                'values': [{
+                    'userEnteredValue': {'stringValue': text},
+                    'userEnteredFormat': {'backgroundColor': color}
+                }]
+            }],
+            'fields': 'userEnteredValue,userEnteredFormat.backgroundColor'
+        }
+    } for (row, col), (text, color) in cells.items()]
+
+
+def wire_size(requests):
+    # Так тело сериализует requests: с пробелами и \u-экранированием
+    return len(json.dumps({'requests': requests}).encode())
+
+
+def gzip_size(requests):
+    body = json.dumps({'requests': requests}, separators=(',', ':'), ensure_ascii=False).encode()
+    return len(gzip.compress(body))
+
+
+def scenarios():
+    # Запись одного канала на все четыре смены дня
+    yield "4 смены одного канала", {(5, 3 + shift): ("Реклама @@", BLUE) for shift in range(4)}
+
+    # Запись 12 каналов на одно время (ячейки в разных таблицах)
+    yield "12 каналов, одна смена", {
+        (1 + (idx // 3) * 35 + 2 + 10, 1 + (idx % 3) * 7 + 2): ("Реклама", BLUE) for idx in range(12)
+    }
+
+    # Отмена 3 каналов на весь день
+    yield "отмена 3 каналов x 4 смены", {
+        (12, 1 + idx * 7 + 2 + shift): ('', GREEN) for idx in range(3) for shift in range(4)
+    }
+
+    # Импорт месяца одного канала (все дни и смены)
+    yield "импорт месяца канала", {
+        (3 + day, 3 + shift): (f"Пост {day}.{shift}", BLUE) for day in range(31) for shift in range(4)
+    }
+
+
+def main():
+    print(f"{'сценарий':<28} {'запросов':>12} {'вызовов':>10} {'байт':>16} {'gzip':>14}")
+    for name, cells in scenarios():
+        old = legacy_requests(cells)
+        new = compile_cell_updates(SHEET_ID, cells)
+        old_calls = -(-len(old) // OLD_BATCH)
+        new_calls = -(-len(new) // MAX_BATCH_REQUESTS)
+        print(
+            f"{name:<28} {len(old):>5} -> {len(new):<4} {old_calls:>4} -> {new_calls:<3} "
+            f"{wire_size(old):>7} -> {wire_size(new):<6} {gzip_size(old):>6} -> {gzip_size(new):<5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
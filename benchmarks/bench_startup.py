@@ -0,0 +1,113 @@
+"""Время от запуска процесса бота до ответа на первое обновление.
+
+Поднимает локальный сервер Bot API, который отдает одно обновление /start,
+запускает python bot.py с TELEGRAM_API_SERVER на этот сервер и ждет первого
+sendMessage. Код выхода 1, если медиана превысила бюджет.
+
+Запуск из корня проекта: python benchmarks/bench_startup.py [--runs 3] [--budget 6.0]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import web
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FirstUpdateServer:
+    """Минимальный Bot API: одно обновление /start и отметка первого ответа бота"""
+
+    def __init__(self):
+        self.first_reply = asyncio.get_running_loop().create_future()
+        self.delivered = False
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            if self.delivered:
+                await asyncio.sleep(0.5)
+                result = []
+            else:
+                self.delivered = True
+                result = [{
+                    'update_id': 1,
+                    'message': {
+                        'message_id': 1,
+                        'date': int(time.time()),
+                        'chat': {'id': 1, 'type': 'private'},
+                        'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+                        'text': '/start',
+                        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+                    }
+                }]
+        elif method == 'sendMessage':
+            if not self.first_reply.done():
+                self.first_reply.set_result(time.perf_counter())
+            result = {
+                'message_id': 2,
+                'date': int(time.time()),
+                'chat': {'id': 1, 'type': 'private'},
+                'text': 'ok'
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+async def measure_once(timeout):
+    server = FirstUpdateServer()
+    app = web.Application()
+    app.router.add_route('*', '/bot{token}/{method}', server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    env = dict(os.environ, TELEGRAM_API_SERVER=f'http://127.0.0.1:{port}')
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'bot.py',
+        cwd=PROJECT_DIR,
+        env=env,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        replied = await asyncio.wait_for(server.first_reply, timeout)
+        return replied - started
+    finally:
+        process.terminate()
+        await process.wait()
+        await runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--budget', type=float, default=6.0, help='допустимая медиана, сек')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        results.append(await measure_once(args.timeout))
+
+    median = statistics.median(results)
+    print(
+        f"До первого ответа: медиана {median:.2f} с, мин {min(results):.2f} с, "
+        f"макс {max(results):.2f} с (бюджет {args.budget:.2f} с)"
+    )
+    if median > args.budget:
+        print("Бюджет времени запуска превышен")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
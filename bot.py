@@ -1,30 +1,174 @@
 #bot
 
+from app.startup import format_milestones, import_report, mark, preload_modules
+
 import html
 import logging
 import os
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.types import InlineKeyboardButton
+from aiogram.types import (
+    InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InlineQueryResultsButton,
+    BufferedInputFile, InputTextMessageContent
+)
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
 import asyncio
-import re
+import calendar
+import itertools
+import time
+from collections import OrderedDict
+from functools import lru_cache
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
 from app.logger import logger
 from app.sheets import *
+from app.admission import READ, SHEETS_FLAG, WRITE, AdmissionControl
+from app.cache import get_grid_cache, grid_cache
+from app.context import current_tenant
+from app.dedup import CommandLog, content_key, message_key
+from app.digest import Broadcast, Subscriptions, run_daily
+from app.freeslots import FreeSlotIndex
+from app.groups import GroupIndex
+from app.grid import CellStatus
+from app.layout import SHIFT_LABELS, get_channel_links, get_layout, pinned_layout
+from app.layout_reload import LayoutWatcher
+from app.profiling import profiled, profiler
+from app.parser import (
+    format_errors, parse_availability_query, parse_booking, parse_cancel, parse_free_query, parse_group_query,
+    parse_stats_query
+)
+from app.shards import fetch_grid
+from app.search import SearchIndex
+from app.stats import StatsIndex, format_stats, stats_csv
+from app.report import ReportCache, ReportPages, format_report, iter_chunks
+from app.tenants import TenantRouter, build_tenants
+from app.settings import (
+    ADMIN_IDS, DAY_TAP_DEBOUNCE, DIGEST_TIME, INLINE_CACHE_TIME, LAYOUT_FILE, LOAD_RETRY_DELAY, SNAPSHOT_FILE,
+    TELEGRAM_API_SERVER
+)
+from app.snapshot import restore_snapshot, run_snapshots, save_snapshot
 from config import *
 
+mark('imports')
+
 # Инициализация бота
-bot = Bot(token=TOKEN)
+if TELEGRAM_API_SERVER:
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER)))
+else:
+    bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
-# Состояния пользователей
+# Арендаторы: чат обслуживается таблицей своей команды (без TENANTS - одна таблица из config.py)
+tenant_router = TenantRouter(build_tenants())
+dp.update.outer_middleware(tenant_router)
+
+
+# Обновление обрабатывается по одной раскладке, даже если ее перезагрузят посреди обработки
+@dp.update.outer_middleware()
+async def layout_snapshot_middleware(handler, event, data):
+    token = pinned_layout.set(get_layout())
+    try:
+        return await handler(event, data)
+    finally:
+        pinned_layout.reset(token)
+
+
+# Допуск к таблице: лимиты пользователей, общий предел и очередь (записи вперед просмотров).
+# У каждого арендатора свой допуск, этот - для таблицы из config.py
+admission = AdmissionControl()
+
+
+def get_admission():
+    tenant = current_tenant.get()
+    return tenant.admission if tenant is not None else admission
+
+
+async def admission_middleware(handler, event, data):
+    return await get_admission()(handler, event, data)
+
+
+dp.message.middleware(admission_middleware)
+dp.callback_query.middleware(admission_middleware)
+
+# Фоновые задачи (держим ссылки, чтобы их не собрал GC)
+background_tasks = set()
+
+# Состояния пользователей по session_key
 user_states = {}
 
 
+def session_key(user_id):
+    """Ключ состояния пользователя: в чатах разных арендаторов у него разные сессии"""
+    tenant = current_tenant.get()
+    return (tenant.name if tenant is not None else '', user_id)
+
+# Отчеты выполненных команд записи: повтор сообщения не пишет в таблицу второй раз
+command_log = CommandLog()
+
+# Свободные смены по закэшированным листам (обновляются записями бота)
+free_slots = FreeSlotIndex()
+grid_cache.add_listener(free_slots)
+
+# Свободность смен по группам каналов
+group_index = GroupIndex()
+grid_cache.add_listener(group_index)
+
+
+# Поиск по текстам смен закэшированных листов
+search_index = SearchIndex()
+grid_cache.add_listener(search_index)
+
+# Счетчики заполненности по каналам, сменам и неделям
+stats_index = StatsIndex()
+grid_cache.add_listener(stats_index)
+
+
+def get_free_slots():
+    """Индекс свободных смен арендатора текущего обработчика"""
+    tenant = current_tenant.get()
+    return tenant.free_slots if tenant is not None else free_slots
+
+
+def get_group_index():
+    tenant = current_tenant.get()
+    return tenant.group_index if tenant is not None else group_index
+
+
+def get_search_index():
+    tenant = current_tenant.get()
+    return tenant.search_index if tenant is not None else search_index
+
+
+def get_stats_index():
+    tenant = current_tenant.get()
+    return tenant.stats_index if tenant is not None else stats_index
+
+# Подписчики ежедневной сводки и рассылка с ограничением скорости
+subscriptions = Subscriptions()
+broadcast = Broadcast(bot)
+
+# Отрендеренные отчеты для листания страниц (у каждого арендатора свои)
+report_cache = ReportCache()
+
+
+def get_report_cache():
+    tenant = current_tenant.get()
+    return tenant.report_cache if tenant is not None else report_cache
+
+# Последнее содержимое отредактированных сообщений (чтобы не слать одинаковые правки)
+RENDERED_MESSAGES_SIZE = 1024
+rendered_messages = OrderedDict()
+
+# Последнее нажатие на день по session_key: номер нажатия, пока оно обрабатывается
+day_taps = {}
+tap_numbers = itertools.count(1)
+
+
 async def answer_callback(callback: types.CallbackQuery, text: str):
     try:
         await callback.answer(text)
@@ -62,109 +206,92 @@ async def start(message: types.Message):
 
 # В bot.py добавим новый обработчик
 
-@dp.message(F.text.startswith("Отмена"))
+@dp.message(F.text.startswith("Отмена"), flags={SHEETS_FLAG: WRITE})
 async def handle_cancel_command(message: types.Message):
-    user_id = message.from_user.id
+    user_key = session_key(message.from_user.id)
     
-    if user_id not in user_states or 'current_month' not in user_states[user_id]:
+    if await answer_repeated_message(message):
+        return
+    if user_key not in user_states or 'current_month' not in user_states[user_key]:
         await message.answer("Сначала выберите месяц с помощью команды /start")
         return
     
     try:
-        lines = [line.strip() for line in message.text.split('\n') if line.strip()]
-        
-        if len(lines) < 2:
-            raise ValueError("Сообщение отмены должно содержать минимум 2 строки")
+        # Разбираем все строки сразу и показываем все ошибки одним сообщением
+        command, errors = parse_cancel(message.text)
+        if errors:
+            raise ValueError(f"\n{format_errors(errors)}")
         
-        # Парсим данные
-        if lines[0].lower() != "отмена":
-            raise ValueError("Первая строка должна быть 'Отмена'")
+        current_month = user_states[user_key]['current_month']
         
-        day = int(lines[1])
-        channels_data = []
+        async def cancel():
+            client = await setup_google_sheets()
+            return await cancel_table_cells(
+                client, 
+                current_month, 
+                command.day, 
+                command.entries,
+                command.unknown
+            )
         
-        for data in lines[2:]:
-            parts = data.rsplit(' ', 1)
-            if len(parts) != 2:
-                raise ValueError(f"Неверный формат: {data}")
-            
-            channel_name = parts[0].strip()
-            time_str = parts[1]
-            
-            # Проверка формата времени
-            if not re.match(r'^\d{1,2}:\d{2}$', time_str):
-                raise ValueError(f"Неверный формат времени: {time_str}")
-            
-            channels_data.append({
-                'channel': channel_name,
-                'time': time_str
-            })
-        
-        # Проверяем валидность данных
-        if day < 1 or day > 31:
-            raise ValueError("День должен быть числом от 1 до 31")
-        
-        current_month = user_states[user_id]['current_month']
-        client = await setup_google_sheets()
-        
-        # Получаем отчет об отмене
-        report = await cancel_table_cells(
-            client, 
-            current_month, 
-            day, 
-            channels_data
+        # Получаем отчет об отмене (повтор команды получает отчет первого выполнения)
+        report, repeated = await command_log.run(
+            command_keys(message, current_month, command), cancel, keep=is_final_report
         )
         
         # После обработки предлагаем выбрать месяц снова
-        user_states[user_id].pop('current_month', None)
-        await message.answer(
-            f"{report}\n\nВыберите месяц для следующей операции:",
-            reply_markup=get_month_keyboard(),
-            parse_mode="HTML"
+        user_states[user_key].pop('current_month', None)
+        await answer_report(
+            message,
+            report,
+            REPEATED_FOOTER if repeated else "\n\nВыберите месяц для следующей операции:",
+            get_month_keyboard()
         )
     
     except Exception as e:
         logger.error(f"Ошибка обработки отмены: {e}")
         await message.answer(f"❌ Ошибка: {str(e)}\n\nПопробуйте отправить отмену снова или начните заново с /start")
 
+# Кнопка "Данные" не обращается к таблице и не ждет в очереди допуска
+@dp.message(F.text == "Данные (клавиатура)")
+async def handle_data_keyboard(message: types.Message):
+    await view_data_handler_keyboard(message)
+
 # Обработчик для обычной клавиатуры
-@dp.message(F.text.in_(["Текущий месяц", "Следующий месяц", "Данные (клавиатура)"]))
+@dp.message(F.text.in_(["Текущий месяц", "Следующий месяц"]), flags={SHEETS_FLAG: WRITE})
 async def handle_keyboard(message: types.Message):
-    if message.text == "Данные (клавиатура)":
-        await view_data_handler_keyboard(message)
-    else:
-        today = datetime.now()
-        target_date = today if message.text == "Текущий месяц" else today + relativedelta(months=1)
-        
-        client = await setup_google_sheets()
-        await ensure_sheet_exists(client, target_date)
-        
-        user_states[message.from_user.id] = {
-            'current_month': target_date
-        }
-        
-        await message.answer(
-            f"✅ Лист для {MONTH_NAMES[target_date.month]} {target_date.year} готов!\n\n"
-            "Теперь отправьте данные для заполнения в формате:\n\n"
-            "<b>Для добавления записи:</b>\n"
-            "<b>Текст сообщения</b>\n"
-            "<b>Число (день месяца)</b>\n"
-            "<b>Цвет (красный/желтый/розовый/голубой)</b>\n"
-            "<b>Канал 1 9:05</b>\n"
-            "<b>Канал 2 10:30</b>\n\n"
-            "Пример добавления:\n"
-            "<code>Экстренный выпуск новостей\n"
-            "15\n"
-            "голубой\n"
-            "МАСТЕРСКАЯ 9:05\n"
-            "Канал 2 10:30</code>\n\n"
-            "Пример отмены:\n"
-            "<code>Отмена\n"
-            "15\n"
-            "МАСТЕРСКАЯ 9:05\n"
-            "Канал 2 10:30</code>\n\n",
-            parse_mode="HTML"
-        )
+    today = datetime.now()
+    target_date = today if message.text == "Текущий месяц" else today + relativedelta(months=1)
+    
+    client = await setup_google_sheets()
+    await ensure_sheet_exists(client, target_date)
+    
+    user_states[session_key(message.from_user.id)] = {
+        'current_month': target_date
+    }
+    
+    await message.answer(
+        f"✅ Лист для {MONTH_NAMES[target_date.month]} {target_date.year} готов!\n\n"
+        "Теперь отправьте данные для заполнения в формате:\n\n"
+        "<b>Для добавления записи:</b>\n"
+        "<b>Текст сообщения</b>\n"
+        "<b>Число (день месяца)</b>\n"
+        "<b>Цвет (красный/желтый/розовый/голубой)</b>\n"
+        "<b>Канал 1 9:05</b>\n"
+        "<b>Канал 2 10:30</b>\n\n"
+        "Пример добавления:\n"
+        "<code>Экстренный выпуск новостей\n"
+        "15\n"
+        "голубой\n"
+        "МАСТЕРСКАЯ 9:05\n"
+        "Канал 2 10:30</code>\n\n"
+        "Пример отмены:\n"
+        "<code>Отмена\n"
+        "15\n"
+        "МАСТЕРСКАЯ 9:05\n"
+        "Канал 2 10:30</code>\n\n",
+        parse_mode="HTML"
+    )
 
 # Новая версия обработчика для кнопки "Данные" (инлайн)
 @dp.callback_query(F.data == "view_data")
@@ -184,10 +311,15 @@ async def view_data_handler_keyboard(message: types.Message):
 
 # Обновляем функцию get_data_keyboard
 def get_data_keyboard(target_date=None):
+    month, year = (target_date.month, target_date.year) if target_date else (None, None)
+    return _build_data_keyboard(month, year, date.today())
+
+
+@lru_cache(maxsize=64)
+def _build_data_keyboard(month, year, today):
     builder = InlineKeyboardBuilder()
     
     # Кнопки месяцев
-    today = datetime.now()
     for i in range(3):
         month_date = today + relativedelta(months=i)
         builder.add(InlineKeyboardButton(
@@ -196,28 +328,467 @@ def get_data_keyboard(target_date=None):
         ))
     
     # Кнопки дней (31 кнопка)
-    if target_date:
+    if month:
         for day in range(1, 32):
             builder.add(InlineKeyboardButton(
                 text=str(day),
-                callback_data=f"data_day_{target_date.month}_{target_date.year}_{day}"
+                callback_data=f"data_day_{month}_{year}_{day}"
             ))
     
     builder.adjust(3, *[7]*5)  # 3 месяца, затем по 7 дней в строке
     return builder.as_markup()
 
 
+@dp.update.outer_middleware()
+async def startup_middleware(handler, event, data):
+    mark('first_update')
+    return await handler(event, data)
+
+
+@dp.message(Command("startup"))
+async def startup_command(message: types.Message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    # Отчет об импортах снимается в отдельном процессе
+    report = await asyncio.to_thread(import_report, 'bot', 15)
+    await message.answer(
+        f"Этапы запуска:\n{format_milestones()}\n\n<pre>{html.escape(report)}</pre>",
+        parse_mode="HTML"
+    )
+
+
+@dp.message(Command("profile"))
+async def profile_command(message: types.Message, command: CommandObject):
+    """/profile [N] [cpu|sample] - профилировать N следующих операций; /profile - последние отчеты"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = (command.args or "").split()
+    if not args:
+        text = profiler.format_reports()
+    elif args[0] == "off":
+        profiler.arm(0)
+        text = "Профилирование выключено"
+    else:
+        try:
+            profiler.arm(int(args[0]), args[1] if len(args) > 1 else None)
+        except ValueError:
+            await message.answer("❌ Использование: /profile [N] [cpu|sample], /profile off")
+            return
+        text = f"Профилируются следующие {profiler.remaining} операций ({profiler.mode})"
+    
+    await message.answer(f"<pre>{html.escape(text)}</pre>", parse_mode="HTML")
+
+
 @dp.message(Command("cancel"))
 async def cancel_command(message: types.Message):
-    user_id = message.from_user.id
-    if user_id in user_states:
-        del user_states[user_id]
+    user_key = session_key(message.from_user.id)
+    if user_key in user_states:
+        del user_states[user_key]
         await message.answer("Текущая операция отменена. Выберите месяц снова.")
     else:
         await message.answer("Нет активных операций для отмены.")
     await start(message)
 
 
+# Поиск свободных смен на месяцы, доступные в клавиатуре данных
+FREE_SEARCH_MONTHS = 3
+
+
+@dp.message(Command("free"), flags={SHEETS_FLAG: READ})
+async def free_slots_command(message: types.Message, command: CommandObject):
+    try:
+        query = parse_free_query(command.args)
+        today = date.today()
+        sheet_names = [get_sheet_name(today + relativedelta(months=i)) for i in range(FREE_SEARCH_MONTHS)]
+        
+        # Листы читаются целиком один раз, дальше поиск идет по индексу в памяти
+        client = await setup_google_sheets()
+        await asyncio.gather(*(load_month_grid(client, sheet_name) for sheet_name in sheet_names))
+        
+        found = get_free_slots().find(sheet_names, query.channels, query.shifts, today, query.limit)
+        # Непрочитанные листы называем, чтобы пустой ответ не выглядел как "все занято"
+        footer = [f"ℹ️ {html.escape(failure)}" for failure in map(load_failure, sheet_names) if failure]
+        if not found:
+            lines = [f"Свободных смен ({html.escape(query.title)}) не найдено", *footer]
+            await message.answer("\n".join(lines), parse_mode="HTML")
+            return
+        
+        channels = get_layout().channels
+        lines = [f"🔎 Ближайшие свободные смены ({html.escape(query.title)}):"]
+        for slot_date, shift, channel_idx in found:
+            lines.append(f"{slot_date:%d.%m.%Y} {SHIFT_LABELS[shift]}:00 — {html.escape(channels[channel_idx])}")
+        lines.extend(footer)
+        await message.answer("\n".join(lines), parse_mode="HTML")
+    
+    except ValueError as e:
+        # Текст ошибки повторяет ввод пользователя: без экранирования Telegram не разберет разметку
+        await message.answer(f"❌ {html.escape(str(e))}\n\nПример: <code>/free группа 1 15:00 5</code>", parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Ошибка поиска свободных смен: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+
+
+@dp.message(Command("group"), flags={SHEETS_FLAG: READ})
+async def group_command(message: types.Message, command: CommandObject):
+    """/group N [время смены ...] [неделя] - свободные смены группы с сегодняшнего дня"""
+    try:
+        query = parse_group_query(command.args)
+        today = date.today()
+        last_day = (today + timedelta(days=6 - today.weekday())).day if query.week else None
+        if query.week and last_day < today.day:
+            last_day = None  # неделя заканчивается в следующем месяце: берем остаток этого
+        
+        sheet_name = get_sheet_name(today)
+        client = await setup_google_sheets()
+        if await load_month_grid(client, sheet_name) is None:
+            await message.answer(f"❌ {load_failure_text(sheet_name)}")
+            return
+        
+        groups = get_group_index()
+        args = (sheet_name, query.group_idx, query.shifts, today.day, last_day)
+        free, total = groups.free_count(*args)
+        all_free = groups.all_free(*args)
+        
+        by_day = {}
+        for day, shift in all_free:
+            by_day.setdefault(day, []).append(f"{SHIFT_LABELS[shift]}:00")
+        period = "эта неделя" if query.week else "до конца месяца"
+        lines = [
+            f"Группа {query.group_idx + 1}, {period}:",
+            f"Свободных смен: {free} из {total}",
+            "Свободно у всех каналов: " + (
+                ", ".join(f"{day:02d}.{today.month:02d} ({' '.join(labels)})" for day, labels in by_day.items())
+                or "нет"
+            )
+        ]
+        await message.answer("\n".join(lines))
+    
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n\nПример: /group 2 18:00 неделя")
+    except Exception as e:
+        logger.error(f"Ошибка запроса по группе: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+
+
+# Сколько найденных смен показывать в ответе на /search
+SEARCH_RESULTS_LIMIT = 30
+
+
+@dp.message(Command("search"))
+async def search_command(message: types.Message, command: CommandObject):
+    """/search текст - где стоят смены с этим текстом во всех листах в памяти"""
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Укажите текст для поиска.\n\nПример: <code>/search промо акция</code>", parse_mode="HTML")
+        return
+    
+    # Ответ только из памяти; листы ближайших месяцев, которых там нет, подгружаются в фоне
+    today = date.today()
+    cache = get_grid_cache()
+    for i in range(FREE_SEARCH_MONTHS):
+        sheet_name = get_sheet_name(today + relativedelta(months=i))
+        if not cache.is_fresh(sheet_name):
+            load_in_background(sheet_name)
+    # Листы следующих месяцев могут быть еще не созданы, ждать стоит только текущий
+    current_sheet = get_sheet_name(today)
+    footer = []
+    if cache.peek(current_sheet) is None:
+        failure = load_failure(current_sheet)
+        footer = ["", f"❌ {failure}" if failure else "⏳ Лист текущего месяца еще загружается, повторите поиск позже"]
+    
+    found = get_search_index().search(query)
+    if not found:
+        lines = [f"По запросу «{html.escape(query)}» ничего не найдено", *footer]
+        await message.answer("\n".join(lines), parse_mode="HTML")
+        return
+    
+    channels = get_layout().channels
+    lines = [f"🔎 «{html.escape(query)}»: найдено смен {len(found)}"]
+    for sheet_name, channel_idx, day, shift, text in found[:SEARCH_RESULTS_LIMIT]:
+        month = sheet_month(sheet_name)
+        when = f"{day:02d}.{month:%m.%Y}" if month else f"{sheet_name}, {day}"
+        channel_name = channels[channel_idx] if channel_idx < len(channels) else f"канал {channel_idx + 1}"
+        lines.append(f"{when} {SHIFT_LABELS[shift]}:00 — {html.escape(channel_name)}: {html.escape(text)}")
+    if len(found) > SEARCH_RESULTS_LIMIT:
+        lines.append(f"… и еще {len(found) - SEARCH_RESULTS_LIMIT}, уточните запрос")
+    
+    lines.extend(footer)
+    for chunk in iter_chunks(lines):
+        await message.answer(chunk, parse_mode="HTML")
+
+
+@dp.message(Command("stats"), flags={SHEETS_FLAG: READ})
+async def stats_command(message: types.Message, command: CommandObject):
+    """/stats [следующий] [csv] - заполненность месяца по каналам, сменам и неделям"""
+    try:
+        query = parse_stats_query(command.args)
+        target_date = date.today() + relativedelta(months=query.month_offset)
+        sheet_name = get_sheet_name(target_date)
+        
+        # Лист читается, только если его нет в кэше; дальше счетчики ведут записи бота
+        client = await setup_google_sheets()
+        grid = await load_month_grid(client, sheet_name)
+        stats = get_stats_index().months.get(sheet_name)
+        if grid is None or stats is None:
+            await message.answer(f"❌ {load_failure_text(sheet_name)}")
+            return
+        
+        channels = grid.layout.channels
+        if query.csv:
+            await message.answer_document(
+                BufferedInputFile(stats_csv(stats, channels), filename=f"stats_{target_date:%Y_%m}.csv"),
+                caption=f"Заполненность: {MONTH_NAMES[target_date.month]} {target_date.year}"
+            )
+            return
+        
+        title = f"📊 <b>Заполненность: {MONTH_NAMES[target_date.month]} {target_date.year}</b>"
+        for chunk in iter_chunks([title, "", *format_stats(stats, channels)]):
+            await message.answer(chunk, parse_mode="HTML")
+    
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n\nПример: /stats следующий csv")
+    except Exception as e:
+        logger.error(f"Ошибка статистики: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+
+
+@dp.message(Command("subscribe"))
+async def subscribe_command(message: types.Message):
+    if not DIGEST_TIME:
+        await message.answer("Ежедневная сводка в этом боте выключена")
+        return
+    if await subscriptions.add(message.chat.id):
+        await message.answer(f"✅ Сводка свободных смен на сегодня и завтра будет приходить ежедневно в {DIGEST_TIME}")
+    else:
+        await message.answer("Вы уже подписаны на сводку. Отписаться: /unsubscribe")
+
+
+@dp.message(Command("unsubscribe"))
+async def unsubscribe_command(message: types.Message):
+    if await subscriptions.remove(message.chat.id):
+        await message.answer("Подписка на сводку отменена")
+    else:
+        await message.answer("Вы не подписаны на сводку")
+
+
+@dp.message(Command("digest"))
+async def digest_command(message: types.Message):
+    """Разослать сводку сейчас (администраторам)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    result = await send_digest()
+    await message.answer(
+        f"Сводка: доставлено {result['sent']}, ошибок {result['failed']}, "
+        f"заблокировали бота {len(result['blocked'])}"
+    )
+
+
+async def render_digest(client, days):
+    """Текст сводки свободных смен по дням: листы месяцев читаются один раз на всех подписчиков"""
+    lines = []
+    for target_date in days:
+        sheet_name = get_sheet_name(target_date)
+        grid = await load_month_grid(client, sheet_name)
+        if lines:
+            lines.append("")
+        lines.append(f"<b>Свободные смены на {target_date:%d.%m.%Y}:</b>")
+        if grid is None:
+            lines.append(html.escape(load_failure_text(sheet_name)))
+            continue
+        lines.extend(format_report(
+            lambda channel_idx: format_channel_line(grid, channel_idx, target_date.day),
+            channels_count=len(grid.layout.channels)
+        ))
+    return lines
+
+
+async def send_digest():
+    """Рассылает подписчикам свободные смены на сегодня и завтра"""
+    if not len(subscriptions):
+        return {'sent': 0, 'failed': 0, 'blocked': []}
+    
+    today = date.today()
+    result = {'sent': 0, 'failed': 0, 'blocked': []}
+    # Сводка рендерится один раз на арендатора и рассылается его чатам
+    for tenant, chat_ids in tenant_router.split(subscriptions):
+        token = current_tenant.set(tenant)
+        try:
+            client = await setup_google_sheets()
+            chunks = list(iter_chunks(await render_digest(client, [today, today + timedelta(days=1)])))
+        finally:
+            current_tenant.reset(token)
+        
+        tenant_result = await broadcast.send(chat_ids, chunks, parse_mode="HTML")
+        result['sent'] += tenant_result['sent']
+        result['failed'] += tenant_result['failed']
+        result['blocked'].extend(tenant_result['blocked'])
+    
+    await subscriptions.remove(*result['blocked'])
+    logger.info(
+        f"Сводка разослана: {result['sent']} чатов, ошибок {result['failed']}, "
+        f"отписано {len(result['blocked'])}"
+    )
+    return result
+
+
+# Инлайн-режим отвечает только из закэшированных сеток; листы загружаются в фоне
+INLINE_RESULTS_LIMIT = 50  # ограничение Telegram на один ответ
+inline_loading = set()
+failed_loads = {}  # (кэш, лист) -> (время неудачи, лист не создан)
+
+
+@dp.inline_query()
+async def inline_availability(inline_query: types.InlineQuery):
+    """@bot [канал | группа N] [день] - свободные смены дня по каналам"""
+    try:
+        query = parse_availability_query(inline_query.query)
+        target_date = availability_date(query.day, date.today())
+    except ValueError as e:
+        await answer_inline(inline_query, [], button_text=f"❌ {e}")
+        return
+    
+    sheet_name = get_sheet_name(target_date)
+    cache = get_grid_cache()
+    grid = cache.peek(sheet_name)
+    if not cache.is_fresh(sheet_name):
+        load_in_background(sheet_name)
+    if grid is None:
+        failure = load_failure(sheet_name)
+        if failure:
+            await answer_inline(inline_query, [], button_text=f"❌ {failure}")
+        else:
+            await answer_inline(inline_query, [], button_text="⏳ Данные загружаются, повторите запрос", cache_time=1)
+        return
+    
+    day = target_date.day
+    free_channels = [
+        channel_idx for channel_idx in query.channels
+        if any(status != CellStatus.BOOKED for status in grid.day_statuses(channel_idx, day))
+    ]
+    if not free_channels:
+        await answer_inline(inline_query, [], button_text=f"Свободных смен на {target_date:%d.%m} нет")
+        return
+    
+    # Больше 50 результатов Telegram догружает по next_offset
+    offset = int(inline_query.offset or 0)
+    results = []
+    for channel_idx in free_channels[offset:offset + INLINE_RESULTS_LIMIT]:
+        channel_name = grid.layout.channels[channel_idx]
+        day_statuses = grid.day_statuses(channel_idx, day)
+        times = ", ".join(
+            f"{label}:00" for shift, label in enumerate(SHIFT_LABELS) if day_statuses[shift] != CellStatus.BOOKED
+        )
+        results.append(InlineQueryResultArticle(
+            id=f"{target_date:%Y%m%d}-{channel_idx}",
+            title=channel_name,
+            description=f"{target_date:%d.%m}: свободно {times}",
+            input_message_content=InputTextMessageContent(
+                message_text=f"{channel_name}, {target_date:%d.%m.%Y}: свободно {times}"
+            )
+        ))
+    next_offset = offset + INLINE_RESULTS_LIMIT
+    await answer_inline(inline_query, results, next_offset=str(next_offset) if next_offset < len(free_channels) else "")
+
+
+async def answer_inline(inline_query: types.InlineQuery, results, button_text=None, cache_time=INLINE_CACHE_TIME,
+                        next_offset=""):
+    button = InlineQueryResultsButton(text=button_text, start_parameter="inline") if button_text else None
+    try:
+        await inline_query.answer(results, cache_time=cache_time, next_offset=next_offset, button=button)
+    except TelegramBadRequest as e:
+        # Запрос мог устареть, пока пользователь печатал дальше
+        logger.warning(f"Не удалось ответить на инлайн-запрос: {e}")
+
+
+def availability_date(day, today):
+    """Дата по дню месяца: прошедший день текущего месяца означает следующий месяц"""
+    if day is None:
+        return today
+    month = today if day >= today.day else today + relativedelta(months=1, day=1)
+    if day > calendar.monthrange(month.year, month.month)[1]:
+        raise ValueError(f"{MONTH_NAMES[month.month]} {month.year}: нет {day} числа")
+    return month.replace(day=day)
+
+
+def load_in_background(sheet_name):
+    """Загружает лист в кэш, не задерживая ответ; один лист грузится одной задачей.
+
+    После неудачи лист LOAD_RETRY_DELAY сек не загружается снова (см. load_failure).
+    """
+    key = (id(get_grid_cache()), sheet_name)
+    if key in inline_loading or load_failure(sheet_name):
+        return
+    inline_loading.add(key)
+    
+    # Задача копирует контекст и работает с таблицей того же арендатора
+    async def load():
+        try:
+            await load_month_grid(await setup_google_sheets(), sheet_name)
+        finally:
+            inline_loading.discard(key)
+    
+    task = asyncio.create_task(load())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+# Ответ Sheets API (400) на диапазон листа, которого нет; другие ошибки 400 - не отсутствие листа
+MISSING_SHEET_ERROR = "Unable to parse range"
+
+
+def is_missing_sheet(error):
+    """Ошибка чтения из-за отсутствия листа"""
+    import gspread
+    
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    response = getattr(error, 'response', None)
+    return (
+        isinstance(error, gspread.exceptions.APIError)
+        and getattr(response, 'status_code', None) == 400
+        and MISSING_SHEET_ERROR in str(error)
+    )
+
+
+def load_failure(sheet_name):
+    """Почему лист не загрузился в последние LOAD_RETRY_DELAY сек; None, если неудачи не было"""
+    key = (id(get_grid_cache()), sheet_name)
+    failure = failed_loads.get(key)
+    if failure is None:
+        return None
+    failed_at, missing = failure
+    if time.monotonic() - failed_at >= LOAD_RETRY_DELAY:
+        del failed_loads[key]
+        return None
+    return f"Лист {sheet_name} еще не создан" if missing else f"Лист {sheet_name} сейчас недоступен, повторите позже"
+
+
+async def load_month_grid(client, sheet_name):
+    """Загружает лист в кэш; None, если лист не загрузился (почему - load_failure).
+
+    После неудачи (например, лист следующего месяца еще не создан) лист
+    LOAD_RETRY_DELAY сек не читается снова.
+    """
+    if load_failure(sheet_name):
+        return None
+    key = (id(get_grid_cache()), sheet_name)
+    try:
+        grid = await get_grid_cache().get(client, sheet_name)
+    except Exception as e:
+        logger.warning(f"Лист {sheet_name} не загружен в кэш: {e}")
+        failed_loads[key] = (time.monotonic(), is_missing_sheet(e))
+        return None
+    failed_loads.pop(key, None)
+    return grid
+
+
+def load_failure_text(sheet_name):
+    return load_failure(sheet_name) or f"Лист {sheet_name} недоступен"
+
+
 # В обработчике callback_query
 @dp.callback_query(F.data.startswith("data_month_"))
 async def process_data_month_selection(callback: types.CallbackQuery):
@@ -228,12 +799,13 @@ async def process_data_month_selection(callback: types.CallbackQuery):
         target_date = datetime(int(year), int(month), 1)
         
         # Сохраняем выбранный месяц для пользователя
-        user_states[callback.from_user.id] = {
+        user_states[session_key(callback.from_user.id)] = {
             'mode': 'data_view',
             'target_month': target_date
         }
         
-        await callback.message.edit_text(
+        await safe_edit_text(
+            callback.message,
             f"Выберите день в {MONTH_NAMES[target_date.month]} {target_date.year}:",
             reply_markup=get_data_keyboard(target_date)
         )
@@ -242,6 +814,7 @@ async def process_data_month_selection(callback: types.CallbackQuery):
         logger.error(f"Ошибка в process_data_month_selection: {e}")
         await callback.message.answer(f"❌ Ошибка: {str(e)}")
 
+# Без флага допуска: быстрые нажатия схлопываются до очереди, слот берет только последнее
 @dp.callback_query(F.data.startswith("data_day_"))
 async def process_data_day_selection(callback: types.CallbackQuery):
     try:
@@ -249,164 +822,258 @@ async def process_data_day_selection(callback: types.CallbackQuery):
         
         _, _, month, year, day = callback.data.split('_')
         target_date = datetime(int(year), int(month), int(day))
-        user_id = callback.from_user.id
+        user_key = session_key(callback.from_user.id)
         
-        if user_id not in user_states or 'target_month' not in user_states[user_id]:
+        if user_key not in user_states or 'target_month' not in user_states[user_key]:
             await callback.message.answer("Сессия устарела. Начните заново с /start")
             return
         
-        # Получаем данные из таблицы
-        client = await setup_google_sheets()
-        report = await get_day_data(client, target_date)
-        
-        # Разрешаем HTML-разметку в сообщении
-        await callback.message.edit_text(
-            f"Данные за {day}.{month}.{year}:\n\n{report}\n\nВыберите другую дату:",
-            reply_markup=get_data_keyboard(user_states[user_id]['target_month']),
-            parse_mode="HTML"  # Добавляем поддержку HTML
-        )
+        # Быстрые нажатия схлопываются: обслуживаем только последнее
+        tap_id = await debounce_tap(user_key)
+        if tap_id is None:
+            return
         
+        try:
+            admission_control = get_admission()
+            if not await admission_control.admit(callback, READ):
+                return
+            try:
+                # Получаем данные из таблицы
+                client = await setup_google_sheets()
+                report_lines = await get_day_data(client, target_date)
+            finally:
+                admission_control.release()
+            
+            # Пока ждали очередь и читали таблицу, пользователь мог выбрать другой день
+            if day_taps.get(user_key) != tap_id:
+                return
+            
+            # Отчет разбивается на страницы по мере листания, первая уходит сразу
+            pages = ReportPages(
+                report_lines,
+                title=f"Данные за {day}.{month}.{year}:\n\n",
+                footer="\n\nВыберите другую дату:",
+                context=user_states[user_key]['target_month']
+            )
+            await show_report_page(callback.message, get_report_cache().add(pages), pages, 0)
+        finally:
+            forget_tap(user_key, tap_id)
             
     except Exception as e:
         logger.error(f"Ошибка в process_data_day_selection: {e}")
         await callback.message.answer(f"❌ Ошибка: {str(e)}")
 
 
+@dp.callback_query(F.data.startswith("report_"))
+async def process_report_page(callback: types.CallbackQuery):
+    try:
+        _, key, page = callback.data.split('_')
+        pages = get_report_cache().get(key)
+        if pages is None:
+            await answer_callback(callback, "Отчет устарел, выберите дату снова")
+            return
+        
+        await answer_callback(callback, f"Страница {int(page) + 1}")
+        await show_report_page(callback.message, key, pages, int(page))
+    
+    except Exception as e:
+        logger.error(f"Ошибка в process_report_page: {e}")
+        await callback.message.answer(f"❌ Ошибка: {str(e)}")
+
+
+async def show_report_page(message: types.Message, key, pages, page):
+    text = pages.get(page)
+    if text is None:
+        return
+    
+    # Кнопки листания над клавиатурой выбора даты
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton(text="◀️", callback_data=f"report_{key}_{page - 1}"))
+    if pages.has_next(page):
+        nav_row.append(InlineKeyboardButton(text="▶️", callback_data=f"report_{key}_{page + 1}"))
+    
+    markup = get_data_keyboard(pages.context)
+    if nav_row:
+        markup = InlineKeyboardMarkup(inline_keyboard=[nav_row, *markup.inline_keyboard])
+    
+    # Разрешаем HTML-разметку в сообщении
+    await safe_edit_text(message, text, reply_markup=markup, parse_mode="HTML")
+
+
+async def safe_edit_text(message: types.Message, text, reply_markup=None, parse_mode=None):
+    """Редактирует сообщение, пропуская правку, если содержимое не изменилось"""
+    key = (message.chat.id, message.message_id)
+    content = (text, reply_markup)
+    if rendered_messages.get(key) == content:
+        return
+    
+    try:
+        await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    
+    rendered_messages[key] = content
+    rendered_messages.move_to_end(key)
+    while len(rendered_messages) > RENDERED_MESSAGES_SIZE:
+        rendered_messages.popitem(last=False)
+
+
+async def debounce_tap(user_key):
+    """Ждет паузу в нажатиях: номер нажатия или None, если пользователь уже нажал другой день.
+
+    Номер нажатия нужно вернуть forget_tap() после обработки.
+    """
+    tap = next(tap_numbers)
+    day_taps[user_key] = tap
+    try:
+        await asyncio.sleep(DAY_TAP_DEBOUNCE)
+    except asyncio.CancelledError:
+        forget_tap(user_key, tap)
+        raise
+    return tap if day_taps.get(user_key) == tap else None
+
+
+def forget_tap(user_key, tap):
+    # Запись удаляет только последнее нажатие: более новое обработает себя само
+    if day_taps.get(user_key) == tap:
+        del day_taps[user_key]
+
+
+REPEATED_FOOTER = "\n\nЭта команда уже выполнена, таблица не изменялась.\nВыберите месяц для следующей операции:"
+
+
+def message_command_key(message: types.Message):
+    tenant = current_tenant.get()
+    return message_key(tenant.name if tenant is not None else '', message.chat.id, message.message_id)
+
+
+def command_keys(message: types.Message, current_month, command):
+    """Ключи повтора команды записи: id сообщения и отпечаток команды"""
+    tenant = current_tenant.get()
+    sheet_name = get_sheet_name(current_month)
+    return [
+        message_command_key(message),
+        content_key(tenant.name if tenant is not None else '', message.chat.id, sheet_name, command)
+    ]
+
+
+def is_final_report(report):
+    """Отчет, который отдается повторам; иначе повтор выполняет команду заново.
+
+    Не запоминается только отчет, где из-за сбоя чтения или таблицы ничего не
+    записано. Если часть смен записана, повтор записал бы их второй раз
+    (голубой текст дописался бы дважды), поэтому такой отчет запоминается, а
+    несделанные смены отправляются новым сообщением. Неизвестный канал
+    повторится так же и тоже запоминается.
+    """
+    failed = READ_ERROR_MESSAGE in report or SHARD_ERROR_MESSAGE in report
+    return not failed or REPORT_SUCCESS_HEADER in report
+
+
+async def answer_repeated_message(message: types.Message):
+    """Повторно доставленное сообщение получает прежний отчет; True, если это повтор"""
+    report = command_log.get([message_command_key(message)])
+    if report is None:
+        return False
+    logger.info(f"Повтор сообщения {message.message_id} из чата {message.chat.id}, отвечаем прежним отчетом")
+    await answer_report(message, report, REPEATED_FOOTER, get_month_keyboard())
+    return True
+
+
+async def answer_report(message: types.Message, report, footer, reply_markup):
+    """Отправляет отчет несколькими сообщениями, если он не помещается в одно"""
+    chunks = list(iter_chunks(f"{report}{footer}".split("\n")))
+    for i, chunk in enumerate(chunks):
+        await message.answer(
+            chunk,
+            reply_markup=reply_markup if i == len(chunks) - 1 else None,
+            parse_mode="HTML"
+        )
+
+
+@profiled('get_day_data')
 async def get_day_data(client, target_date):
+    """Строки отчета о свободных сменах дня (строятся лениво при обходе)"""
     try:
         sheet_name = get_sheet_name(target_date)
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = spreadsheet.worksheet(sheet_name)
+        layout = get_layout()
+        day = target_date.day
         
-        report_lines = []
-        
-        # Читаем все данные листа одним запросом
+        # Читаем строку дня всех каналов (значения и цвета): по запросу на шард
         try:
-            all_data = sheet.get_all_values()
+            grid = await fetch_grid(client, sheet_name, day=day, layout=layout)
         except Exception as e:
             logger.error(f"Ошибка чтения данных: {e}")
-            return f"Ошибка при получении данных: {str(e)}"
-        
-        # Получаем конфигурацию таблицы
-        table_config = TABLE_CONFIG
-        table_height = table_config['table_height']
-        table_width = table_config['table_width']
-        v_spacing = table_config['v_spacing']
-        h_spacing = table_config['h_spacing']
-        tables_per_row = table_config['tables_per_row']
-        
-        for channel_idx, channel_name in enumerate(CHANNELS):
-            # Определяем положение таблицы канала
-            row_idx = channel_idx // tables_per_row
-            col_idx = channel_idx % tables_per_row
-            
-            # Рассчитываем начальную позицию таблицы
-            start_row = 1 + row_idx * (table_height + v_spacing)
-            start_col = 1 + col_idx * (table_width + h_spacing)
-            
-            # Рассчитываем позицию дня в таблице
-            day_row = start_row + 1 + target_date.day
-            
-            # Проверяем границы данных
-            if day_row - 1 >= len(all_data):
-                continue
-            
-            row_data = all_data[day_row - 1]
-            
-            # Проверяем состояние слотов
-            slots = []
-            slot_status = {}
-            
-            # Времена смен и соответствующие колонки
-            shifts = [
-                ("9", start_col + 2),   # Утро (№1)
-                ("12", start_col + 3),  # Полдень (№2)
-                ("15", start_col + 4),  # День (№3)
-                ("18", start_col + 5)   # Вечер (№4)
-            ]
-            
-            # Проверяем занятость слотов
-            for time, col in shifts:
-                if col - 1 < len(row_data):
-                    cell_value = row_data[col - 1]
-                    # Проверяем, заполнена ли ячейка
-                    is_free = not (cell_value and cell_value.strip())
-                    slot_status[time] = is_free
-                else:
-                    slot_status[time] = False  # Считаем занятым, если ячейка за пределами данных
-            
-
-            # Формируем строку для канала
-            channel_line = []
-            free_slots_count = 0
-        
-            # Формируем строку для канала с возможной ссылкой
-            channel_link = CHANNELS_DICT.get(channel_name)
-            if channel_link:
-                # Экранируем название для безопасного использования в HTML
-                escaped_name = html.escape(channel_name)
-                channel_line = [f'<a href="{channel_link}">{escaped_name}</a>']
-            else:
-                channel_line = [channel_name]
-            
-            # Обрабатываем слоты 9, 12, 15
-            for time in ["9", "12", "15"]:
-                if slot_status[time]:
-                    channel_line.append(time)
-                    free_slots_count += 1
-            
-            if slot_status["18"]:
-                free_slots_count += 1
-
-            free_slots_count -= 1
-
-            # Добавляем кружки для свободных слотов (только для 9,12,15)
-            if free_slots_count > 0:
-                channel_line.append("⭕️" * free_slots_count)
-            
-            # Обрабатываем слот 18 отдельно
-            if slot_status["18"]:
-                channel_line.append("18")
-            
-            # Если есть хотя бы один свободный слот (9,12,15 или 18), добавляем канал в отчет
-            if len(channel_line) > 1:
-                report_lines.append(" ".join(channel_line))
+            return [f"Ошибка при получении данных: {html.escape(str(e))}"]
         
-        return format_report(report_lines)
+        return format_report(
+            lambda channel_idx: format_channel_line(grid, channel_idx, day),
+            channels_count=len(layout.channels)
+        )
         
     except Exception as e:
         logger.error(f"Ошибка при получении данных: {e}")
-        return f"Ошибка при получении данных: {str(e)}"
+        return [f"Ошибка при получении данных: {html.escape(str(e))}"]
+
+
+def format_channel_line(grid, channel_idx, day):
+    """Строка канала со свободными сменами дня или None, если свободных нет"""
+    channel_name = grid.layout.channels[channel_idx]
     
+    # Свободна смена без текста, в том числе отмененная (зеленая)
+    day_statuses = grid.day_statuses(channel_idx, day)
+    slot_status = {
+        time: day_statuses[shift] != CellStatus.BOOKED
+        for shift, time in enumerate(SHIFT_LABELS)
+    }
 
-def format_report(channel_data):
-    if not channel_data:
-        return "Все каналы заняты"
+    # Формируем строку для канала
+    channel_line = []
+    free_slots_count = 0
+
+    # Формируем строку для канала с возможной ссылкой
+    channel_link = get_channel_links().get(channel_name)
+    if channel_link:
+        # Экранируем название для безопасного использования в HTML
+        escaped_name = html.escape(channel_name)
+        channel_line = [f'<a href="{channel_link}">{escaped_name}</a>']
+    else:
+        channel_line = [channel_name]
     
-    print(channel_data)
+    # Обрабатываем слоты 9, 12, 15
+    for time in ["9", "12", "15"]:
+        if slot_status[time]:
+            channel_line.append(time)
+            free_slots_count += 1
     
-    lines = []
-    for group in CHANNEL_GROUPS:
-        group_lines = []
-        for channel_idx in group:
-            # if channel_idx in channel_data:
-            print(channel_idx, len(channel_data))
-            group_lines.append(channel_data[channel_idx])
-        
-        if group_lines:
-            lines.extend(group_lines)
-            lines.append("")  # Добавляем пустую строку между группами
+    if slot_status["18"]:
+        free_slots_count += 1
 
-    # Убираем последнюю пустую строку
-    if lines and lines[-1] == "":
-        lines.pop()
-        
-    return "\n".join(lines)
+    free_slots_count -= 1
+
+    # Добавляем кружки для свободных слотов (только для 9,12,15)
+    if free_slots_count > 0:
+        channel_line.append("⭕️" * free_slots_count)
+    
+    # Обрабатываем слот 18 отдельно
+    if slot_status["18"]:
+        channel_line.append("18")
+    
+    # Если есть хотя бы один свободный слот (9,12,15 или 18), канал попадает в отчет
+    if len(channel_line) > 1:
+        return " ".join(channel_line)
+    return None
 
 
 def get_month_keyboard():
+    return _build_month_keyboard(date.today())
+
+
+@lru_cache(maxsize=8)
+def _build_month_keyboard(today):
     builder = InlineKeyboardBuilder()
-    today = datetime.now()
     
     for i in range(3):
         month_date = today + relativedelta(months=i)
@@ -428,13 +1095,14 @@ def get_month_keyboard():
 @dp.callback_query(F.data == "view_data")
 async def view_data_handler(callback: types.CallbackQuery):
     await answer_callback(callback, "Просмотр данных")
-    await callback.message.edit_text(
+    await safe_edit_text(
+        callback.message,
         "Выберите месяц для просмотра данных:",
         reply_markup=get_data_keyboard()
     )
 
 
-@dp.callback_query(F.data.startswith("month_"))
+@dp.callback_query(F.data.startswith("month_"), flags={SHEETS_FLAG: WRITE})
 async def process_month_selection(callback: types.CallbackQuery):
     try:
         await answer_callback(callback, "Обработка запроса...")
@@ -446,7 +1114,7 @@ async def process_month_selection(callback: types.CallbackQuery):
         await ensure_sheet_exists(client, target_date)
         
         # Сохраняем выбранный месяц для пользователя
-        user_states[callback.from_user.id] = {
+        user_states[session_key(callback.from_user.id)] = {
             'current_month': target_date
         }
         
@@ -478,70 +1146,50 @@ async def process_month_selection(callback: types.CallbackQuery):
 
 # В разделе bot.py
 
-@dp.message()
+@dp.message(flags={SHEETS_FLAG: WRITE})
+@profiled('handle_data_input')
 async def handle_data_input(message: types.Message):
-    user_id = message.from_user.id
+    user_key = session_key(message.from_user.id)
     
-    if user_id not in user_states or 'current_month' not in user_states[user_id]:
+    if await answer_repeated_message(message):
+        return
+    if user_key not in user_states or 'current_month' not in user_states[user_key]:
         await message.answer("Сначала выберите месяц с помощью команды /start")
         return
     
     try:
-        lines = [line.strip() for line in message.text.split('\n') if line.strip()]
-        
-        if len(lines) < 4:
-            raise ValueError("Сообщение должно содержать минимум 4 строки")
-        
-        # Парсим данные
-        text = lines[0]
-        day = int(lines[1])
-        color = lines[2].lower()
-        channels_data = []
+        # Разбираем все строки сразу и показываем все ошибки одним сообщением
+        command, errors = parse_booking(message.text)
+        if errors:
+            raise ValueError(f"\n{format_errors(errors)}")
         
-        for data in lines[3:]:
-            parts = data.rsplit(' ', 1)
-            if len(parts) != 2:
-                raise ValueError(f"Неверный формат: {data}")
-            
-            channel_name = parts[0].strip()
-            time_str = parts[1]
-            
-            # Проверка формата времени
-            if not re.match(r'^\d{1,2}:\d{2}$', time_str):
-                raise ValueError(f"Неверный формат времени: {time_str}")
-            
-            channels_data.append({
-                'channel': channel_name,
-                'time': time_str
-            })
+        current_month = user_states[user_key]['current_month']
         
-        # Проверяем валидность данных
-        if day < 1 or day > 31:
-            raise ValueError("День должен быть числом от 1 до 31")
+        async def update():
+            client = await setup_google_sheets()
+            return await update_table_cells(
+                client, 
+                current_month, 
+                command.day, 
+                command.color, 
+                command.text, 
+                command.entries,
+                command.unknown
+            )
         
-        valid_colors = ["красный", "желтый", "розовый", "голубой"]
-        if color not in valid_colors:
-            raise ValueError(f"Недопустимый цвет. Используйте: {', '.join(valid_colors)}")
-        
-        current_month = user_states[user_id]['current_month']
-        client = await setup_google_sheets()
-        
-        # Получаем отчет об обновлении
-        report = await update_table_cells(
-            client, 
-            current_month, 
-            day, 
-            color, 
-            text, 
-            channels_data
+        # Получаем отчет об обновлении (повтор команды получает отчет первого выполнения,
+        # иначе голубой текст дописался бы в ячейки второй раз)
+        report, repeated = await command_log.run(
+            command_keys(message, current_month, command), update, keep=is_final_report
         )
         
         # После обработки предлагаем выбрать месяц снова
-        user_states[user_id].pop('current_month', None)
-        await message.answer(
-            f"{report}\n\nВыберите месяц для следующей операции:",
-            reply_markup=get_month_keyboard(),
-            parse_mode="HTML"
+        user_states[user_key].pop('current_month', None)
+        await answer_report(
+            message,
+            report,
+            REPEATED_FOOTER if repeated else "\n\nВыберите месяц для следующей операции:",
+            get_month_keyboard()
         )
     
     except Exception as e:
@@ -549,8 +1197,44 @@ async def handle_data_input(message: types.Message):
         await message.answer(f"❌ Ошибка: {str(e)}\n\nПопробуйте отправить данные снова или начните заново с /start")
 
 
+async def warm_up():
+    """Загружает клиенты Google и авторизует аккаунты, пока бот уже принимает обновления"""
+    try:
+        await asyncio.to_thread(preload_modules)
+        await setup_google_sheets()
+        mark('warm_up')
+    except Exception as e:
+        logger.error(f"Ошибка прогрева: {e}")
+
+
 async def main():
-    await dp.start_polling(bot)
+    mark('polling')
+    coroutines = [warm_up()]
+    if LAYOUT_FILE:
+        # Файл раскладки применяется до первых обновлений, дальше проверяется в фоне
+        layout_watcher = LayoutWatcher()
+        layout_watcher.check()
+        coroutines.append(layout_watcher.run())
+    if SNAPSHOT_FILE:
+        # Сетки из снимка сверяются с таблицами при первом обращении
+        restore_snapshot(tenant_router.tenants, user_states, commands=command_log)
+        coroutines.append(run_snapshots(tenant_router.tenants, user_states, commands=command_log))
+    if DIGEST_TIME:
+        coroutines.append(run_daily(DIGEST_TIME, send_digest))
+    for coroutine in coroutines:
+        task = asyncio.create_task(coroutine)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    
+    try:
+        await dp.start_polling(bot)
+    finally:
+        # SIGTERM останавливает опрос, после чего сохраняется снимок
+        if SNAPSHOT_FILE:
+            try:
+                await save_snapshot(tenant_router.tenants, user_states, commands=command_log)
+            except Exception as e:
+                logger.error(f"Снимок при остановке не сохранен: {e}")
 
 
 if __name__ == "__main__":
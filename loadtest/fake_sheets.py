@@ -0,0 +1,198 @@
+"""Таблица Google в памяти вместо Sheets API.
+
+Повторяет ту часть gspread, которой пользуется бот: open_by_key, листы,
+batch_update (updateCells и repeatCell), fetch_sheet_metadata с диапазонами
+и modified_time пула аккаунтов.
+Задержка сети имитируется sleep в потоке вызова, ошибки квоты - APIError 429.
+"""
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import gspread
+
+from app.profiling import record_sheets_io
+
+RANGE_RE = re.compile(r"^'?(?P<title>.*?)'?!(?P<start>[A-Z]+\d+):(?P<end>[A-Z]+\d+)$")
+
+
+class QuotaResponse:
+    """Ответ 429 для gspread.exceptions.APIError"""
+    status_code = 429
+    text = 'Quota exceeded'
+
+    def json(self):
+        return {'error': {'code': 429, 'message': self.text, 'status': 'RESOURCE_EXHAUSTED'}}
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows, cols):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.cells = {}  # (row, col) с нуля -> {'text': ..., 'color': {...}}
+
+    def clear(self):
+        self.spreadsheet.count('clear')
+        self.spreadsheet.touch()
+        self.cells.clear()
+
+    def resize(self, rows=None, cols=None):
+        self.spreadsheet.count('resize')
+        self.row_count = rows or self.row_count
+        self.col_count = cols or self.col_count
+
+    def update_title(self, title):
+        self.spreadsheet.count('update_title')
+        self.spreadsheet.touch()
+        self.title = title
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, spreadsheet_id):
+        self.client = client
+        self.id = spreadsheet_id
+        self._sheets = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.version = 0  # растет при каждом изменении, вместо modifiedTime
+
+    def count(self, name):
+        self.client.call(name)
+
+    def touch(self):
+        self.version += 1
+
+    def worksheet(self, title):
+        self.count('worksheet')
+        for sheet in self._sheets:
+            if sheet.title == title:
+                return sheet
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def worksheets(self):
+        self.count('worksheets')
+        return list(self._sheets)
+
+    def add_worksheet(self, title, rows, cols):
+        self.count('add_worksheet')
+        sheet = FakeWorksheet(self, next(self._ids), title, rows, cols)
+        self._sheets.append(sheet)
+        self.touch()
+        return sheet
+
+    def del_worksheet(self, sheet):
+        self.count('del_worksheet')
+        self.touch()
+        self._sheets.remove(sheet)
+
+    def _sheet_by_id(self, sheet_id):
+        return next(sheet for sheet in self._sheets if sheet.id == sheet_id)
+
+    def batch_update(self, body):
+        self.count('batch_update')
+        self.client.add('batch_requests', len(body['requests']))  # не вызов, а число запросов в пакетах
+        with self._lock:
+            self.touch()
+            for request in body['requests']:
+                if 'updateCells' in request:
+                    update = request['updateCells']
+                    grid_range = update['range']
+                    sheet = self._sheet_by_id(grid_range['sheetId'])
+                    for r, row in enumerate(update.get('rows', [])):
+                        for c, value in enumerate(row.get('values', [])):
+                            key = (grid_range['startRowIndex'] + r, grid_range['startColumnIndex'] + c)
+                            cell = sheet.cells.setdefault(key, {})
+                            if 'userEnteredValue' in value:
+                                cell['text'] = value['userEnteredValue'].get('stringValue', '')
+                            color = value.get('userEnteredFormat', {}).get('backgroundColor')
+                            if color is not None:
+                                cell['color'] = color
+                elif 'repeatCell' in request:
+                    repeat = request['repeatCell']
+                    grid_range = repeat['range']
+                    sheet = self._sheet_by_id(grid_range['sheetId'])
+                    color = repeat['cell'].get('userEnteredFormat', {}).get('backgroundColor')
+                    if color is not None:
+                        for r in range(grid_range['startRowIndex'], grid_range['endRowIndex']):
+                            for c in range(grid_range['startColumnIndex'], grid_range['endColumnIndex']):
+                                sheet.cells.setdefault((r, c), {})['color'] = color
+        return {}
+
+    def fetch_sheet_metadata(self, params=None):
+        self.count('fetch_sheet_metadata')
+        data = []
+        title = None
+        for a1_range in params.get('ranges', []):
+            match = RANGE_RE.match(a1_range)
+            title = match.group('title')
+            sheet = self.worksheet(title)
+            first_row, first_col = gspread.utils.a1_to_rowcol(match.group('start'))
+            last_row, last_col = gspread.utils.a1_to_rowcol(match.group('end'))
+            rows = []
+            for r in range(first_row - 1, last_row):
+                values = []
+                for c in range(first_col - 1, last_col):
+                    cell = sheet.cells.get((r, c), {})
+                    value = {}
+                    if cell.get('text'):
+                        value['formattedValue'] = cell['text']
+                    color = cell.get('color') or {'red': 1, 'green': 1, 'blue': 1}
+                    value['effectiveFormat'] = {'backgroundColor': {k: v for k, v in color.items() if v}}
+                    values.append(value)
+                rows.append({'values': values})
+            data.append({'startRow': first_row - 1, 'startColumn': first_col - 1, 'rowData': rows})
+        return {'sheets': [{'data': data}]}
+
+
+class FakeClient:
+    """Подменяет пул аккаунтов: app.sheets.account_pool = FakeClient(...)
+
+    latency - средняя задержка одного вызова API (сек), error_rate - доля
+    вызовов, завершающихся 429.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.spreadsheets = {}
+        self.calls = Counter()
+        self.errors = Counter()
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            delay = self.latency * self._random.uniform(0.5, 1.5)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors[name] += 1
+        if delay:
+            time.sleep(delay)
+            record_sheets_io(delay)
+        if failed:
+            raise gspread.exceptions.APIError(QuotaResponse())
+
+    def add(self, name, amount):
+        with self._lock:
+            self.calls[name] += amount
+
+    def open_by_key(self, key):
+        self.call('open_by_key')
+        return self._spreadsheet(key)
+
+    def modified_time(self, key):
+        self.call('modified_time')
+        return f"v{self._spreadsheet(key).version}"
+
+    def _spreadsheet(self, key):
+        with self._lock:
+            if key not in self.spreadsheets:
+                self.spreadsheets[key] = FakeSpreadsheet(self, key)
+            return self.spreadsheets[key]
@@ -0,0 +1,160 @@
+"""Сервер Bot API для нагрузочного теста.
+
+Отдает боту обновления из очереди через getUpdates (long polling) и принимает
+его ответы: sendMessage, editMessageText, answerCallbackQuery. Ответы в чат
+будят виртуального пользователя, который ждет реакции бота.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load', 'username': 'load_bot'}
+
+# Ответы бота, которые считаются ошибкой обработки
+ERROR_MARKERS = ('❌', 'Сессия устарела', 'Сначала выберите месяц')
+
+# Промежуточные ответы (очередь, ограничение частоты): пользователь ждет дальше
+INTERIM_MARKER = '⏳'
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.pending = deque()
+        self.has_updates = asyncio.Event()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1000)
+        self.waiters = {}  # chat_id -> future следующего ответа
+        self.calls = Counter()
+        self.error_replies = Counter()
+        self.interim_replies = Counter()
+        self.site = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, host, port)
+        await self.site.start()
+        port = self.site._server.sockets[0].getsockname()[1]
+        return f'http://{host}:{port}'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    # Обновления от пользователей
+
+    def push(self, update):
+        update['update_id'] = next(self.update_ids)
+        self.pending.append(update)
+        self.has_updates.set()
+
+    def user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+
+    def send_text(self, user_id, text):
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self.user(user_id),
+            'text': text
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        self.push({'message': message})
+
+    def press_button(self, user_id, data):
+        self.push({'callback_query': {
+            'id': str(next(self.message_ids)),
+            'from': self.user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': 'keyboard'
+            }
+        }})
+
+    async def exchange(self, chat_id, send, timeout):
+        """Отправляет обновление (send()) и ждет следующего сообщения бота в чат.
+
+        Возвращает текст ответа или None по таймауту.
+        """
+        future = self.waiters[chat_id] = asyncio.get_running_loop().create_future()
+        send()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if self.waiters.get(chat_id) is future:
+                del self.waiters[chat_id]
+
+    # Bot API
+
+    async def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        while self.pending and self.pending[0]['update_id'] < offset:
+            self.pending.popleft()
+
+        if not self.pending:
+            self.has_updates.clear()
+            try:
+                await asyncio.wait_for(self.has_updates.wait(), float(params.get('timeout') or 0) or 1)
+            except asyncio.TimeoutError:
+                return []
+
+        return list(itertools.islice(self.pending, int(params.get('limit') or 100)))
+
+    def reply(self, method, params):
+        chat_id = int(params['chat_id'])
+        text = params.get('text', '')
+        if any(marker in text for marker in ERROR_MARKERS):
+            self.error_replies[method] += 1
+        if text.startswith(INTERIM_MARKER):
+            self.interim_replies[method] += 1
+        else:
+            future = self.waiters.get(chat_id)
+            if future and not future.done():
+                future.set_result(text)
+
+        return {
+            'message_id': int(params.get('message_id') or next(self.message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': text
+        }
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == 'application/json':
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getUpdates':
+            result = await self.get_updates(params)
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self.reply(method, params)
+        elif method == 'answerCallbackQuery':
+            if params.get('text', '').startswith(INTERIM_MARKER):
+                self.interim_replies[method] += 1
+            result = True
+        else:
+            result = True
+        return web.Response(text=json.dumps({'ok': True, 'result': result}), content_type='application/json')
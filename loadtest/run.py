@@ -0,0 +1,314 @@
+"""Нагрузочный тест бота без Telegram и Google.
+
+Бот (bot.dp) опрашивает локальный сервер Bot API, таблица заменена
+FakeClient в памяти с задержкой сети. Виртуальные пользователи в отдельном
+потоке проходят сценарии: /start, запись (выбор месяца + сообщение), отмена,
+просмотр дня через «Данные». Интенсивность задается числом сценариев в секунду.
+
+В отчете: p50/p95/p99 времени обработчиков по типам обновлений и времени
+ответа глазами пользователя, задержка event loop бота, вызовы Sheets API
+и доли ошибок. --json сохраняет те же цифры для сравнения прогонов.
+
+Запуск из корня проекта (нужен config.py):
+    python loadtest/run.py --users 50 --rate 5 --duration 60 --sheets-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from loadtest.fake_sheets import FakeClient
+from loadtest.fake_telegram import FakeTelegram
+
+LOAD_TOKEN = '123456:LOADTEST'
+
+# Доли сценариев по умолчанию
+SCENARIO_WEIGHTS = {'booking': 0.4, 'cancel': 0.1, 'day_view': 0.4, 'start': 0.1}
+
+BOOKING_COLORS = ('красный', 'желтый', 'розовый', 'голубой')
+SLOT_TIMES = ('9:05', '12:30', '15:00', '18:45')
+MONTH_TEXTS = ('Текущий месяц', 'Следующий месяц')
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values, default=0.0)
+    }
+
+
+def update_kind(update):
+    if update.message:
+        text = update.message.text or ''
+        if text.startswith('/'):
+            return text.split()[0]
+        if text.startswith('Отмена'):
+            return 'cancel'
+        if text in MONTH_TEXTS:
+            return 'month'
+        if text == 'Данные (клавиатура)':
+            return 'data'
+        return 'booking'
+    if update.callback_query:
+        data = update.callback_query.data or ''
+        for prefix in ('data_month_', 'data_day_', 'report_', 'month_'):
+            if data.startswith(prefix):
+                return prefix.rstrip('_')
+        return 'callback'
+    return 'other'
+
+
+class HandlerStats:
+    """Внешний middleware диспетчера: время обработки и исключения по типам"""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.exceptions = Counter()
+
+    async def middleware(self, handler, event, data):
+        kind = update_kind(event)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.exceptions[kind] += 1
+            raise
+        finally:
+            self.latency[kind].append(time.perf_counter() - started)
+
+
+async def watch_loop_lag(samples, interval=0.05):
+    """Насколько позже срока просыпается задача в event loop бота"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+class LoadClient(threading.Thread):
+    """Сервер Bot API и виртуальные пользователи в своем event loop"""
+
+    def __init__(self, args, channels):
+        super().__init__(daemon=True)
+        self.args = args
+        self.channels = channels
+        self.random = random.Random(args.seed)
+        self.ready = threading.Event()
+        self.users_done = threading.Event()
+        self.loop = None
+        self.stopped = None
+        self.url = None
+        self.telegram = None
+        self.response = defaultdict(list)  # шаг сценария -> время до ответа бота
+        self.scenarios = Counter()
+        self.timeouts = Counter()
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.telegram = FakeTelegram()
+        self.url = await self.telegram.start()
+        self.ready.set()
+        try:
+            deadline = time.monotonic() + self.args.duration
+            await asyncio.gather(*(
+                self.user_loop(user_id, deadline) for user_id in range(10001, 10001 + self.args.users)
+            ))
+            self.users_done.set()
+            # Сервер работает, пока бот не остановит опрос
+            await self.stopped.wait()
+        finally:
+            self.users_done.set()
+            await self.telegram.stop()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        self.join()
+
+    async def user_loop(self, user_id, deadline):
+        # Каждый пользователь проходит сценарии по очереди, вместе - args.rate сценариев в секунду
+        names, weights = zip(*SCENARIO_WEIGHTS.items())
+        while True:
+            pause = self.random.expovariate(self.args.rate / self.args.users)
+            if time.monotonic() + pause >= deadline:
+                return
+            await asyncio.sleep(pause)
+            name = self.random.choices(names, weights)[0]
+            self.scenarios[name] += 1
+            await getattr(self, f'scenario_{name}')(user_id)
+
+    async def step(self, name, user_id, send):
+        started = time.perf_counter()
+        reply = await self.telegram.exchange(user_id, send, self.args.reply_timeout)
+        if reply is None:
+            self.timeouts[name] += 1
+            return False
+        self.response[name].append(time.perf_counter() - started)
+        return True
+
+    async def scenario_start(self, user_id):
+        await self.step('/start', user_id, lambda: self.telegram.send_text(user_id, '/start'))
+
+    async def scenario_booking(self, user_id):
+        if not await self.step('month', user_id, lambda: self.telegram.send_text(user_id, 'Текущий месяц')):
+            return
+        lines = [f"Пост {self.random.randint(1, 10 ** 6)} @@", str(self.random.randint(1, 28)),
+                 self.random.choice(BOOKING_COLORS)]
+        for channel in self.random.sample(self.channels, min(len(self.channels), self.random.randint(1, 4))):
+            lines.append(f"{channel} {self.random.choice(SLOT_TIMES)}")
+        await self.step('booking', user_id, lambda: self.telegram.send_text(user_id, "\n".join(lines)))
+
+    async def scenario_cancel(self, user_id):
+        if not await self.step('month', user_id, lambda: self.telegram.send_text(user_id, 'Текущий месяц')):
+            return
+        text = f"Отмена\n{self.random.randint(1, 28)}\n{self.random.choice(self.channels)} {self.random.choice(SLOT_TIMES)}"
+        await self.step('cancel', user_id, lambda: self.telegram.send_text(user_id, text))
+
+    async def scenario_day_view(self, user_id):
+        today = date.today()
+        if not await self.step('data', user_id, lambda: self.telegram.send_text(user_id, 'Данные (клавиатура)')):
+            return
+        month = f"data_month_{today.month}_{today.year}"
+        if not await self.step('data_month', user_id, lambda: self.telegram.press_button(user_id, month)):
+            return
+        day = f"data_day_{today.month}_{today.year}_{self.random.randint(1, 28)}"
+        await self.step('data_day', user_id, lambda: self.telegram.press_button(user_id, day))
+
+
+async def run(args):
+    import bot as bot_module
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from app import sheets
+    from app.layout import get_layout
+
+    logging.getLogger().setLevel(args.log_level)
+
+    # Таблица в памяти вместо пула сервисных аккаунтов
+    # Лист текущего месяца создается заранее и без отказов
+    sheets_client = FakeClient(latency=args.sheets_latency, seed=args.seed)
+    sheets.account_pool = sheets_client
+    await sheets.ensure_sheet_exists(sheets_client, date.today())
+    sheets_client.calls.clear()
+    sheets_client.error_rate = args.sheets_error_rate
+
+    stats = HandlerStats()
+    bot_module.dp.update.outer_middleware(stats.middleware)
+
+    client = LoadClient(args, list(get_layout().channels))
+    client.start()
+    client.ready.wait()
+
+    load_bot = Bot(token=LOAD_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(client.url)))
+    lag = []
+    lag_task = asyncio.create_task(watch_loop_lag(lag))
+    polling = asyncio.create_task(
+        bot_module.dp.start_polling(load_bot, polling_timeout=1, handle_signals=False)
+    )
+
+    started = time.perf_counter()
+    await asyncio.to_thread(client.users_done.wait)
+    elapsed = time.perf_counter() - started
+
+    await bot_module.dp.stop_polling()
+    await polling
+    lag_task.cancel()
+    await asyncio.to_thread(client.stop)
+
+    return {
+        'duration': elapsed,
+        'scenarios': dict(client.scenarios),
+        'handlers': {kind: summarize(values) for kind, values in sorted(stats.latency.items())},
+        'handler_exceptions': dict(stats.exceptions),
+        'response': {step: summarize(values) for step, values in sorted(client.response.items())},
+        'timeouts': dict(client.timeouts),
+        'error_replies': sum(client.telegram.error_replies.values()),
+        'interim_replies': sum(client.telegram.interim_replies.values()),
+        'replies': client.telegram.calls['sendMessage'] + client.telegram.calls['editMessageText'],
+        'loop_lag': summarize(lag),
+        'sheets_calls': dict(sheets_client.calls),
+        'sheets_errors': dict(sheets_client.errors)
+    }
+
+
+def format_table(title, rows):
+    lines = [title, f"  {'':<12} {'кол-во':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'макс':>8}"]
+    for name, row in rows.items():
+        lines.append(
+            f"  {name:<12} {row['count']:>7} {row['p50'] * 1000:>6.0f}мс {row['p95'] * 1000:>6.0f}мс "
+            f"{row['p99'] * 1000:>6.0f}мс {row['max'] * 1000:>6.0f}мс"
+        )
+    return "\n".join(lines)
+
+
+def format_result(result):
+    handled = sum(row['count'] for row in result['handlers'].values())
+    minutes = result['duration'] / 60
+    sheets_total = sum(count for name, count in result['sheets_calls'].items() if name != 'batch_requests')
+    lines = [
+        f"Длительность {result['duration']:.1f} с, сценариев {sum(result['scenarios'].values())} "
+        f"({', '.join(f'{k}: {v}' for k, v in sorted(result['scenarios'].items()))}), обновлений {handled}",
+        "",
+        format_table("Обработчики:", result['handlers']),
+        "",
+        format_table("Ответ пользователю:", result['response']),
+        "",
+        format_table("Задержка event loop:", {'loop': result['loop_lag']}),
+        "",
+        f"Sheets API: {sheets_total} вызовов ({sheets_total / minutes:.0f}/мин), "
+        + ", ".join(f"{k}: {v}" for k, v in sorted(result['sheets_calls'].items())),
+        f"Ошибки: исключений {sum(result['handler_exceptions'].values())}/{handled}, "
+        f"ответов с ошибкой {result['error_replies']}/{result['replies']}, "
+        f"без ответа {sum(result['timeouts'].values())}, "
+        f"в очереди/ограничено {result['interim_replies']}, "
+        f"отказов Sheets {sum(result['sheets_errors'].values())}"
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=5.0, help='сценариев в секунду (все пользователи)')
+    parser.add_argument('--duration', type=float, default=60.0, help='сек')
+    parser.add_argument('--sheets-latency', type=float, default=0.2, help='средняя задержка вызова Sheets, сек')
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0, help='доля вызовов Sheets с ответом 429')
+    parser.add_argument('--reply-timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', help='сохранить результат в файл')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(format_result(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
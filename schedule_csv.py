@@ -0,0 +1,299 @@
+"""Импорт и экспорт расписания в CSV без Telegram.
+
+Импорт: строки (дата, канал, время, цвет, текст), как в сообщении бронирования.
+Пустой цвет - смена без заливки: так выгружаются занятые смены, закрашенные
+не цветом брони или не закрашенные вовсе.
+Строки группируются по листам месяцев; каждый лист читается один раз (по
+одному запросу на шард), к строкам применяются те же правила, что и в боте:
+свободная смена записывается, занятая - дописывается через запятую голубым
+цветом, иначе пропускается. Записи уходят пакетами updateCells по
+MAX_BATCH_REQUESTS запросов.
+
+План листа и номер следующего пакета сохраняются в файл прогресса после
+каждого пакета: прерванный импорт продолжается с того же места и не
+дописывает голубые тексты второй раз. Бот увидит импорт, когда перечитает
+лист (GRID_CACHE_TTL).
+
+Экспорт: занятые смены месяца одним чтением листа в том же формате CSV.
+
+Запуск из корня проекта (нужен config.py):
+    python schedule_csv.py import schedule.csv --dry-run
+    python schedule_csv.py import schedule.csv
+    python schedule_csv.py export 10.2026 -o october.csv
+"""
+import argparse
+import asyncio
+import calendar
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from app.compiler import compile_cell_updates, iter_batches
+from app.grid import CellStatus
+from app.layout import BOOKING_COLORS, DEFAULT_COLOR, SHIFT_LABELS, get_layout
+from app.parser import BOOKING_COLOR_NAMES, parse_slot
+from app.shards import fetch_grid, get_shards
+from app.sheets import booking_result, ensure_sheet_exists, format_slot_text, get_sheet_name, setup_google_sheets
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = ('date', 'channel', 'time', 'color', 'text')
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d')
+
+# Пауза между пакетами записи, как у записей бота (сек)
+BATCH_DELAY = 1
+
+
+@dataclass(slots=True, frozen=True)
+class ImportRow:
+    line_no: int
+    date: date
+    slot: object  # SlotEntry
+    color: str
+    text: str
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Неверная дата '{value}': ожидается ДД.ММ.ГГГГ")
+
+
+def parse_row(line_no, row, channel_index):
+    """Строка CSV -> ImportRow; ValueError с понятным текстом при ошибке"""
+    if len(row) < len(CSV_COLUMNS):
+        raise ValueError(f"Ожидается {len(CSV_COLUMNS)} колонки: {', '.join(CSV_COLUMNS)}")
+    day, channel, time_str, color, text = (value.strip() for value in row[:len(CSV_COLUMNS)])
+    target_date = parse_date(day)
+    slot = parse_slot(f"{channel} {time_str}", line_no, channel_index)
+    color = color.lower()
+    if color and color not in BOOKING_COLOR_NAMES:
+        raise ValueError(f"Недопустимый цвет '{color}'. Используйте: {', '.join(BOOKING_COLOR_NAMES)}")
+    if not text:
+        raise ValueError("Пустой текст")
+    return ImportRow(line_no, target_date, slot, color, text)
+
+
+def read_rows(path, layout=None):
+    """Строки файла по листам месяцев: ({лист: [ImportRow, ...]}, ['Строка N: ошибка', ...])"""
+    channel_index = (layout or get_layout()).channel_index
+    by_sheet = {}
+    errors = []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for line_no, row in enumerate(csv.reader(f), 1):
+            if not any(value.strip() for value in row):
+                continue
+            if line_no == 1 and row[0].strip().lower() == CSV_COLUMNS[0]:
+                continue  # заголовок
+            try:
+                import_row = parse_row(line_no, row, channel_index)
+            except ValueError as e:
+                errors.append(f"Строка {line_no}: {e}")
+                continue
+            by_sheet.setdefault(get_sheet_name(import_row.date), []).append(import_row)
+    return by_sheet, errors
+
+
+def plan_sheet(grid, rows, shards):
+    """Применяет строки к прочитанной сетке по правилам бота.
+
+    Возвращает ({spreadsheet_id: {(строка, колонка): (текст, цвет)}}, итоги по статусам, пропуски).
+    Сетка меняется по ходу, поэтому несколько строк в одну смену ведут себя
+    как последовательные сообщения бота.
+    """
+    shard_of = {channel_idx: shard for shard in shards for channel_idx in shard.channels}
+    cells = {}
+    totals = {'written': 0, 'appended': 0, 'skipped': 0}
+    skipped = []
+    for row in rows:
+        slot = row.slot
+        day = row.date.day
+        new_text, _, message = booking_result(
+            grid.text(slot.channel_idx, day, slot.shift), row.color, format_slot_text(row.text, slot.time)
+        )
+        if new_text is None:
+            totals['skipped'] += 1
+            skipped.append(f"Строка {row.line_no}: {slot.channel} {row.date:%d.%m.%Y} {slot.time}: {message}")
+            continue
+        totals['appended' if grid.status(slot.channel_idx, day, slot.shift) == CellStatus.BOOKED else 'written'] += 1
+        grid.set_cell(slot.channel_idx, day, slot.shift, new_text, row.color)
+
+        shard = shard_of[slot.channel_idx]
+        cell = shard.layout.cell(shard.local_index(slot.channel_idx), day, slot.shift)
+        cells.setdefault(shard.spreadsheet_id, {})[cell] = (new_text, BOOKING_COLORS.get(row.color, DEFAULT_COLOR))
+    return cells, totals, skipped
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Progress:
+    """Файл прогресса импорта: планы листов и номера следующих пакетов"""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.state = {'source': source, 'sheets': {}}
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        if state.get('source') == source:
+            self.state = state
+        else:
+            logger.warning(f"Файл прогресса {path} относится к другому CSV, начинаем заново")
+
+    def sheet(self, sheet_name):
+        return self.state['sheets'].get(sheet_name)
+
+    def set_sheet(self, sheet_name, plan):
+        self.state['sheets'][sheet_name] = plan
+        self.save()
+
+    def save(self):
+        # Через временный файл: обрыв записи не теряет прогресс
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+async def prepare_sheet(client, sheet_name, rows):
+    """Создает лист при необходимости, читает его и строит план: {spreadsheet_id: {'requests', 'next'}}"""
+    shards = get_shards()
+    sheets = await ensure_sheet_exists(client, rows[0].date)
+    grid = await fetch_grid(client, sheet_name)
+    cells, totals, skipped = plan_sheet(grid, rows, shards)
+    for line in skipped:
+        print(f"  ⏩ {line}")
+
+    plan = {'totals': totals, 'shards': {}}
+    for shard, sheet in zip(shards, sheets):
+        if shard.spreadsheet_id in cells:
+            plan['shards'][shard.spreadsheet_id] = {
+                'requests': compile_cell_updates(sheet.id, cells[shard.spreadsheet_id]),
+                'next': 0
+            }
+    return plan
+
+
+async def import_csv(path, progress_path=None, dry_run=False):
+    by_sheet, errors = read_rows(path)
+    if errors:
+        # Как и в боте, ошибки показываются все сразу, и ничего не пишется
+        print("\n".join(errors), file=sys.stderr)
+        return 1
+
+    client = await setup_google_sheets()
+    progress = Progress(progress_path or f"{path}.progress.json", file_digest(path))
+    for sheet_name, rows in by_sheet.items():
+        plan = progress.sheet(sheet_name)
+        if plan is None:
+            print(f"{sheet_name}: строк {len(rows)}, читаем лист")
+            plan = await prepare_sheet(client, sheet_name, rows)
+            if dry_run:
+                print(f"{sheet_name}: {format_totals(plan['totals'])} (без записи)")
+                continue
+            progress.set_sheet(sheet_name, plan)
+        elif dry_run:
+            print(f"{sheet_name}: уже в файле прогресса, {format_totals(plan['totals'])}")
+            continue
+        else:
+            print(f"{sheet_name}: продолжаем по файлу прогресса")
+
+        for spreadsheet_id, shard_plan in plan['shards'].items():
+            batches = list(iter_batches(shard_plan['requests']))
+            if shard_plan['next'] >= len(batches):
+                continue
+            spreadsheet = await asyncio.to_thread(client.open_by_key, spreadsheet_id)
+            for i in range(shard_plan['next'], len(batches)):
+                if i > shard_plan['next']:
+                    await asyncio.sleep(BATCH_DELAY)
+                await asyncio.to_thread(spreadsheet.batch_update, {'requests': batches[i]})
+                shard_plan['next'] = i + 1
+                progress.save()
+        print(f"{sheet_name}: {format_totals(plan['totals'])}")
+    return 0
+
+
+def format_totals(totals):
+    return f"записано {totals['written']}, дописано {totals['appended']}, пропущено {totals['skipped']}"
+
+
+async def export_csv(month, output):
+    """Занятые смены месяца в CSV (одно чтение листа); цвет не из цветов брони выгружается пустым"""
+    client = await setup_google_sheets()
+    grid = await fetch_grid(client, get_sheet_name(month))
+    channels = grid.layout.channels
+    days = calendar.monthrange(month.year, month.month)[1]
+
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for day in range(1, days + 1):
+        for channel_idx, channel_name in enumerate(channels):
+            for shift, status in enumerate(grid.day_statuses(channel_idx, day)):
+                if status != CellStatus.BOOKED:
+                    continue
+                color = grid.color(channel_idx, day, shift)
+                writer.writerow([
+                    month.replace(day=day).strftime(DATE_FORMATS[0]),
+                    channel_name,
+                    f"{SHIFT_LABELS[shift]}:00",
+                    color if color in BOOKING_COLOR_NAMES else '',
+                    grid.text(channel_idx, day, shift)
+                ])
+                rows += 1
+    return rows
+
+
+def parse_month(value):
+    try:
+        return datetime.strptime(value, '%m.%Y').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Неверный месяц '{value}': ожидается ММ.ГГГГ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт и экспорт расписания в CSV")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='записать строки CSV в таблицу')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--progress', help='файл прогресса (по умолчанию <path>.progress.json)')
+    import_parser.add_argument('--dry-run', action='store_true', help='прочитать листы и показать итоги без записи')
+
+    export_parser = commands.add_parser('export', help='выгрузить занятые смены месяца')
+    export_parser.add_argument('month', type=parse_month, help='ММ.ГГГГ')
+    export_parser.add_argument('-o', '--output', help='файл CSV (по умолчанию stdout)')
+
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    if args.command == 'import':
+        sys.exit(asyncio.run(import_csv(args.path, args.progress, args.dry_run)))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+            rows = asyncio.run(export_csv(args.month, f))
+    else:
+        rows = asyncio.run(export_csv(args.month, sys.stdout))
+    print(f"Выгружено смен: {rows}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# Конфигурация для тестов: подменяет config.py бота, таблица - loadtest.fake_sheets
+TOKEN = "123456:ABCDEFabcdef_test-token"
+SPREADSHEET_ID = "sheet"
+CREDS_FILE = "creds.json"
+CHANNELS = ["МАСТЕРСКАЯ", "Канал 2", "Канал 3", "Новости", "Спорт"]
+CHANNELS_DICT = {"МАСТЕРСКАЯ": "https://t.me/m", "Канал 2": "https://t.me/k2"}
+CHANNEL_GROUPS = [[0, 1], [2, 3, 4]]
+TABLE_CONFIG = {"table_width": 6, "table_height": 33, "h_spacing": 1, "v_spacing": 2, "tables_per_row": 3}
+COLORS = {"dark_gray": {"red": 0.4, "green": 0.4, "blue": 0.4}, "light_gray": {"red": 0.8, "green": 0.8, "blue": 0.8}}
+MONTH_NAMES = {
+    1: "Январь", 2: "Февраль", 3: "Март", 4: "Апрель", 5: "Май", 6: "Июнь",
+    7: "Июль", 8: "Август", 9: "Сентябрь", 10: "Октябрь", 11: "Ноябрь", 12: "Декабрь"
+}
+SNAPSHOT_FILE = None
+DIGEST_TIME = None
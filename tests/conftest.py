@@ -0,0 +1,15 @@
+import pytest
+
+from app import sheets
+from app.cache import grid_cache
+from loadtest.fake_sheets import FakeClient
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Таблица в памяти вместо Sheets API и пустой кэш сеток"""
+    client = FakeClient()
+    monkeypatch.setattr(sheets, 'account_pool', client)
+    grid_cache.invalidate()
+    yield client
+    grid_cache.invalidate()
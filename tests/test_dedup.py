@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from app.dedup import CommandLog, content_key, message_key
+from app.parser import parse_booking
+from app.sheets import READ_ERROR_MESSAGE, REPORT_SUCCESS_HEADER, SHARD_ERROR_MESSAGE
+from bot import is_final_report
+
+SHEET = "Октябрь 2026"
+
+
+def command(text):
+    return parse_booking(text)[0]
+
+
+def keys(message_id, text, chat_id=1):
+    return [message_key('', chat_id, message_id), content_key('', chat_id, SHEET, command(text))]
+
+
+class Action:
+    """Команда записи: считает выполнения, отчет - номер выполнения"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"отчет {self.calls}"
+
+
+BOOKING = "Текст\n5\nкрасный\nСпорт 9:00\nКанал 2 12:00"
+
+
+def test_content_key_ignores_line_order():
+    reordered = "Текст\n5\nкрасный\nКанал 2 12:00\nСпорт 9:00"
+    assert keys(1, BOOKING)[1] == keys(2, reordered)[1]
+    assert keys(1, BOOKING)[1] != keys(1, BOOKING, chat_id=2)[1]
+    assert keys(1, BOOKING)[1] != keys(1, BOOKING.replace("красный", "голубой"))[1]
+
+
+def test_redelivered_message_gets_first_report():
+    log, action = CommandLog(), Action()
+
+    async def scenario():
+        first = await log.run(keys(1, BOOKING), action)
+        return first, await log.run(keys(1, BOOKING), action)
+
+    assert asyncio.run(scenario()) == (("отчет 1", False), ("отчет 1", True))
+    assert action.calls == 1
+
+
+def test_double_send_during_execution_waits_for_first():
+    log, action = CommandLog(), Action(delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(log.run(keys(1, BOOKING), action), log.run(keys(2, BOOKING), action))
+
+    assert asyncio.run(scenario()) == [("отчет 1", False), ("отчет 1", True)]
+    assert action.calls == 1
+
+
+def test_same_booking_after_window_is_new_command():
+    log = CommandLog(window=10)
+    log.put(keys(1, BOOKING), "отчет", stored_at=time.time() - 60)
+    assert log.get(keys(2, BOOKING)[1:]) is None
+    assert log.get(keys(1, BOOKING)[:1]) == "отчет"
+
+
+def test_other_write_to_sheet_forgets_fingerprints():
+    log, action = CommandLog(), Action()
+    cancel = "Отмена\n5\nСпорт 9:00"
+
+    async def scenario():
+        await log.run(keys(1, BOOKING), action)
+        await log.run([message_key('', 1, 2), content_key('', 1, SHEET, parse_booking(cancel)[0])], action)
+        return await log.run(keys(3, BOOKING), action)
+
+    assert asyncio.run(scenario()) == ("отчет 3", False)
+
+
+def test_failed_report_is_not_kept():
+    log, action = CommandLog(), Action()
+
+    async def scenario():
+        await log.run(keys(1, BOOKING), action, keep=lambda report: False)
+        return await log.run(keys(1, BOOKING), action, keep=lambda report: False)
+
+    assert asyncio.run(scenario()) == ("отчет 2", False)
+
+
+def test_is_final_report():
+    assert is_final_report(f"{REPORT_SUCCESS_HEADER}\nСпорт (9:00): Текст записан")
+    assert not is_final_report(f"❌ Ошибки:\nСпорт (9:00): {READ_ERROR_MESSAGE}")
+    assert not is_final_report(f"❌ Ошибки:\nСпорт (9:00): {SHARD_ERROR_MESSAGE}")
+    # Часть смен записана: повтор записал бы их второй раз
+    assert is_final_report(f"{REPORT_SUCCESS_HEADER}\nСпорт (9:00)\n\n❌ Ошибки:\nКанал 2 (12:00): {SHARD_ERROR_MESSAGE}")
+
+
+def test_snapshot_skips_expired_fingerprints():
+    log = CommandLog(window=10)
+    log.put(keys(1, BOOKING), "старый", stored_at=time.time() - 60)
+    log.put(keys(2, "Другой\n6\nкрасный\nСпорт 9:00"), "новый")
+
+    restored = CommandLog(window=10)
+    restored.load(log.dump())
+    assert len(restored) == 3
+    assert restored.get(keys(1, BOOKING)[:1]) == "старый"
@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+from app.digest import Subscriptions
+
+
+def test_subscriptions_are_saved_and_loaded(tmp_path):
+    path = str(tmp_path / 'subscribers.json')
+    subscriptions = Subscriptions(path)
+
+    async def scenario():
+        results = [await subscriptions.add(1), await subscriptions.add(1)]
+        await asyncio.gather(*(subscriptions.add(chat_id) for chat_id in range(2, 6)))
+        results.append(await subscriptions.remove(2, 3, 99))
+        results.append(await subscriptions.remove(99))
+        return results
+
+    assert asyncio.run(scenario()) == [True, False, True, False]
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == [1, 4, 5]
+    assert list(Subscriptions(path)) == [1, 4, 5]
+
+
+def test_broken_subscriptions_file_is_ignored(tmp_path):
+    path = tmp_path / 'subscribers.json'
+    path.write_text("{", encoding='utf-8')
+    assert len(Subscriptions(str(path))) == 0
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+import bot
+from app.sheets import ensure_sheet_exists, get_sheet_name
+
+TODAY = date.today()
+NEXT_MONTH = get_sheet_name(TODAY + relativedelta(months=1))
+
+
+@pytest.fixture(autouse=True)
+def no_failed_loads(monkeypatch):
+    monkeypatch.setattr(bot, 'failed_loads', {})
+
+
+class FakeMessage:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+def run_free(args):
+    message = FakeMessage()
+    asyncio.run(bot.free_slots_command(message, SimpleNamespace(args=args)))
+    return message.answers
+
+
+def test_missing_sheet_is_not_read_again(fake_client):
+    assert asyncio.run(bot.load_month_grid(fake_client, NEXT_MONTH)) is None
+    assert bot.load_failure(NEXT_MONTH) == f"Лист {NEXT_MONTH} еще не создан"
+
+    calls = sum(fake_client.calls.values())
+    assert asyncio.run(bot.load_month_grid(fake_client, NEXT_MONTH)) is None
+    assert sum(fake_client.calls.values()) == calls
+
+
+def test_sheet_is_read_again_after_retry_delay(fake_client, monkeypatch):
+    asyncio.run(bot.load_month_grid(fake_client, NEXT_MONTH))
+    monkeypatch.setattr(bot, 'LOAD_RETRY_DELAY', 0)
+    asyncio.run(ensure_sheet_exists(fake_client, TODAY + relativedelta(months=1)))
+
+    assert asyncio.run(bot.load_month_grid(fake_client, NEXT_MONTH)) is not None
+    assert bot.load_failure(NEXT_MONTH) is None
+
+
+def test_free_names_sheets_that_are_not_created(fake_client):
+    asyncio.run(ensure_sheet_exists(fake_client, TODAY))
+    [answer] = run_free("Спорт")
+    assert answer.startswith("🔎 Ближайшие свободные смены (Спорт):")
+    assert f"ℹ️ Лист {NEXT_MONTH} еще не создан" in answer
+
+
+def test_free_without_sheets_is_not_reported_as_fully_booked(fake_client):
+    [answer] = run_free(None)
+    assert answer.startswith("Свободных смен (все каналы) не найдено")
+    assert f"Лист {get_sheet_name(TODAY)} еще не создан" in answer
+
+
+def test_free_escapes_user_input_in_errors(fake_client):
+    [answer] = run_free("<b>")
+    assert "&lt;b&gt;" in answer and "<b>" not in answer
+    assert sum(fake_client.calls.values()) == 0
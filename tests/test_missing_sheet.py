@@ -0,0 +1,73 @@
+import asyncio
+from datetime import date
+
+import gspread
+import pytest
+
+import bot
+from app.sheets import get_sheet_name
+
+
+class Response:
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': 'ERROR'}}
+
+
+class FakeInlineQuery:
+    def __init__(self, query):
+        self.query = query
+        self.offset = ""
+        self.buttons = []
+
+    async def answer(self, results, button=None, **kwargs):
+        self.buttons.append(button.text if button else None)
+
+
+@pytest.fixture(autouse=True)
+def no_failed_loads(monkeypatch):
+    monkeypatch.setattr(bot, 'failed_loads', {})
+
+
+@pytest.mark.parametrize('error, missing', [
+    (gspread.exceptions.WorksheetNotFound("Май 2026"), True),
+    (gspread.exceptions.APIError(Response(400, "Unable to parse range: 'Май 2026'!A1:B2")), True),
+    (gspread.exceptions.APIError(Response(400, "Invalid requests[0]: badly formed")), False),
+    (gspread.exceptions.APIError(Response(429, "Quota exceeded")), False),
+    (TimeoutError("read timed out"), False),
+])
+def test_is_missing_sheet(error, missing):
+    assert bot.is_missing_sheet(error) is missing
+
+
+def test_inline_query_reports_missing_sheet_after_background_load(fake_client):
+    inline_query = FakeInlineQuery("Спорт")
+
+    async def scenario():
+        await bot.inline_availability(inline_query)
+        while bot.background_tasks:
+            await asyncio.gather(*bot.background_tasks)
+        calls = sum(fake_client.calls.values())
+        await bot.inline_availability(inline_query)
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert inline_query.buttons == [
+        "⏳ Данные загружаются, повторите запрос",
+        f"❌ Лист {get_sheet_name(date.today())} еще не создан"
+    ]
+    # Повторный запрос отвечает из памяти неудач, а не новым чтением листа
+    assert sum(fake_client.calls.values()) == calls
+
+
+def test_unavailable_sheet_is_not_reported_as_missing(fake_client, monkeypatch):
+    def unavailable(params=None):
+        raise gspread.exceptions.APIError(Response(400, "Invalid requests[0]: badly formed"))
+
+    sheet_name = get_sheet_name(date.today())
+    monkeypatch.setattr(fake_client._spreadsheet(bot.SPREADSHEET_ID), 'fetch_sheet_metadata', unavailable)
+    asyncio.run(bot.load_month_grid(fake_client, sheet_name))
+    assert bot.load_failure(sheet_name) == f"Лист {sheet_name} сейчас недоступен, повторите позже"
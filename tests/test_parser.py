@@ -0,0 +1,60 @@
+import pytest
+
+from app.parser import (
+    UnknownChannelError, format_errors, parse_availability_query, parse_booking, parse_cancel, parse_free_query,
+    parse_slot
+)
+from app.layout import get_layout
+
+
+def test_booking_is_parsed():
+    command, errors = parse_booking("Реклама\n5\nКрасный\nКанал 2 9:05\nСпорт 18:30")
+    assert errors == []
+    assert (command.text, command.day, command.color) == ("Реклама", 5, "красный")
+    assert [(entry.channel_idx, entry.shift, entry.line_no) for entry in command.entries] == [(1, 0, 4), (4, 3, 5)]
+
+
+def test_unknown_channel_does_not_reject_the_message():
+    command, errors = parse_booking("Реклама\n5\nкрасный\nКанал 2 9:00\nНетакого 12:00")
+    assert errors == []
+    assert [entry.channel for entry in command.entries] == ["Канал 2"]
+    assert [(entry.channel, entry.time, entry.channel_idx) for entry in command.unknown] == [("Нетакого", "12:00", None)]
+
+
+def test_unknown_channel_is_still_an_error_for_parse_slot():
+    with pytest.raises(UnknownChannelError, match="Нетакого"):
+        parse_slot("Нетакого 9:00", 1, get_layout().channel_index)
+
+
+def test_all_errors_are_reported_at_once():
+    _, errors = parse_booking("Реклама\n40\nчерный\nКанал 2 25:00\nбез времени")
+    assert [error.line_no for error in errors] == [2, 3, 4, 5]
+
+
+def test_line_numbers_count_blank_lines():
+    command, errors = parse_booking("Реклама\n\n5\nкрасный\n\nКанал 2 9:00\n\nСпорт 25:00")
+    assert command.day == 5
+    assert command.entries[0].line_no == 6
+    assert format_errors(errors) == "Строка 8: Неверный формат времени: 25:00"
+
+
+@pytest.mark.parametrize("text", ["", "\n\n", "Реклама\n5"])
+def test_short_message_error_has_no_line_number(text):
+    _, errors = parse_booking(text)
+    assert format_errors(errors) == "Сообщение должно содержать минимум 4 строки"
+
+
+def test_cancel_is_parsed():
+    command, errors = parse_cancel("отмена\n3\nСпорт 15:00")
+    assert errors == []
+    assert command.day == 3 and command.entries[0].shift == 2
+
+
+def test_free_query_prefers_the_longest_channel_name():
+    query = parse_free_query("Канал 2 15:00 5")
+    assert (query.channels, query.shifts, query.limit) == ((1,), (2,), 5)
+
+
+def test_availability_query_day_suffix():
+    query = parse_availability_query("кан 7")
+    assert (query.channels, query.day) == ((1, 2), 7)
@@ -0,0 +1,43 @@
+import html
+import re
+
+from app.report import ReportPages, iter_chunks
+
+LINK = "<a href='https://t.me/k2'>Канал 2</a>"
+
+
+def assert_valid_html(chunk):
+    assert chunk.count("<a") == chunk.count("</a>")
+    assert not re.search(r"<[^>]*$", chunk), chunk
+    assert not re.search(r"&#?\w*$", chunk), chunk
+
+
+def test_lines_are_joined_up_to_limit():
+    assert list(iter_chunks(["aaa", "bbb", "ccc"], limit=7)) == ["aaa\nbbb", "ccc"]
+
+
+def test_long_line_is_not_cut_inside_tags_or_entities():
+    line = (LINK + ": " + html.escape("a&b<c> ") * 3) * 4
+    for limit in range(45, 120):
+        chunks = list(iter_chunks([line], limit))
+        assert "".join(chunks) == line
+        for chunk in chunks:
+            assert len(chunk) <= limit
+            assert_valid_html(chunk)
+
+
+def test_element_longer_than_limit_loses_tags():
+    chunks = list(iter_chunks(["<b>" + "x" * 30 + "</b>"], 20))
+    assert chunks == ["x" * 20, "x" * 10]
+
+
+def test_plain_long_line_is_cut_at_limit():
+    assert list(iter_chunks(["y" * 45], 20)) == ["y" * 20, "y" * 20, "y" * 5]
+
+
+def test_pages_repeat_title_and_footer():
+    pages = ReportPages([f"строка {i}" for i in range(1000)], title="T\n", footer="\nF")
+    assert pages.get(0).startswith("T\n") and pages.get(0).endswith("\nF")
+    assert pages.has_next(0)
+    assert pages.get(100) is None
+
@@ -0,0 +1,81 @@
+import asyncio
+import io
+from datetime import date
+
+import pytest
+
+import schedule_csv
+from app.layout import get_layout
+
+MONTH = date(2026, 10, 1)
+HEADER = "date,channel,time,color,text\n"
+
+
+def write_csv(tmp_path, text, name='schedule.csv'):
+    path = tmp_path / name
+    path.write_text(HEADER + text, encoding='utf-8')
+    return str(path)
+
+
+def export(month=MONTH):
+    output = io.StringIO()
+    asyncio.run(schedule_csv.export_csv(month, output))
+    return output.getvalue().splitlines()
+
+
+@pytest.fixture(autouse=True)
+def no_batch_delay(monkeypatch):
+    monkeypatch.setattr(schedule_csv, 'BATCH_DELAY', 0)
+
+
+def test_parse_row_accepts_empty_color():
+    row = schedule_csv.parse_row(2, ["01.10.2026", "Спорт", "9:00", "", "Текст"], get_layout().channel_index)
+    assert row.color == "" and row.slot.channel_idx == 4 and row.date == MONTH
+
+
+@pytest.mark.parametrize('row, message', [
+    (["01.10.2026", "Спорт", "9:00", "зеленый", "Текст"], "Недопустимый цвет"),
+    (["01.10.2026", "Спорт", "9:00", "красный", " "], "Пустой текст"),
+    (["32.10.2026", "Спорт", "9:00", "красный", "Текст"], "Неверная дата"),
+    (["01.10.2026", "Спорт"], "Ожидается 5 колонки"),
+])
+def test_parse_row_errors(row, message):
+    with pytest.raises(ValueError, match=message):
+        schedule_csv.parse_row(2, row, get_layout().channel_index)
+
+
+def test_all_errors_are_reported_and_nothing_is_written(fake_client, tmp_path, capsys):
+    path = write_csv(tmp_path, "01.10.2026,Спорт,9:00,красный,Текст\n01.10.2026,Нет,9:00,красный,Текст\n"
+                               "02.10.2026,Спорт,25:00,красный,Текст\n")
+    assert asyncio.run(schedule_csv.import_csv(path)) == 1
+    assert capsys.readouterr().err.splitlines() == [
+        "Строка 3: Канал 'Нет' не найден", "Строка 4: Неверный формат времени: 25:00"
+    ]
+    assert sum(fake_client.calls.values()) == 0
+
+
+def test_export_import_round_trip(fake_client, tmp_path):
+    path = write_csv(tmp_path, "01.10.2026,Спорт,9:00,красный,Бронь\n"
+                               "01.10.2026,Спорт,9:00,голубой,Еще\n"
+                               "15.10.2026,МАСТЕРСКАЯ,18:00,,Без цвета\n"
+                               "01.10.2026,Спорт,9:00,красный,Занято\n")
+    assert asyncio.run(schedule_csv.import_csv(path)) == 0
+    exported = export()
+    assert exported[1:] == [
+        "01.10.2026,Спорт,9:00,голубой,\"Бронь, Еще\"",
+        "15.10.2026,МАСТЕРСКАЯ,18:00,,Без цвета"
+    ]
+
+    fake_client.spreadsheets.clear()
+    copy = tmp_path / 'export.csv'
+    copy.write_text("\n".join(exported) + "\n", encoding='utf-8')
+    assert asyncio.run(schedule_csv.import_csv(str(copy))) == 0
+    assert export() == exported
+
+
+def test_resumed_import_does_not_append_twice(fake_client, tmp_path):
+    path = write_csv(tmp_path, "01.10.2026,Спорт,9:00,голубой,Еще\n")
+    progress = str(tmp_path / 'progress.json')
+    assert asyncio.run(schedule_csv.import_csv(path, progress)) == 0
+    assert asyncio.run(schedule_csv.import_csv(path, progress)) == 0
+    assert export()[1:] == ["01.10.2026,Спорт,9:00,голубой,Еще"]
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import shards
+from app.layout import get_layout
+from app.parser import parse_booking
+from app.sheets import SHARD_ERROR_MESSAGE, ensure_sheet_exists, get_sheet_name, update_table_cells
+
+DAY = date(2026, 10, 1)
+SPORT = 4
+
+
+def enable_shards(monkeypatch, config):
+    monkeypatch.setattr(shards, 'SHARDS', config)
+    monkeypatch.setattr(shards, '_shards_cache', (None, []))
+
+
+def booking(text):
+    command, errors = parse_booking(text)
+    assert errors == []
+    return command
+
+
+def test_main_spreadsheet_keeps_global_positions():
+    main, sport = shards.build_shards(get_layout(), [{'spreadsheet_id': 'sh2', 'channels': ['Спорт']}])
+    assert main.spreadsheet_id == 'sheet' and main.channels == [0, 1, 2, 3]
+    assert [main.local_index(idx) for idx in main.channels] == [0, 1, 2, 3]
+    assert sport.local_index(SPORT) == 0 and sport.global_index(0) == SPORT
+
+
+def test_split_by_shard_translates_indices():
+    layout = get_layout()
+    shard_list = shards.build_shards(layout, [{'spreadsheet_id': 'sh2', 'channels': ['Спорт']}])
+    entries = booking("x\n5\nкрасный\nСпорт 9:00\nКанал 3 9:00").entries
+    split = {shard.spreadsheet_id: [slot.channel_idx for slot in slots] for shard, slots in
+             shards.split_by_shard(entries, shard_list)}
+    assert split == {'sh2': [0], 'sheet': [2]}
+
+
+def test_fan_out_waits_for_all_shards_before_raising():
+    finished = []
+
+    bad, good = SimpleNamespace(spreadsheet_id='bad'), SimpleNamespace(spreadsheet_id='good')
+
+    async def work(shard):
+        if shard is bad:
+            raise RuntimeError('503')
+        await asyncio.sleep(0.01)
+        finished.append(shard.spreadsheet_id)
+        return shard.spreadsheet_id
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(shards.fan_out(work, [bad, good]))
+    assert finished == ['good']
+    assert asyncio.run(shards.fan_out(work, [good, good])) == ['good', 'good']
+
+
+def test_sheets_written_before_sharding_stay_readable(fake_client, monkeypatch):
+    enable_shards(monkeypatch, [])
+
+    async def scenario():
+        await ensure_sheet_exists(fake_client, DAY)
+        await update_table_cells(fake_client, DAY, 5, 'красный', 'До', booking("До\n5\nкрасный\nСпорт 9:00").entries)
+        enable_shards(monkeypatch, [{'spreadsheet_id': 'sh2', 'groups': [0]}])
+        await ensure_sheet_exists(fake_client, DAY)
+        await update_table_cells(
+            fake_client, DAY, 6, 'красный', 'После', booking("После\n6\nкрасный\nСпорт 9:00\nМАСТЕРСКАЯ 9:00").entries
+        )
+        return await shards.fetch_grid(fake_client, get_sheet_name(DAY))
+
+    grid = asyncio.run(scenario())
+    assert grid.text(SPORT, 5, 0) == 'До'
+    assert grid.text(SPORT, 6, 0) == 'После'
+    assert grid.text(0, 6, 0) == 'После'
+
+
+def test_failed_shard_is_reported_per_slot(fake_client, monkeypatch):
+    enable_shards(monkeypatch, [{'spreadsheet_id': 'sh2', 'groups': [0]}])
+
+    def unavailable(body):
+        raise RuntimeError('503')
+
+    async def scenario():
+        await ensure_sheet_exists(fake_client, DAY)
+        fake_client._spreadsheet('sh2').batch_update = unavailable
+        command = booking("x\n5\nголубой\nСпорт 9:05\nМАСТЕРСКАЯ 9:05")
+        return await update_table_cells(fake_client, DAY, 5, 'голубой', 'x', command.entries)
+
+    report = asyncio.run(scenario())
+    success, errors = report.split("❌ Ошибки:")
+    assert "Спорт (9:05): Текст записан" in success
+    assert "МАСТЕРСКАЯ</a> (9:05): " + SHARD_ERROR_MESSAGE in errors
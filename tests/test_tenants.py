@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from app.context import current_tenant, to_thread
+from app.report import ReportCache
+from app.snapshot import restore_snapshot, save_snapshot
+from app.tenants import TenantRouter, build_tenants
+
+
+@pytest.fixture
+def tenants():
+    tenants = build_tenants([
+        {'name': 'a', 'spreadsheet_id': 'sheet-a', 'channels': ['Один', 'Два'], 'chats': [-1], 'threads': 2},
+        {'name': 'b', 'spreadsheet_id': 'sheet-b', 'channels': ['Три'], 'chats': [-2]}
+    ])
+    yield tenants
+    for tenant in tenants:
+        tenant.executor.shutdown()
+
+
+def in_tenant(tenant, func, *args):
+    token = current_tenant.set(tenant)
+    try:
+        return func(*args)
+    finally:
+        current_tenant.reset(token)
+
+
+def test_report_keys_are_random_and_cache_is_bounded():
+    cache = ReportCache(maxsize=3)
+    keys = [cache.add([str(i)]) for i in range(5)]
+    assert len(set(keys)) == 5 and not any(key.isdigit() for key in keys)
+    assert [cache.get(key) for key in keys] == [None, None, ['2'], ['3'], ['4']]
+
+
+def test_reports_are_not_shared_between_tenants(tenants):
+    a, b = tenants
+    key = in_tenant(a, lambda: bot.get_report_cache().add(['отчет']))
+    assert in_tenant(a, bot.get_report_cache).get(key) == ['отчет']
+    assert in_tenant(b, bot.get_report_cache).get(key) is None
+    assert bot.get_report_cache().get(key) is None
+
+
+def test_sessions_are_per_tenant(tenants):
+    a, b = tenants
+    assert in_tenant(a, bot.session_key, 42) == ('a', 42)
+    assert in_tenant(b, bot.session_key, 42) == ('b', 42)
+    assert bot.session_key(42) == ('', 42)
+
+
+def test_sheets_calls_run_in_tenant_threads(tenants):
+    a, _ = tenants
+
+    def worker():
+        return threading.current_thread().name, current_tenant.get()
+
+    async def scenario():
+        token = current_tenant.set(a)
+        try:
+            return await asyncio.gather(*(to_thread(worker) for _ in range(4)))
+        finally:
+            current_tenant.reset(token)
+
+    results = asyncio.run(scenario())
+    assert all(name.startswith('sheets-a') and tenant is a for name, tenant in results)
+    assert len({name for name, _ in results}) <= 2
+    name, tenant = asyncio.run(to_thread(worker))
+    assert not name.startswith('sheets-') and tenant is None
+
+
+def test_router_selects_tenant_by_chat(tenants):
+    router = TenantRouter(tenants)
+
+    async def handler(event, data):
+        return current_tenant.get()
+
+    def route(chat_id):
+        return asyncio.run(router(handler, None, {'event_chat': SimpleNamespace(id=chat_id)}))
+
+    assert route(-1) is tenants[0]
+    assert route(-2) is tenants[1]
+    assert route(-3) is None
+
+
+def test_snapshot_keeps_sessions_of_each_tenant(tenants, fake_client, tmp_path):
+    path = str(tmp_path / 'snapshot.bin')
+    when = datetime(2026, 10, 1, 12, 30)
+    sessions = {('a', 42): {'state': 'booking', 'date': when}, ('b', 42): {'state': 'cancel'}}
+    asyncio.run(save_snapshot(tenants, sessions, path))
+
+    restored = {}
+    restore_snapshot(tenants, restored, path)
+    assert restored == sessions